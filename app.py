@@ -1,5 +1,5 @@
 from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request, Body, Depends, status
-from fastapi.responses import HTMLResponse, FileResponse, RedirectResponse, JSONResponse
+from fastapi.responses import HTMLResponse, FileResponse, RedirectResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
@@ -11,7 +11,6 @@ import shutil
 from pathlib import Path
 import asyncio
 from typing import List, Optional, Dict
-import aiofiles
 from dotenv import load_dotenv
 import json
 from datetime import datetime
@@ -33,8 +32,6 @@ from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.sql import func
 import hashlib
 from sqlalchemy.orm import relationship
-from openai import OpenAI
-import base64
 from backend.models import Message
 
 # 加载环境变量
@@ -66,6 +63,15 @@ def get_db():
 
 # 导入千问API版本的服务
 from services.ai_service_latest import AIService
+from config import Config
+from services.context_packer import pack_context
+from services.markdown_normalizer import normalize_report_markdown
+from services.chunker import iter_chunks
+from services.dedup import NearDuplicateFilter
+from services.ingestion_registry import IngestionRegistry, chunk_id, file_sha256
+from services.document_readers import is_pdf_file, is_readable_document, WORD_FILE_EXTENSIONS
+from services.parsing_executor import ParsingExecutor
+from utils.upload_writer import save_upload
 
 app = FastAPI(title="RAG实训报告生成系统", version="1.0.0")
 
@@ -93,58 +99,34 @@ templates = Jinja2Templates(directory="templates")
 
 # 初始化AI服务
 ai_service = AIService()
-
-# 定义支持的文本文件类型
-TEXT_FILE_EXTENSIONS = {'.txt', '.md', '.markdown', '.py', '.js', '.html', '.css', '.json', '.xml', '.csv', '.log', '.ini', '.conf', '.yaml', '.yml'}
-
-def is_text_file(file_path):
-    """判断是否为文本文件"""
-    return file_path.suffix.lower() in TEXT_FILE_EXTENSIONS
-
-def read_text_file_content(file_path):
-    """安全读取文本文件内容"""
-    try:
-        # 尝试多种编码
-        encodings = ['utf-8', 'gbk', 'gb2312', 'utf-8-sig']
-        for encoding in encodings:
-            try:
-                with open(file_path, 'r', encoding=encoding) as f:
-                    content = f.read()
-                    # 检查内容是否包含大量不可打印字符（可能是二进制文件）
-                    if len(content) > 0 and len([c for c in content if ord(c) < 32 and c not in '\n\r\t']) / len(content) < 0.1:
-                        return content
-            except UnicodeDecodeError:
-                continue
-        return None
-    except Exception as e:
-        logger.warning(f"无法读取文件 {file_path}: {e}")
-        return None
-
-def read_word_document_content(file_path):
-    """读取Word文档内容"""
-    try:
-        doc = Document(file_path)
-        content = []
-        
-        # 读取段落内容
-        for paragraph in doc.paragraphs:
-            if paragraph.text.strip():
-                content.append(paragraph.text.strip())
-        
-        # 读取表格内容
-        for table in doc.tables:
-            for row in table.rows:
-                row_content = []
-                for cell in row.cells:
-                    if cell.text.strip():
-                        row_content.append(cell.text.strip())
-                if row_content:
-                    content.append(" | ".join(row_content))
-        
-        return "\n".join(content)
-    except Exception as e:
-        logger.warning(f"无法读取Word文档 {file_path}: {e}")
-        return None
+# /add_documents 的增量入库登记表
+ingestion_registry = IngestionRegistry(Config.INGESTION_REGISTRY_PATH)
+# 文档解析进程池，CPU密集的解析不阻塞事件循环
+parsing_executor = ParsingExecutor()
+
+async def _sweep_vector_namespaces():
+    """后台定期清理过期的任务向量集合"""
+    while True:
+        try:
+            await ai_service.sweep_expired_namespaces(Config.VECTOR_NAMESPACE_TTL)
+        except Exception as e:
+            # 单次清理失败不能终止后台任务
+            logger.error(f"清理过期向量命名空间失败: {e}")
+        await asyncio.sleep(Config.CLEANUP_INTERVAL)
+
+@app.on_event("startup")
+async def start_namespace_sweeper():
+    """启动向量命名空间清理任务"""
+    app.state.namespace_sweeper = asyncio.create_task(_sweep_vector_namespaces())
+
+@app.on_event("shutdown")
+async def close_ai_service():
+    """停止后台清理任务，关闭AI服务的共享连接池和文档解析进程池"""
+    sweeper = getattr(app.state, "namespace_sweeper", None)
+    if sweeper:
+        sweeper.cancel()
+    await ai_service.aclose()
+    parsing_executor.shutdown()
 
 def find_placeholder_paragraph(doc, placeholder_text="{{report_body}}"):
     """在文档中查找占位符段落，包括表格中的占位符"""
@@ -391,22 +373,16 @@ async def upload_files(
     images = []
     if cover_template and cover_template.filename:
         file_path = f"{user_dir}/cover_template_{cover_template.filename}"
-        async with aiofiles.open(file_path, 'wb') as f:
-            content = await cover_template.read()
-            await f.write(content)
+        await save_upload(cover_template, file_path)
         uploaded_files.append({"filename": cover_template.filename, "type": "cover_template", "path": file_path})
     if body_template and body_template.filename:
         file_path = f"{user_dir}/body_template_{body_template.filename}"
-        async with aiofiles.open(file_path, 'wb') as f:
-            content = await body_template.read()
-            await f.write(content)
+        await save_upload(body_template, file_path)
         uploaded_files.append({"filename": body_template.filename, "type": "body_template", "path": file_path})
     for file in files:
         if file.filename:
             file_path = f"{user_dir}/{file.filename}"
-            async with aiofiles.open(file_path, 'wb') as f:
-                content = await file.read()
-                await f.write(content)
+            await save_upload(file, file_path)
             uploaded_files.append({"filename": file.filename, "type": "data_file", "path": file_path})
             # 如果是图片，复制到 report_images/用户ID/
             if file.filename.lower().endswith((".jpg", ".jpeg", ".png", ".gif", ".bmp")):
@@ -483,90 +459,61 @@ async def generate_report_to_target_pages(query, context_text, target_pages, max
     logger.info(f"==== 多轮补全结束，最终总字数: {len(all_content)}，最终页数: {current_pages} ====")
     return all_content.strip()
 
-@app.post("/generate_report")
-async def generate_report(
-    request: Request,
-    query: str = Form(...),
-    name: str = Form(None),
-    student_id: str = Form(None),
-    class_name: str = Form(None),
-    instructor: str = Form(None),
-    project_name: str = Form(None),
-    user_prompt: str = Form(None),
-    advanced_formatting: bool = Form(False),
-    design_requirements: str = Form(None),
-    knowledge_and_tech: str = Form(None),
-    completion: str = Form(None),
-    self_statement: str = Form(None),
-    textbook: str = Form(None),
-    lab: str = Form(None),
-    finish_date: str = Form(None),
-    generation_mode: str = Form("fusion"),
-    file_order: str = Form(None),
-    target_pages: str = Form(None),
-    multi_round_completion: str = Form('false'),
-    cover_template_path: str = Form(None),
-    body_template_path: str = Form(None),
-    template_id: str = Form(None),
-    cover_template: UploadFile = File(None),
-    body_template: UploadFile = File(None),
-    data_files: list[UploadFile] = File([]),
-    db: Session = Depends(get_db)
-):
-    # 获取当前用户
-    user = get_current_user(request, db)
-    if not user:
-        raise HTTPException(status_code=401, detail="请先登录")
+async def _save_data_files(user, data_files) -> List[Dict]:
+    """流式保存上传的资料文件到用户目录，返回其中的图片信息 {"path", "size", "sha256"}"""
     user_dir = Path(f"uploads/{user.id}")
-    user_dir.mkdir(parents=True, exist_ok=True)
-    
-    # 初始化图片列表
-    uploaded_images = []
-    
-    # 类型转换
-    multi_round_completion = (multi_round_completion == 'true')
-    try:
-        target_pages_int = int(target_pages) if target_pages else None
-    except Exception:
-        target_pages_int = None
-    # 保存上传的资料文件到用户目录
+    saved_images = []
     for file in data_files:
         if file and hasattr(file, 'filename') and file.filename:
             file_path = user_dir / file.filename
             logger.info(f"[上传] 保存文件: {file.filename} -> {file_path}")
-            with open(file_path, "wb") as f:
-                f.write(await file.read())
+            saved = await save_upload(file, file_path)
             
-            # 处理图片文件，生成唯一ID和描述
+            # 图片文件立即复制到 report_images/用户ID/，稍后生成唯一ID和描述
             if file.filename.lower().endswith(('.jpg', '.jpeg', '.png', '.gif', '.bmp')):
-                # 立即复制到 report_images/用户ID/
-                import shutil
                 dst_path = Path(f"report_images/{user.id}") / file.filename
-                shutil.copy(file_path, dst_path)
-                try:
-                    img_id = f"img_{len(uploaded_images) + 1}"
-                    ext = file.filename.split('.')[-1].lower()
-                    logger.info(f"[图片处理] 开始处理图片: {file.filename}, ID: {img_id}, 扩展名: {ext}")
-                    description = await get_image_description(str(file_path), ext)
-                    uploaded_images.append({
-                        'id': img_id,
-                        'filename': file.filename,
-                        'description': description,
-                        'filepath': f"{user.id}/{file.filename}",
-                        'webpath': f"report_images/{user.id}/{file.filename}"
-                    })
-                    logger.info(f"[图片处理] 完成: {file.filename}, ID: {img_id}, 描述: {description}")
-                except Exception as e:
-                    logger.warning(f"[图片处理] 失败: {file.filename}, 错误: {e}")
-                    img_id = f"img_{len(uploaded_images) + 1}"
-                    uploaded_images.append({
-                        'id': img_id,
-                        'filename': file.filename,
-                        'description': f"图片: {file.filename}",
-                        'filepath': f"{user.id}/{file.filename}",
-                        'webpath': f"report_images/{user.id}/{file.filename}"
-                    })
-    # 只遍历该用户目录下的文件
+                dst_path.parent.mkdir(parents=True, exist_ok=True)
+                await asyncio.to_thread(shutil.copy, file_path, dst_path)
+                saved_images.append({**saved, "path": file_path})
+    return saved_images
+
+async def _describe_uploaded_images(user, saved_images: List[Dict]) -> List[Dict]:
+    """为上传的图片生成唯一ID和描述，多张图片并发请求视觉模型，ID按上传顺序分配
+
+    描述缓存直接使用保存时计算的sha256，无需再次读取文件计算哈希
+    """
+    semaphore = asyncio.Semaphore(Config.IMAGE_DESCRIPTION_CONCURRENCY)
+
+    async def describe(img_id: str, saved: Dict) -> Dict:
+        file_path = saved["path"]
+        try:
+            ext = file_path.name.split('.')[-1].lower()
+            logger.info(f"[图片处理] 开始处理图片: {file_path.name}, ID: {img_id}, 扩展名: {ext}")
+            async with semaphore:
+                description = await get_image_description(str(file_path), ext, saved.get("sha256"))
+            logger.info(f"[图片处理] 完成: {file_path.name}, ID: {img_id}, 描述: {description}")
+        except Exception as e:
+            logger.warning(f"[图片处理] 失败: {file_path.name}, 错误: {e}")
+            description = f"图片: {file_path.name}"
+        return {
+            'id': img_id,
+            'filename': file_path.name,
+            'description': description,
+            'filepath': f"{user.id}/{file_path.name}",
+            'webpath': f"report_images/{user.id}/{file_path.name}"
+        }
+
+    return list(await asyncio.gather(*[
+        describe(f"img_{i + 1}", saved) for i, saved in enumerate(saved_images)
+    ]))
+
+async def _collect_user_documents(user_dir: Path, cover_template_path: str = None, body_template_path: str = None,
+                                  namespace: str = None):
+    """遍历用户目录，识别模板文件，并在解析进程池中并行读取资料文档
+
+    指定namespace时每个文档解析完成后立即分段写入该向量命名空间，与其余文件的解析同时进行。
+    返回 (documents, cover_template_file, body_template_file)，documents按目录遍历顺序排列
+    """
     documents = []
     cover_template_file = None
     body_template_file = None
@@ -589,7 +536,8 @@ async def generate_report(
     if cover_template_path:
         cover_template_file = cover_template_path
         logger.info(f"[模板参数] 使用传入的封面模板路径: {cover_template_path}")
-    # 1. 自动将uploads目录下所有文档入库（只处理文本文件）
+    # 自动将uploads目录下所有文档入库（只处理Word文档、PDF和文本文件）
+    readable_files = []
     for file_path in data_files_list:
         logger.info(f"[入库] 处理文档: {file_path}")
         if file_path.is_file():
@@ -600,152 +548,190 @@ async def generate_report(
             elif any(k in fname for k in ["正文", "body", "content", "template"]):
                 body_template_file = str(file_path)
                 logger.info(f"[入库] 识别为正文模板: {file_path}")
+            elif is_readable_document(file_path):
+                readable_files.append(file_path)
+    
+    # 逐个文档（PDF逐个页范围）入库时跨文档去重
+    deduplicator = NearDuplicateFilter(Config.DEDUP_SIMILARITY_THRESHOLD)
+    parts = {}
+    async for file_path, content in parsing_executor.parse_many(readable_files):
+        if not content:
+            continue
+        parts.setdefault(file_path, []).append(content)
+        if is_pdf_file(file_path):
+            kind = "PDF文档页段"
+        else:
+            kind = "Word文档" if file_path.suffix.lower() in WORD_FILE_EXTENSIONS else "文本文件"
+        logger.info(f"[入库] {kind}已解析: {file_path}")
+        if namespace is not None:
+            doc = {
+                "content": content,
+                "source": str(file_path),
+                "type": file_path.suffix,
+                "fragment": len(parts[file_path]) - 1
+            }
+            await _ingest_documents([doc], namespace, deduplicator)
+
+    documents = [
+        {"content": "\n".join(parts[file_path]), "source": str(file_path), "type": file_path.suffix}
+        for file_path in readable_files if file_path in parts
+    ]
+    if not documents:
+        logger.warning("uploads目录中没有找到可读的文档")
+    return documents, cover_template_file, body_template_file
+
+def _order_documents(documents: List[Dict], file_order: str) -> List[Dict]:
+    """区分模式下按前端传入的file_order排序文档"""
+    try:
+        order_list = json.loads(file_order)
+        logger.info(f"收到文件顺序: {order_list}")
+        logger.info(f"排序前文档数量: {len(documents)}")
+        
+        # 创建文件名到文档的映射
+        doc_map = {}
+        for doc in documents:
+            file_name = Path(doc["source"]).name
+            doc_map[file_name] = doc
+            logger.info(f"文档映射: {file_name} -> {doc['source']}")
+        
+        # 按顺序重新排列文档
+        ordered_documents = []
+        for name in order_list:
+            if name in doc_map:
+                ordered_documents.append(doc_map[name])
+                logger.info(f"按顺序添加文档: {name}")
             else:
-                if file_path.suffix.lower() in ['.docx', '.doc']:
-                    word_content = read_word_document_content(file_path)
-                    if word_content:
-                        documents.append({
-                            "content": word_content,
-                            "source": str(file_path),
-                            "type": file_path.suffix
-                        })
-                        logger.info(f"[入库] Word文档已入库: {file_path}")
-                elif is_text_file(file_path):
-                    content = read_text_file_content(file_path)
-                    if content:
-                        documents.append({
-                            "content": content,
-                            "source": str(file_path),
-                            "type": file_path.suffix
-                        })
-                        logger.info(f"[入库] 文本文件已入库: {file_path}")
-    # ... existing code ...
-    logger.info(f"[报告生成] 模式: {generation_mode}, 文档数: {len(documents)}，图片数: {len(uploaded_images)}")
-    # ... existing code ...
-    if 'report_body' in locals():
-        logger.info(f"[报告生成] 报告正文长度: {len(report_body)} 字")
-    else:
-        logger.warning("[报告生成] report_body 未生成，无法输出长度")
-    # ... existing code ...
-    logger.info(f"[报告生成] 返回images字段: {uploaded_images}")
-    
-    # 新增：区分模式下按file_order排序
-    if generation_mode == "separate" and file_order:
-        try:
-            order_list = json.loads(file_order)
-            logger.info(f"收到文件顺序: {order_list}")
-            logger.info(f"排序前文档数量: {len(documents)}")
-            
-            # 创建文件名到文档的映射
-            doc_map = {}
-            for doc in documents:
-                file_name = Path(doc["source"]).name
-                doc_map[file_name] = doc
-                logger.info(f"文档映射: {file_name} -> {doc['source']}")
-            
-            # 按顺序重新排列文档
-            ordered_documents = []
-            for name in order_list:
-                if name in doc_map:
-                    ordered_documents.append(doc_map[name])
-                    logger.info(f"按顺序添加文档: {name}")
-                else:
-                    logger.warning(f"文件顺序中的文件未找到: {name}")
-            
-            # 添加未在顺序中的文档
-            for doc in documents:
-                file_name = Path(doc["source"]).name
-                if file_name not in order_list:
-                    ordered_documents.append(doc)
-                    logger.info(f"添加未排序文档: {file_name}")
-            
-            documents = ordered_documents
-            logger.info(f"排序后文档数量: {len(documents)}")
-        except Exception as e:
-            logger.warning(f"文件顺序解析失败: {e}")
-            logger.warning(traceback.format_exc())
-    
+                logger.warning(f"文件顺序中的文件未找到: {name}")
+        
+        # 添加未在顺序中的文档
+        for doc in documents:
+            file_name = Path(doc["source"]).name
+            if file_name not in order_list:
+                ordered_documents.append(doc)
+                logger.info(f"添加未排序文档: {file_name}")
+        
+        logger.info(f"排序后文档数量: {len(ordered_documents)}")
+        return ordered_documents
+    except Exception as e:
+        logger.warning(f"文件顺序解析失败: {e}")
+        logger.warning(traceback.format_exc())
+        return documents
+
+async def _ingest_documents(documents: List[Dict], namespace: str, deduplicator: NearDuplicateFilter = None) -> int:
+    """将文档按CHUNK_SIZE/CHUNK_OVERLAP结构化分段、去除重复分段后，批量写入本次任务的向量命名空间
+
+    多次调用（如逐个文档入库）时传入同一个deduplicator，可去除与之前批次重复的分段。
+    同一文件分多次入库（如PDF逐个页段）时，文档的 "fragment" 为该片段在文件中的序号，用于区分分段id。
+    返回去除的重复分段数
+    """
+    dropped = 0
+    deduplicator = deduplicator or NearDuplicateFilter(Config.DEDUP_SIMILARITY_THRESHOLD)
     if documents:
-        chunk_count = 0
+        chunks = []
         for doc in documents:
-            for chunk in split_long_text(doc["content"]):
+            fragment = f"fragment-{doc.get('fragment', 0)}"
+            for i, chunk in enumerate(iter_chunks(doc["content"], Config.CHUNK_SIZE, Config.CHUNK_OVERLAP)):
                 if chunk.strip():
-                    await ai_service.add_documents_to_vectorstore([{
+                    chunks.append({
+                        "id": chunk_id(doc["source"], fragment, i),
                         "content": chunk,
                         "source": doc["source"],
                         "type": doc["type"]
-                    }])
-                    chunk_count += 1
-        logger.info(f"已自动入库 {chunk_count} 个分段文档")
+                    })
+        # 同一资料的不同格式、相同的日志开头等重复内容只保留一份
+        total = len(chunks)
+        chunks, dropped = await asyncio.to_thread(deduplicator.filter, chunks)
+        # 所有分段一次性批量embedding并写入向量库
+        await ai_service.add_documents_to_vectorstore(chunks, namespace=namespace)
+        logger.info(f"已自动入库 {len(chunks)} 个分段文档（共 {total} 个，去除重复 {dropped} 个）")
     else:
         logger.warning("uploads目录中没有找到可读的文档")
-    
-    # 2. 根据生成模式选择不同的报告生成策略
-    if generation_mode == "separate":
-        report_body = await _generate_separate_report(query, documents, user_prompt, advanced_formatting, uploaded_images)
-        logger.info(f"区分模式初步整合后内容长度: {len(report_body)} 字")
-        if multi_round_completion and target_pages_int:
-            logger.info("准备进入多轮补全分支（区分模式）...（对整合后整体内容补全）")
-            report_body = await generate_report_to_target_pages(query, report_body, target_pages_int)
-        context_for_short = report_body
-    else:
-        # 融合模式：原有的生成逻辑
-        similar_docs = await ai_service.search_similar_documents(query, top_k=5)
-        context = [doc["content"][:2000] for doc in similar_docs]
-        context_text = "\n\n".join(context)
-        MAX_CONTEXT_LEN = 15000
-        if len(context_text) > MAX_CONTEXT_LEN:
-            context_text = context_text[:MAX_CONTEXT_LEN]
-        context = [context_text]
-        if not context or not context[0].strip():
-            logger.warning("未找到相关文档，使用空上下文")
-            context = ["暂无相关文档信息"]
-        # 使用多轮补全+自动扩写（受控于multi_round_completion）
-        if multi_round_completion and target_pages_int:
-            logger.info("准备进入多轮补全分支（融合模式）...")
-            report_body = await generate_report_to_target_pages(query, context_text, target_pages_int)
-        else:
-            final_prompt = build_prompt(query, context_text, user_prompt, advanced_formatting, target_pages_int)
-            logger.info(f"使用动态Prompt生成报告，长度: {len(final_prompt)}")
-            report_body = await ai_service.generate_report_with_prompt(query, final_prompt, target_pages_int)
-        context_for_short = context_text
+    return dropped
+
+async def _retrieve_fusion_context(query: str, namespace: str) -> str:
+    """融合模式：在本次任务的向量命名空间中检索相关文档并拼接为上下文"""
+    similar_docs = await ai_service.search_similar_documents(query, top_k=5, namespace=namespace)
+    # 按相关度顺序装入token预算，超出部分在句子边界截断
+    packed = pack_context(
+        [doc["content"] for doc in similar_docs],
+        Config.CONTEXT_TOKEN_BUDGET,
+        Config.CONTEXT_CHUNK_TOKEN_LIMIT
+    )
+    context_text = packed["text"]
+    logger.info(
+        f"[上下文] 使用 {packed['included']}/{len(similar_docs)} 个片段（截断 {packed['truncated']} 个），"
+        f"估算 {packed['used_tokens']}/{Config.CONTEXT_TOKEN_BUDGET} tokens"
+    )
+    if not context_text.strip():
+        logger.warning("未找到相关文档，使用空上下文")
+    return context_text
+
+SHORT_FIELD_TITLES = {
+    "design_requirements": "设计要求",
+    "knowledge_and_tech": "所用知识与技术",
+    "completion": "完成情况",
+    "self_statement": "自我说明"
+}
+
+async def _generate_short_fields(query: str, context_for_short: str, fields: Dict[str, Optional[str]]) -> Dict[str, str]:
+    """为设计要求、所用知识与技术、完成情况、自我说明生成简洁内容（用户已填写的保持不变）
+
+    默认用一次JSON结构化调用生成所有缺失字段，失败或配置为concurrent时每个字段并发单独生成
+    """
+    results = {key: fields.get(key) for key in SHORT_FIELD_TITLES}
+    missing = {key: title for key, title in SHORT_FIELD_TITLES.items() if not fields.get(key)}
+    if not missing:
+        return results
+
+    generated = None
+    if Config.SHORT_FIELDS_MODE == "json":
+        field_lines = "\n".join(f'- "{key}": {title}' for key, title in missing.items())
+        json_prompt = f"""请根据本次实训资料内容，为以下每个字段简要生成2-3行的内容，要求简洁明了。
+请只输出一个JSON对象，键为下列字段名，值为对应内容的字符串：
+{field_lines}
+
+【资料内容】：
+{context_for_short}
+"""
+        try:
+            generated = await ai_service.generate_json_with_prompt(json_prompt, Config.SHORT_FIELDS_MAX_TOKENS, stage="short_fields")
+            empty_keys = [key for key in missing if not isinstance(generated.get(key), str) or not generated[key].strip()]
+            if empty_keys:
+                raise ValueError(f"缺少字段: {empty_keys}")
+        except Exception as e:
+            logger.warning(f"结构化生成简要字段失败，改为并发逐项生成: {e}")
+            generated = None
 
-    # 新增：为设计要求、所用知识与技术、完成情况、自我说明生成简洁内容
-    def short_prompt(title):
-        return f"""请根据本次实训资料内容，简要生成2-3行的{title}，要求简洁明了。
+    if generated is None:
+        def short_prompt(title):
+            return f"""请根据本次实训资料内容，简要生成2-3行的{title}，要求简洁明了。
 
                         【资料内容】：
                         {context_for_short}
                     """
-    design_requirements = design_requirements or (await ai_service.generate_report_with_prompt(query, short_prompt("设计要求"), target_pages_int))
-    knowledge_and_tech = knowledge_and_tech or (await ai_service.generate_report_with_prompt(query, short_prompt("所用知识与技术"), target_pages_int))
-    completion = completion or (await ai_service.generate_report_with_prompt(query, short_prompt("完成情况"), target_pages_int))
-    self_statement = self_statement or (await ai_service.generate_report_with_prompt(query, short_prompt("自我说明"), target_pages_int))
-
-    # 4. 渲染封面和正文模板
-    from docxtpl import DocxTemplate
-    from docx import Document
-    from docxcompose.composer import Composer
-    from datetime import datetime
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    # --- 自动修复 name 被覆盖问题 ---
-    # 1. 在处理资料文件的循环前，备份表单字段name，防止被覆盖
-    name_from_form = name
-    context_dict = {
-        "name": name_from_form or "",
-        "student_id": student_id or "",
-        "class_name": class_name or "",
-        "instructor": instructor or "",
-        "project_name": project_name or "",
-        "textbook": textbook or "",
-        "lab": lab or "",
-        "finish_date": finish_date or "",
-        "design_requirements": design_requirements or "",
-        "knowledge_and_tech": knowledge_and_tech or "",
-        "completion": completion or "",
-        "self_statement": self_statement or "",
-        "report_body": "{{report_body}}"  # 正文模板先保留占位
-    }
+        values = await asyncio.gather(*[
+            ai_service.generate_report_with_prompt(query, short_prompt(title), max_tokens=Config.SHORT_FIELDS_MAX_TOKENS, stage="short_fields")
+            for title in missing.values()
+        ])
+        generated = dict(zip(missing.keys(), values))
+
+    for key in missing:
+        results[key] = generated[key].strip()
+    return results
+
+def _build_template_context(fields: Dict[str, Optional[str]]) -> Dict[str, str]:
+    """构造封面和正文模板的渲染变量，正文模板先保留占位"""
+    context_dict = {key: value or "" for key, value in fields.items()}
+    context_dict["report_body"] = "{{report_body}}"
+    return context_dict
+
+def _render_report_docx(context_dict: Dict[str, str], report_body: str, uploaded_images: List[Dict], cover_template_file: str = None, body_template_file: str = None, job_id: str = None) -> str:
+    """渲染封面和正文模板，插入AI正文并合并，返回报告文件名
+
+    文件名由时间戳和job_id（任务的向量命名空间）组成，同一秒内并发渲染的任务不会互相覆盖临时文件和报告。
+    """
+    job_id = job_id or uuid.uuid4().hex
+    timestamp = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{job_id[:12]}"
     cover_docx = None
     body_docx = None
     if cover_template_file:
@@ -758,7 +744,7 @@ async def generate_report(
         tpl.render(context_dict)
         body_docx = f"temp/body_{timestamp}.docx"
         tpl.save(body_docx)
-    # 5. 用python-docx将AI正文插入正文模板
+    # 用python-docx将AI正文插入正文模板
     if body_docx:
         doc = Document(body_docx)
         target_cell = find_placeholder_cell(doc)
@@ -768,7 +754,7 @@ async def generate_report(
             para = doc.add_paragraph()
             insert_structured_content_to_cell(doc, para, report_body, uploaded_images=uploaded_images)
         doc.save(body_docx)
-    # 6. 合并封面和正文
+    # 合并封面和正文
     final_docx = None
     if cover_docx and body_docx:
         cover_doc = Document(cover_docx)
@@ -778,33 +764,37 @@ async def generate_report(
         final_docx = f"temp/report_{timestamp}.docx"
         composer.save(final_docx)
         report_filename = f"report_{timestamp}.docx"
-        report_path = final_docx
     elif body_docx:
         report_filename = f"report_{timestamp}.docx"
-        report_path = body_docx
     else:
         raise Exception("未上传正文模板，无法生成报告")
-    # 7. 清理临时文件
+    # 清理临时文件
     if cover_docx and os.path.exists(cover_docx):
         os.remove(cover_docx)
     if body_docx and os.path.exists(body_docx) and (not final_docx or body_docx != final_docx):
         os.remove(body_docx)
     logger.info(f"报告生成成功: {report_filename}")
-    # 8. 生成后清理uploads和向量库，防止历史内容混合
+    return report_filename
+
+async def _finalize_report(request: Request, db: Session, user_dir: Path, namespace: str, report_body: str, uploaded_images: List[Dict]):
+    """清理上传文件和本次任务的向量命名空间、扣减使用次数，并把图片占位符替换为 report_images 路径
+
+    使用次数不足时返回None，否则返回 (report_body, used_images)
+    """
+    # 生成后清理uploads和向量库，防止历史内容混合
     for file in user_dir.glob("*"):
         if file.is_file():
             file.unlink()
-    await ai_service.clear_vectorstore()
+    await ai_service.drop_namespace(namespace)
     user = get_current_user(request, db)
     if not user:
         raise HTTPException(status_code=401, detail="请先登录")
     if user.usage_count is None or user.usage_count < 1:
-        return JSONResponse({"success": False, "detail": "使用次数已用完，请充值后再试"})
+        return None
     user.usage_count -= 1
     db.commit()
-    from datetime import datetime
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    report_id = timestamp  # 以时间戳作为报告唯一ID
+    # 以时间戳和任务命名空间作为报告唯一ID，同一用户同一秒内的任务不会共用图片目录
+    report_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{namespace[:12]}"
     report_image_dir = Path(f"report_images/{user.id}/{report_id}")
     report_image_dir.mkdir(parents=True, exist_ok=True)
     # 复制用到的图片到 report_images 目录
@@ -821,34 +811,247 @@ async def generate_report(
             img['webpath'] = ''
             used_images.append(img)
     # 替换 report_body 中的图片占位符为 report_images 路径
-    def replace_image_placeholders(text, images):
-        for img in images:
-            if img['webpath']:
-                text = text.replace(f"{{{{image:{img['id']}}}}}", f'<img src="/{img["webpath"]}" alt="{img["description"]}" style="max-width:90%;margin:12px auto;display:block;" />')
-            else:
-                text = text.replace(f"{{{{image:{img['id']}}}}}", f'<span style="color:red">[图片{img["id"]}未找到]</span>')
-        return text
-    # ... existing code ...
-    # 生成报告正文后，替换图片占位符
-    report_body = replace_image_placeholders(report_body, used_images)
-    # ... existing code ...
-    # 生成报告正文后，自动格式修复
+    for img in used_images:
+        if img['webpath']:
+            report_body = report_body.replace(f"{{{{image:{img['id']}}}}}", f'<img src="/{img["webpath"]}" alt="{img["description"]}" style="max-width:90%;margin:12px auto;display:block;" />')
+        else:
+            report_body = report_body.replace(f"{{{{image:{img['id']}}}}}", f'<span style="color:red">[图片{img["id"]}未找到]</span>')
+    return report_body, used_images
+
+async def _format_fix_report(query: str, report_body: str, uploaded_images: List[Dict]) -> str:
+    """生成报告正文后，自动格式修复，结果只用于网页预览
+
+    默认使用本地规则修正（FORMAT_FIX_MODE=local），FORMAT_FIX_MODE=llm 时交给模型修复。
+    修复会在图片下方补充描述段落（LLM模式还可能改写正文），Word文档使用修复前的正文渲染。
+    """
+    if Config.FORMAT_FIX_MODE != "llm":
+        image_descriptions = {img['id']: img['description'] for img in uploaded_images}
+        return normalize_report_markdown(report_body, image_descriptions)
     format_fix_prompt = f"""你是一位文档格式检查与修复助手。请对以下报告内容进行格式检查和修正，要求：\n\n1. 标题层级规范\n2. 图片占位符 {{image:img_x}} 必须单独成段，并在下方补充一句图片描述（如有描述信息）\n3. 列表、编号、代码块等符号符合Markdown规范\n4. 删除多余空行和非法符号\n5. 不要改动正文内容，只做格式修正\n\n【报告内容】：\n{report_body}\n"""
-    report_body = await ai_service.generate_report_with_prompt(query, format_fix_prompt)
-    return {
+    return await ai_service.generate_report_with_prompt(query, format_fix_prompt, stage="format_fix")
+
+class ReportForm:
+    """生成报告接口的表单字段（JSON接口和SSE接口共用）"""
+
+    def __init__(
+        self,
+        query: str = Form(...),
+        name: str = Form(None),
+        student_id: str = Form(None),
+        class_name: str = Form(None),
+        instructor: str = Form(None),
+        project_name: str = Form(None),
+        user_prompt: str = Form(None),
+        advanced_formatting: bool = Form(False),
+        design_requirements: str = Form(None),
+        knowledge_and_tech: str = Form(None),
+        completion: str = Form(None),
+        self_statement: str = Form(None),
+        textbook: str = Form(None),
+        lab: str = Form(None),
+        finish_date: str = Form(None),
+        generation_mode: str = Form("fusion"),
+        file_order: str = Form(None),
+        target_pages: str = Form(None),
+        multi_round_completion: str = Form('false'),
+        cover_template_path: str = Form(None),
+        body_template_path: str = Form(None),
+        template_id: str = Form(None),
+        cover_template: UploadFile = File(None),
+        body_template: UploadFile = File(None),
+        data_files: list[UploadFile] = File([])
+    ):
+        self.query = query
+        self.name = name
+        self.student_id = student_id
+        self.class_name = class_name
+        self.instructor = instructor
+        self.project_name = project_name
+        self.user_prompt = user_prompt
+        self.advanced_formatting = advanced_formatting
+        self.design_requirements = design_requirements
+        self.knowledge_and_tech = knowledge_and_tech
+        self.completion = completion
+        self.self_statement = self_statement
+        self.textbook = textbook
+        self.lab = lab
+        self.finish_date = finish_date
+        self.generation_mode = generation_mode
+        self.file_order = file_order
+        # 类型转换
+        self.target_pages = None
+        try:
+            self.target_pages = int(target_pages) if target_pages else None
+        except Exception:
+            pass
+        self.multi_round_completion = (multi_round_completion == 'true')
+        self.cover_template_path = cover_template_path
+        self.body_template_path = body_template_path
+        self.template_id = template_id
+        self.cover_template = cover_template
+        self.body_template = body_template
+        self.data_files = data_files
+
+async def _report_events(request: Request, db: Session, user, form: ReportForm, saved_images: List[Dict], stream_tokens: bool = False):
+    """报告生成流程，按顺序产出 (事件类型, 数据)
+
+    事件类型：stage（阶段进度）、token（正文片段）、error（失败原因，之后不再产出事件）、done（最终结果）。
+    stream_tokens为True时融合模式的正文逐段流式生成，否则一次生成后作为一个token事件产出。
+    """
+    user_dir = Path(f"uploads/{user.id}")
+    query = form.query
+    target_pages_int = form.target_pages
+    multi_round_completion = form.multi_round_completion
+
+    # 1. 为图片生成描述的同时，只遍历该用户目录下的文件：资料文档在解析进程池中并行解析，
+    #    每个文档解析完成后立即分段写入本次任务独立的向量命名空间，避免并发任务互相覆盖
+    yield "stage", {"stage": "documents", "message": f"正在识别 {len(saved_images)} 张图片，解析资料文档并写入向量库"}
+    namespace = uuid.uuid4().hex
+    uploaded_images, (documents, cover_template_file, body_template_file) = await asyncio.gather(
+        _describe_uploaded_images(user, saved_images),
+        _collect_user_documents(user_dir, form.cover_template_path, form.body_template_path, namespace)
+    )
+    logger.info(f"[报告生成] 模式: {form.generation_mode}, 文档数: {len(documents)}，图片数: {len(uploaded_images)}")
+    yield "stage", {"stage": "ingest", "message": f"已将 {len(documents)} 个文档写入向量库"}
+
+    # 区分模式下按file_order排序
+    if form.generation_mode == "separate" and form.file_order:
+        documents = _order_documents(documents, form.file_order)
+
+    # 2. 根据生成模式选择不同的报告生成策略
+    yield "stage", {"stage": "body", "message": "正在生成报告正文"}
+    final_prompt = None
+    if form.generation_mode == "separate":
+        report_body = await _generate_separate_report(query, documents, form.user_prompt, form.advanced_formatting, uploaded_images)
+        logger.info(f"区分模式初步整合后内容长度: {len(report_body)} 字")
+        if multi_round_completion and target_pages_int:
+            logger.info("准备进入多轮补全分支（区分模式）...（对整合后整体内容补全）")
+            report_body = await generate_report_to_target_pages(query, report_body, target_pages_int)
+        context_for_short = report_body
+        yield "token", {"text": report_body}
+    else:
+        # 融合模式：原有的生成逻辑
+        context_text = await _retrieve_fusion_context(query, namespace)
+        # 使用多轮补全+自动扩写（受控于multi_round_completion）
+        if multi_round_completion and target_pages_int:
+            logger.info("准备进入多轮补全分支（融合模式）...")
+            report_body = await generate_report_to_target_pages(query, context_text, target_pages_int)
+            yield "token", {"text": report_body}
+        else:
+            final_prompt = build_prompt(query, context_text, form.user_prompt, form.advanced_formatting, target_pages_int)
+            logger.info(f"使用动态Prompt生成报告，长度: {len(final_prompt)}")
+            if stream_tokens:
+                parts = []
+                async for token in ai_service.stream_report_with_prompt(final_prompt, target_pages_int):
+                    parts.append(token)
+                    yield "token", {"text": token}
+                report_body = "".join(parts)
+            else:
+                report_body = await ai_service.generate_report_with_prompt(query, final_prompt, target_pages_int)
+                yield "token", {"text": report_body}
+        context_for_short = context_text
+    logger.info(f"[报告生成] 报告正文长度: {len(report_body)} 字")
+
+    # 3. 为设计要求、所用知识与技术、完成情况、自我说明生成简洁内容
+    yield "stage", {"stage": "short_fields", "message": "正在生成设计要求、完成情况等字段"}
+    short_fields = await _generate_short_fields(query, context_for_short, {
+        "design_requirements": form.design_requirements,
+        "knowledge_and_tech": form.knowledge_and_tech,
+        "completion": form.completion,
+        "self_statement": form.self_statement
+    })
+
+    # 4. 自动格式修复（只用于预览）
+    yield "stage", {"stage": "format_fix", "message": "正在整理报告格式"}
+    preview_body = await _format_fix_report(query, report_body, uploaded_images)
+
+    # 5. 渲染封面和正文模板，插入未经格式修复的正文并合并
+    yield "stage", {"stage": "render", "message": "正在渲染Word文档"}
+    context_dict = _build_template_context({
+        "name": form.name,
+        "student_id": form.student_id,
+        "class_name": form.class_name,
+        "instructor": form.instructor,
+        "project_name": form.project_name,
+        "textbook": form.textbook,
+        "lab": form.lab,
+        "finish_date": form.finish_date,
+        **short_fields
+    })
+    report_filename = await asyncio.to_thread(
+        _render_report_docx, context_dict, report_body, uploaded_images, cover_template_file, body_template_file, namespace
+    )
+
+    # 6. 清理、扣减次数并整理图片
+    finalized = await _finalize_report(request, db, user_dir, namespace, preview_body, uploaded_images)
+    if finalized is None:
+        yield "error", {"detail": "使用次数已用完，请充值后再试"}
+        return
+    report_body, used_images = finalized
+    logger.info(f"[报告生成] 返回images字段: {used_images}")
+    yield "done", {
         "message": "报告生成成功",
         "report": report_body,
         "filename": report_filename,
         "download_url": f"/download/{report_filename}",
         "images": used_images,
-        "context_count": len(context) if 'context' in locals() else 0,
-        "advanced_formatting": advanced_formatting,
-        "prompt_length": len(final_prompt) if 'final_prompt' in locals() else 0,
-        "generation_mode": generation_mode
+        "context_count": 0 if form.generation_mode == "separate" else 1,
+        "advanced_formatting": form.advanced_formatting,
+        "prompt_length": len(final_prompt) if final_prompt else 0,
+        "generation_mode": form.generation_mode
     }
 
-async def _generate_sections_for_file(query: str, file_name: str, content: str, sections_count: int, uploaded_images=None) -> List[str]:
-    """为单个文件生成多个段落"""
+async def _prepare_report_request(request: Request, db: Session, form: ReportForm):
+    """校验登录并保存上传的资料文件，返回 (用户, 已保存的图片)"""
+    user = get_current_user(request, db)
+    if not user:
+        raise HTTPException(status_code=401, detail="请先登录")
+    Path(f"uploads/{user.id}").mkdir(parents=True, exist_ok=True)
+    # 上传文件只在请求处理期间可读，先保存到磁盘再开始生成
+    saved_images = await _save_data_files(user, form.data_files)
+    return user, saved_images
+
+@app.post("/generate_report")
+async def generate_report(request: Request, form: ReportForm = Depends(), db: Session = Depends(get_db)):
+    user, saved_images = await _prepare_report_request(request, db, form)
+    async for event, data in _report_events(request, db, user, form, saved_images):
+        if event == "error":
+            return JSONResponse({"success": False, "detail": data["detail"]})
+        if event == "done":
+            return data
+
+def _sse_event(event: str, data: Dict) -> str:
+    """格式化一条Server-Sent Events消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/generate_report_stream")
+async def generate_report_stream(request: Request, form: ReportForm = Depends(), db: Session = Depends(get_db)):
+    """流式生成报告：通过SSE推送阶段事件和正文token，最后一条事件携带下载链接
+
+    事件类型：stage（阶段进度）、token（正文片段）、error（失败原因）、done（最终结果）
+    """
+    user, saved_images = await _prepare_report_request(request, db, form)
+
+    async def event_stream():
+        try:
+            async for event, data in _report_events(request, db, user, form, saved_images, stream_tokens=True):
+                yield _sse_event(event, data)
+        except HTTPException as e:
+            yield _sse_event("error", {"detail": e.detail})
+        except Exception as e:
+            logger.error(f"流式生成报告失败: {e}")
+            logger.error(traceback.format_exc())
+            yield _sse_event("error", {"detail": f"报告生成失败: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _generate_sections_for_file(query: str, file_name: str, content: str, sections_count: int, uploaded_images=None, semaphore: asyncio.Semaphore = None) -> List[str]:
+    """为单个文件生成多个段落，semaphore限制所有文件共享的并发请求数"""
+    semaphore = semaphore or asyncio.Semaphore(Config.SECTION_CONCURRENCY)
     try:
         # 将文件内容分段
         chunks = split_long_text(content)
@@ -861,10 +1064,8 @@ async def _generate_sections_for_file(query: str, file_name: str, content: str,
                 image_info += f"- {img['id']}: {img['filename']} - {img['description']}\n"
             image_info += "\n请在合适的位置使用图片占位符格式：{{image:img_x}}，其中x为图片编号。\n"
         
-        # 为每个分段生成内容段落
-        sections = []
-        for i in range(min(sections_count, len(chunks))):
-            chunk = chunks[i]
+        # 为每个分段生成内容段落，各段落并发请求，结果按段落顺序返回
+        async def generate_section(i: int, chunk: str) -> str:
             section_prompt = f"""请根据以下资料内容，为实训报告生成第{i+1}个段落。
 
 【文件来源】：{file_name}
@@ -897,10 +1098,12 @@ async def _generate_sections_for_file(query: str, file_name: str, content: str,
 7. 在参考资料的基础上拓展内容，丰富报告的内容
 8. 在必要的地方尽可能使用允许的符号"""
             
-            section_content = await ai_service.generate_report_with_prompt(query, section_prompt)
-            sections.append(section_content)
+            async with semaphore:
+                return await ai_service.generate_report_with_prompt(query, section_prompt, stage="section")
         
-        return sections
+        return list(await asyncio.gather(*[
+            generate_section(i, chunks[i]) for i in range(min(sections_count, len(chunks)))
+        ]))
     except Exception as e:
         logger.error(f"为文件 {file_name} 生成段落失败: {e}")
         return [f"基于 {file_name} 的内容分析：{str(e)}"]
@@ -910,14 +1113,17 @@ async def _generate_separate_report(query: str, documents: List[Dict], user_prom
     try:
         logger.info(f"开始区分模式报告生成，共 {len(documents)} 个文档")
         
-        # 为每个文档生成多个段落
+        # 所有文件的段落并发生成，由同一个信号量限制总并发数
+        semaphore = asyncio.Semaphore(Config.SECTION_CONCURRENCY)
+        file_names = [Path(doc["source"]).name for doc in documents]
+        all_sections = await asyncio.gather(*[
+            _generate_sections_for_file(query, file_name, doc["content"], 3, uploaded_images, semaphore)
+            for file_name, doc in zip(file_names, documents)
+        ])
+        
+        # 按文档顺序组织结果，保证输出顺序确定
         file_sections = {}
-        for doc in documents:
-            file_name = Path(doc["source"]).name
-            logger.info(f"处理文件: {file_name}")
-            
-            # 为每个文件生成多个段落，传递图片信息
-            sections = await _generate_sections_for_file(query, file_name, doc["content"], 3, uploaded_images)
+        for file_name, sections in zip(file_names, all_sections):
             file_sections[file_name] = sections
             logger.info(f"为 {file_name} 生成了 {len(sections)} 个段落")
         
@@ -987,56 +1193,101 @@ async def download_report(filename: str):
         logger.error(f"下载文件失败: {e}")
         raise HTTPException(status_code=500, detail=f"下载文件失败: {str(e)}")
 
+async def _read_upload_document(file_path: Path) -> Optional[str]:
+    """在解析进程池中读取uploads目录中的资料文件，模板文件、不支持的文件或无法读取时返回None"""
+    if not is_readable_document(file_path):
+        logger.info(f"跳过非文本文件: {file_path.name}")
+        return None
+    content = await parsing_executor.parse(file_path)
+    is_word = file_path.suffix.lower() in WORD_FILE_EXTENSIONS
+    # 检查Word文档是否包含模板占位符，如果有则跳过
+    if is_word and content and "{{" in content and "}}" in content:
+        logger.info(f"跳过模板文件: {file_path.name}")
+        return None
+    kind = "Word文档" if is_word else "PDF文档" if is_pdf_file(file_path) else "文本文件"
+    if not content:
+        logger.warning(f"无法读取{kind}内容: {file_path.name}")
+        return None
+    logger.info(f"成功读取{kind}: {file_path.name}")
+    return content
+
 @app.post("/add_documents")
 async def add_documents():
-    """添加文档到向量数据库"""
+    """增量添加uploads目录中的文档到向量数据库
+
+    按入库登记表比对文件大小、修改时间和内容哈希，只对新增或变化的文件分段并embedding；
+    已删除的文件从向量库中移除其分段。分段id由路径、内容哈希和序号确定，多个worker重复入库不会产生重复记录。
+    """
     try:
-        # 读取uploads目录中的文件（包括Word文档）
         upload_dir = Path("uploads")
-        documents = []
+        embedding_model = ai_service.embedding_backend.name
+        seen = set()
+        added, updated, unchanged, removed = 0, 0, 0, 0
         
         for file_path in upload_dir.glob("*"):
-            if file_path.is_file():
-                # 处理Word文档
-                if file_path.suffix.lower() in ['.docx', '.doc']:
-                    # 检查是否包含模板占位符，如果有则跳过
-                    word_content = read_word_document_content(file_path)
-                    if word_content and "{{" in word_content and "}}" in word_content:
-                        logger.info(f"跳过模板文件: {file_path.name}")
-                        continue
-                    else:
-                        # 不是模板文件，作为资料文档处理
-                        if word_content:
-                            documents.append({
-                                "content": word_content,
-                                "source": str(file_path),
-                                "type": file_path.suffix
-                            })
-                            logger.info(f"成功读取Word文档: {file_path.name}")
-                        else:
-                            logger.warning(f"无法读取Word文档内容: {file_path.name}")
-                        continue
-                
-                # 处理文本文件
-                if is_text_file(file_path):
-                    content = read_text_file_content(file_path)
-                    if content:
-                        documents.append({
-                            "content": content,
-                            "source": str(file_path),
-                            "type": file_path.suffix
-                        })
-                        logger.info(f"成功读取文本文件: {file_path.name}")
-                    else:
-                        logger.warning(f"无法读取文件内容: {file_path.name}")
-                else:
-                    logger.info(f"跳过非文本文件: {file_path.name}")
+            if not file_path.is_file():
+                continue
+            source = str(file_path)
+            stat = file_path.stat()
+            if ingestion_registry.is_current(source, stat, embedding_model):
+                seen.add(source)
+                unchanged += 1
+                continue
+            
+            content_hash = await asyncio.to_thread(file_sha256, file_path)
+            if ingestion_registry.is_current(source, stat, embedding_model, content_hash):
+                ingestion_registry.touch(source, stat.st_size, stat.st_mtime)
+                seen.add(source)
+                unchanged += 1
+                continue
+            
+            record = ingestion_registry.get(source)
+            content = await _read_upload_document(file_path)
+            if not content:
+                continue
+            chunks = [
+                {
+                    "id": chunk_id(source, content_hash, i),
+                    "content": chunk,
+                    "source": source,
+                    "type": file_path.suffix
+                }
+                for i, chunk in enumerate(iter_chunks(content, Config.CHUNK_SIZE, Config.CHUNK_OVERLAP))
+            ]
+            if not await ai_service.add_documents_to_vectorstore(chunks):
+                # 写入失败时保留旧的分段，下次调用重试
+                if record:
+                    seen.add(source)
+                continue
+            if record:
+                stale_ids = set(record["chunk_ids"]) - {chunk["id"] for chunk in chunks}
+                await ai_service.delete_documents(list(stale_ids))
+                updated += 1
+            else:
+                added += 1
+            ingestion_registry.upsert(
+                source, stat.st_size, stat.st_mtime, content_hash, embedding_model, [chunk["id"] for chunk in chunks]
+            )
+            seen.add(source)
         
-        if documents:
-            await ai_service.add_documents_to_vectorstore(documents)
-            return {"message": f"成功添加 {len(documents)} 个文档到向量数据库"}
-        else:
-            return {"message": "uploads目录中没有找到可读的文档"}
+        # 已删除或不再可读的文件：移除其分段
+        for source in set(ingestion_registry.paths()) - seen:
+            record = ingestion_registry.get(source)
+            if record:
+                await ai_service.delete_documents(record["chunk_ids"])
+            ingestion_registry.remove(source)
+            removed += 1
+        
+        logger.info(f"[增量入库] 新增 {added}，更新 {updated}，未变化 {unchanged}，移除 {removed}")
+        if not (added or updated or unchanged):
+            return {"message": "uploads目录中没有找到可读的文档", "removed": removed}
+        return {
+            "message": f"成功添加 {added + updated} 个文档到向量数据库（{unchanged} 个未变化，移除 {removed} 个）",
+            "added": added,
+            "updated": updated,
+            "unchanged": unchanged,
+            "removed": removed
+        }
             
     except Exception as e:
         logger.error(f"添加文档失败: {e}")
@@ -1400,8 +1651,21 @@ def build_prompt(query, context_text, user_prompt=None, advanced_formatting=Fals
 MAX_EMBEDDING_LEN = 8192
 
 def split_long_text(text, max_len=MAX_EMBEDDING_LEN):
-    """将长文本按max_len分段"""
-    return [text[i:i+max_len] for i in range(0, len(text), max_len)]
+    """将长文本按标题、段落和句子边界分段，再把相邻分段合并到不超过max_len个字符（不重叠）
+
+    结构分段超过一半长度后会在标题处断开，直接按max_len切分时每段往往只有一半左右；
+    先切成不超过max_len/8的小段再合并，每段接近max_len，生成段落时覆盖的资料与按固定窗口切分时相当。
+    """
+    sections, current = [], ""
+    for chunk in iter_chunks(text, chunk_size=max(1, max_len // 8), overlap=0):
+        if current and len(current) + 2 + len(chunk) > max_len:
+            sections.append(current)
+            current = chunk
+        else:
+            current = f"{current}\n\n{chunk}" if current else chunk
+    if current:
+        sections.append(current)
+    return sections
 
 # 数据库模型
 class User(Base):
@@ -1674,15 +1938,9 @@ async def create_template(
     cover_path = f"{user_template_dir}/cover_{timestamp}_{cover_template.filename}"
     body_path = f"{user_template_dir}/body_{timestamp}_{body_template.filename}"
     
-    # 保存封面模板
-    async with aiofiles.open(cover_path, 'wb') as f:
-        content = await cover_template.read()
-        await f.write(content)
-    
-    # 保存正文模板
-    async with aiofiles.open(body_path, 'wb') as f:
-        content = await body_template.read()
-        await f.write(content)
+    # 保存封面模板和正文模板
+    await save_upload(cover_template, cover_path)
+    await save_upload(body_template, body_path)
     
     # 创建模板记录
     template = Template(
@@ -1776,9 +2034,7 @@ async def update_template(
         if template.cover_template_path and os.path.exists(template.cover_template_path):
             os.remove(template.cover_template_path)
         cover_path = f"{user_template_dir}/cover_{timestamp}_{cover_template.filename}"
-        async with aiofiles.open(cover_path, 'wb') as f:
-            content = await cover_template.read()
-            await f.write(content)
+        await save_upload(cover_template, cover_path)
         template.cover_template_path = cover_path
 
     # 更新正文模板
@@ -1786,9 +2042,7 @@ async def update_template(
         if template.body_template_path and os.path.exists(template.body_template_path):
             os.remove(template.body_template_path)
         body_path = f"{user_template_dir}/body_{timestamp}_{body_template.filename}"
-        async with aiofiles.open(body_path, 'wb') as f:
-            content = await body_template.read()
-            await f.write(content)
+        await save_upload(body_template, body_path)
         template.body_template_path = body_path
 
     # 更新名称
@@ -1959,29 +2213,9 @@ NAME_TIMES_MAP = {
 }
 
 # 新增：图片描述生成函数
-async def get_image_description(file_path, ext="png"):
-    client = OpenAI(
-        api_key="sk-442562cd6b6b4b2896ebdac8ce8d047e",
-        base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
-    )
-    with open(file_path, "rb") as image_file:
-        base64_image = base64.b64encode(image_file.read()).decode("utf-8")
-    completion = client.chat.completions.create(
-        model="qwen-vl-plus",
-        messages=[
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "image_url",
-                        "image_url": {"url": f"data:image/{ext};base64,{base64_image}"},
-                    },
-                    {"type": "text", "text": "请用一句话描述这张图片的内容。"},
-                ],
-            }
-        ],
-    )
-    return completion.choices[0].message.content
+async def get_image_description(file_path, ext="png", content_hash=None):
+    """使用AI服务的共享异步客户端生成图片描述，content_hash为上传时计算的sha256"""
+    return await ai_service.describe_image(file_path, ext, content_hash)
 
 @app.post("/messages/send")
 async def send_message(
@@ -2005,9 +2239,7 @@ async def send_message(
         ext = image.filename.split('.')[-1].lower()
         filename = f"{user.id}_{int(datetime.now().timestamp())}.{ext}"
         save_path = os.path.join("chat_images", filename)
-        async with aiofiles.open(save_path, 'wb') as f:
-            content_bytes = await image.read()
-            await f.write(content_bytes)
+        await save_upload(image, save_path)
         image_path = save_path
     
     # 确保至少有一个内容（文字或图片）
@@ -2108,9 +2340,7 @@ async def admin_reply_message(
         ext = image.filename.split('.')[-1].lower()
         filename = f"admin_{int(datetime.now().timestamp())}.{ext}"
         save_path = os.path.join("chat_images", filename)
-        async with aiofiles.open(save_path, 'wb') as f:
-            content_bytes = await image.read()
-            await f.write(content_bytes)
+        await save_upload(image, save_path)
         image_path = save_path
     
     # 确保至少有一个内容（文字或图片）
@@ -29,7 +29,7 @@ USER_TEMPLATES_DIR.mkdir(exist_ok=True)
 LOGS_DIR.mkdir(exist_ok=True)
 
 # 文件上传限制
-MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", 50 * 1024 * 1024))  # 50MB，单个上传文件的大小上限
 ALLOWED_EXTENSIONS = {
     'text': {'.txt', '.md', '.markdown'},
     'document': {'.doc', '.docx'},
@@ -88,6 +88,7 @@ class Config:
     
     # 文件上传配置
     MAX_FILE_SIZE = MAX_FILE_SIZE
+    UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))  # 上传文件分块写入磁盘的大小
     UPLOAD_FOLDER = UPLOAD_DIR
     TEMP_FOLDER = TEMP_DIR
     
@@ -97,20 +98,101 @@ class Config:
     # AI配置
     AI_API_URL = os.getenv("AI_API_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")
     AI_MODEL_NAME = os.getenv("AI_MODEL_NAME", "qwen-plus")
+    AI_EMBEDDING_MODEL = os.getenv("AI_EMBEDDING_MODEL", "text-embedding-v3")
     AI_API_KEY = os.getenv("AI_API_KEY", "sk-442562cd6b6b4b2896ebdac8ce8d047e")
+    AI_VISION_MODEL = os.getenv("AI_VISION_MODEL", "qwen-vl-plus")
+    
+    # AI客户端连接池配置（embedding、对话、图片描述共用）
+    AI_TIMEOUT = float(os.getenv("AI_TIMEOUT", 120))
+    AI_MAX_CONNECTIONS = int(os.getenv("AI_MAX_CONNECTIONS", 20))
+    AI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("AI_MAX_KEEPALIVE_CONNECTIONS", 10))
+    AI_KEEPALIVE_EXPIRY = float(os.getenv("AI_KEEPALIVE_EXPIRY", 30))
     
     # 向量数据库配置
     CHROMA_PERSIST_DIR = "./chroma_db"
+    # 每个报告任务使用独立的向量集合（job_<任务ID>），完成后删除；
+    # 异常中断遗留的集合超过VECTOR_NAMESPACE_TTL秒后由后台任务每CLEANUP_INTERVAL秒清理一次
+    VECTOR_NAMESPACE_PREFIX = "job_"
+    VECTOR_NAMESPACE_TTL = int(os.getenv("VECTOR_NAMESPACE_TTL", 7200))
+    # 任务命名空间的文档数不超过该值时使用进程内NumPy索引（不落盘），超过后转存ChromaDB；0表示始终使用ChromaDB
+    VECTOR_MEMORY_INDEX_MAX_DOCS = int(os.getenv("VECTOR_MEMORY_INDEX_MAX_DOCS", 2000))
+    # 进程内索引的向量存储格式：float32、float16（内存减半）或 int8（逐向量缩放，约1/4，召回率略有下降）；
+    # 压缩格式检索时按块展开计算，得分与float32一致
+    VECTOR_INDEX_STORAGE = os.getenv("VECTOR_INDEX_STORAGE", "float16")
+    # 混合检索：任务命名空间同时建立BM25倒排索引（中文二元组+代码标识符），与向量检索结果按倒数排名融合
+    HYBRID_SEARCH_ENABLED = os.getenv("HYBRID_SEARCH_ENABLED", "true").lower() == "true"
+    HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", 20))  # 每路检索的候选数
+    HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", 60))
+    # MMR重排：先取MMR_FETCH_K个候选，再选出相关且彼此不重复的top_k个分段；
+    # MMR_LAMBDA越接近1越看重相关度，越接近0越看重多样性
+    MMR_ENABLED = os.getenv("MMR_ENABLED", "true").lower() == "true"
+    MMR_FETCH_K = int(os.getenv("MMR_FETCH_K", 20))
+    MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", 0.5))
     EMBEDDING_MODEL = "shibing624/text2vec-base-chinese"
+    EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", 1024))
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 10))  # text-embedding-v3单次请求最多10条
+    EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", 4))  # 同时进行的批次请求数
+    
+    # embedding后端：remote 调用 AI_EMBEDDING_MODEL 接口，local 使用 sentence-transformers 在本地CPU推理，
+    # hashing 使用字符n-gram特征哈希（无需模型和网络，用于离线测试）
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "remote")
+    EMBEDDING_LOCAL_MODEL_PATH = os.getenv("EMBEDDING_LOCAL_MODEL_PATH", EMBEDDING_MODEL)  # 模型名或本地目录
+    EMBEDDING_LOCAL_DEVICE = os.getenv("EMBEDDING_LOCAL_DEVICE", "cpu")
+    EMBEDDING_LOCAL_THREADS = int(os.getenv("EMBEDDING_LOCAL_THREADS", 0))  # 0表示使用PyTorch默认线程数
+    EMBEDDING_LOCAL_QUANTIZE = os.getenv("EMBEDDING_LOCAL_QUANTIZE", "false").lower() == "true"  # int8动态量化
+    EMBEDDING_LOCAL_BATCH_SIZE = int(os.getenv("EMBEDDING_LOCAL_BATCH_SIZE", 32))
+    
+    # embedding持久化缓存配置
+    EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./chroma_db/embedding_cache.sqlite3")
+    EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 100000))
+    EMBEDDING_CACHE_STORAGE = os.getenv("EMBEDDING_CACHE_STORAGE", "float16")  # float32 或 float16（占用减半）
+    
+    # LLM响应缓存（默认关闭）：按阶段开启，逗号分隔，可选 format_fix, short_fields, section
+    RESPONSE_CACHE_STAGES = {stage.strip() for stage in os.getenv("RESPONSE_CACHE_STAGES", "").split(",") if stage.strip()}
+    RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", 3600))  # 秒
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 256))
+    
+    # 封面简要字段（设计要求、所用知识与技术、完成情况、自我说明）生成方式
+    # json: 一次结构化调用生成全部字段；concurrent: 每个字段单独调用并发执行
+    SHORT_FIELDS_MODE = os.getenv("SHORT_FIELDS_MODE", "json")
+    SHORT_FIELDS_MAX_TOKENS = int(os.getenv("SHORT_FIELDS_MAX_TOKENS", 800))
+    
+    # 报告格式修复方式：local 为本地规则修正，llm 为将整篇报告交给模型修复
+    FORMAT_FIX_MODE = os.getenv("FORMAT_FIX_MODE", "local")
+    
+    # 融合模式上下文token预算：按相关度装入检索片段，单个片段不超过CONTEXT_CHUNK_TOKEN_LIMIT
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 8000))
+    CONTEXT_CHUNK_TOKEN_LIMIT = int(os.getenv("CONTEXT_CHUNK_TOKEN_LIMIT", 2000))
+    
+    # 区分模式下同时进行的段落生成请求数
+    SECTION_CONCURRENCY = int(os.getenv("SECTION_CONCURRENCY", 5))
     
     # 文档处理配置
-    CHUNK_SIZE = 1000
-    CHUNK_OVERLAP = 200
+    CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 1000))  # 入库分段的最大字符数
+    CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", 200))  # 相邻分段重叠的字符数
+    # 入库前去除近似重复分段：SimHash相似度（1 - 汉明距离/64）不低于该值视为重复，设为1时只去除完全相同的分段
+    DEDUP_SIMILARITY_THRESHOLD = float(os.getenv("DEDUP_SIMILARITY_THRESHOLD", 0.95))
+    # /add_documents 增量入库登记表（文件指纹 -> 分段id）
+    INGESTION_REGISTRY_PATH = os.getenv("INGESTION_REGISTRY_PATH", "./chroma_db/ingestion_registry.sqlite3")
+    # 文档解析进程池：同时解析的文件数（0表示在线程中解析）、单个文件的超时秒数和子进程内存上限
+    PARSING_WORKERS = int(os.getenv("PARSING_WORKERS", min(4, os.cpu_count() or 1)))
+    PARSING_TIMEOUT = float(os.getenv("PARSING_TIMEOUT", 120))
+    PARSING_MEMORY_LIMIT_MB = int(os.getenv("PARSING_MEMORY_LIMIT_MB", 1024))  # 0表示不限制
+    PARSING_START_METHOD = os.getenv("PARSING_START_METHOD", "forkserver")  # 不支持时退回spawn
+    PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", 16))  # PDF按页范围并行提取，每个任务的页数
     
     # 图片配置
     IMAGE_WIDTH = 5  # 英寸
     IMAGE_ALIGNMENT = "center"
     
+    # 图片描述配置：发送给视觉模型前先缩放，并按图片内容缓存描述
+    IMAGE_DESCRIPTION_MAX_SIDE = int(os.getenv("IMAGE_DESCRIPTION_MAX_SIDE", 1024))  # 长边像素
+    IMAGE_DESCRIPTION_JPEG_QUALITY = int(os.getenv("IMAGE_DESCRIPTION_JPEG_QUALITY", 85))
+    IMAGE_DESCRIPTION_CONCURRENCY = int(os.getenv("IMAGE_DESCRIPTION_CONCURRENCY", 4))
+    IMAGE_DESCRIPTION_CACHE_PATH = os.getenv("IMAGE_DESCRIPTION_CACHE_PATH", "./chroma_db/image_descriptions.sqlite3")
+    IMAGE_DESCRIPTION_CACHE_MAX_ENTRIES = int(os.getenv("IMAGE_DESCRIPTION_CACHE_MAX_ENTRIES", 20000))
+    
     # 清理配置
     CLEANUP_INTERVAL = 3600  # 1小时清理一次
     MAX_SESSION_AGE = 86400  # 24小时后清理会话文件 
\ No newline at end of file
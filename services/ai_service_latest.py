@@ -1,12 +1,25 @@
 import os
 import json
 import asyncio
-from typing import List, Dict, Any, Optional
+import time
+from typing import List, Dict, Any, Optional, AsyncIterator
 import chromadb
+import numpy as np
 from chromadb.config import Settings
 import hashlib
-from openai import OpenAI
+import base64
+import io
+import aiofiles
+import httpx
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
+from config import Config
+from PIL import Image, ImageOps
+from services.cache import EmbeddingCache, DescriptionCache, ResponseCache
+from services.vector_index import InMemoryVectorIndex
+from services.lexical_index import BM25Index, reciprocal_rank_fusion
+from services.rerank import maximal_marginal_relevance
+from services.embedding_backends import create_embedding_backend, hashing_embedding
 
 # 加载环境变量
 load_dotenv()
@@ -17,12 +30,48 @@ class AIService:
         self.api_key = os.getenv("AI_API_KEY", "sk-442562cd6b6b4b2896ebdac8ce8d047e")
         self.base_url = os.getenv("AI_API_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")
         self.model_name = os.getenv("AI_MODEL_NAME", "qwen-plus")
-        self.embedding_model = os.getenv("AI_EMBEDDING_MODEL", "text-embedding-v3")
+        self.embedding_model = Config.AI_EMBEDDING_MODEL
+        self.vision_model = Config.AI_VISION_MODEL
         
-        # 初始化OpenAI客户端（最新版本）
-        self.client = OpenAI(
+        # 共享的异步HTTP连接池：embedding、对话和图片描述复用同一组keep-alive连接
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=Config.AI_MAX_CONNECTIONS,
+                max_keepalive_connections=Config.AI_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=Config.AI_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(Config.AI_TIMEOUT, connect=10.0)
+        )
+        
+        # 初始化异步OpenAI客户端，所有请求在事件循环中等待，不阻塞其他请求
+        self.client = AsyncOpenAI(
             api_key=self.api_key,
-            base_url=self.base_url
+            base_url=self.base_url,
+            http_client=self.http_client
+        )
+        
+        # 初始化embedding后端（远程接口或本地模型，由EMBEDDING_BACKEND决定）
+        self.embedding_backend = create_embedding_backend(self.client)
+        
+        # 初始化embedding持久化缓存
+        self.embedding_cache = None
+        if Config.EMBEDDING_CACHE_ENABLED:
+            self.embedding_cache = EmbeddingCache(
+                Config.EMBEDDING_CACHE_PATH,
+                max_entries=Config.EMBEDDING_CACHE_MAX_ENTRIES,
+                storage=Config.EMBEDDING_CACHE_STORAGE
+            )
+        
+        # 初始化图片描述缓存
+        self.description_cache = DescriptionCache(
+            Config.IMAGE_DESCRIPTION_CACHE_PATH,
+            max_entries=Config.IMAGE_DESCRIPTION_CACHE_MAX_ENTRIES
+        )
+        
+        # 初始化LLM响应缓存（仅对RESPONSE_CACHE_STAGES中的阶段生效）
+        self.response_cache = ResponseCache(
+            ttl=Config.RESPONSE_CACHE_TTL,
+            max_entries=Config.RESPONSE_CACHE_MAX_ENTRIES
         )
         
         # 初始化ChromaDB
@@ -37,20 +86,23 @@ class AIService:
             metadata={"description": "实训报告文档向量存储"}
         )
         
-        print(f"AI服务初始化完成 - 模型: {self.model_name}, Embedding模型: {self.embedding_model}")
+        # 按任务划分的集合缓存：namespace -> collection
+        self._namespace_collections: Dict[str, Any] = {}
+        # 小规模命名空间使用进程内索引：namespace -> InMemoryVectorIndex
+        self._memory_indexes: Dict[str, InMemoryVectorIndex] = {}
+        # 命名空间的BM25倒排索引，与向量检索结果做倒数排名融合：namespace -> BM25Index
+        self._lexical_indexes: Dict[str, BM25Index] = {}
+        
+        print(f"AI服务初始化完成 - 模型: {self.model_name}, Embedding模型: {self.embedding_backend.name}")
 
     async def get_embeddings(self, text: str) -> List[float]:
         """获取文本的向量表示"""
+        cached = (await self._get_cached_embeddings([text]))[0]
+        if cached is not None:
+            return cached
         try:
-            # 使用最新版本OpenAI客户端获取embedding
-            response = self.client.embeddings.create(
-                input=[text],
-                dimensions=1024,
-                model=self.embedding_model,
-                encoding_format="float"
-            )
-            
-            embedding = response.data[0].embedding
+            embedding = (await self.embedding_backend.embed_batch([text]))[0]
+            await self._put_cached_embeddings([text], [embedding])
             print(f"✅ 成功获取embedding，维度: {len(embedding)}")
             return embedding
             
@@ -59,43 +111,216 @@ class AIService:
             # 使用简单的哈希作为备用方案
             return self._fallback_embedding(text)
 
+    async def _get_cached_embeddings(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """从持久化缓存中查询向量，未命中的位置为None"""
+        if not self.embedding_cache:
+            return [None] * len(texts)
+        return await asyncio.to_thread(
+            self.embedding_cache.get_many, self.embedding_backend.name, self.embedding_backend.cache_dimensions, texts
+        )
+
+    async def _put_cached_embeddings(self, texts: List[str], embeddings: List[List[float]]):
+        """将后端返回的向量写入持久化缓存（备用embedding不写入）"""
+        if self.embedding_cache and texts:
+            await asyncio.to_thread(
+                self.embedding_cache.put_many, self.embedding_backend.name, self.embedding_backend.cache_dimensions, texts, embeddings
+            )
+
+    async def get_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
+        """批量获取文本向量：先查缓存，未命中的文本按后端的批大小打包，有限并发地请求各批次"""
+        embeddings = await self._get_cached_embeddings(texts)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        missing_texts = [texts[i] for i in missing]
+        
+        batch_size = self.embedding_backend.batch_size
+        semaphore = asyncio.Semaphore(self.embedding_backend.concurrency)
+        batches = [missing_texts[i:i + batch_size] for i in range(0, len(missing_texts), batch_size)]
+
+        async def embed_batch(batch: List[str]):
+            async with semaphore:
+                try:
+                    return await self.embedding_backend.embed_batch(batch), True
+                except Exception as e:
+                    print(f"❌ 批量Embedding调用失败: {e}")
+                    return [self._fallback_embedding(text) for text in batch], False
+
+        results = await asyncio.gather(*[embed_batch(batch) for batch in batches])
+        
+        fresh = []
+        cacheable_texts, cacheable_embeddings = [], []
+        for batch, (batch_embeddings, from_api) in zip(batches, results):
+            fresh.extend(batch_embeddings)
+            if from_api:
+                cacheable_texts.extend(batch)
+                cacheable_embeddings.extend(batch_embeddings)
+        for i, embedding in zip(missing, fresh):
+            embeddings[i] = embedding
+        await self._put_cached_embeddings(cacheable_texts, cacheable_embeddings)
+        
+        print(f"✅ 批量获取embedding完成: {len(texts)} 条文本, 缓存命中 {len(texts) - len(missing)} 条, {len(batches)} 个批次")
+        return embeddings
+
     def _fallback_embedding(self, text: str) -> List[float]:
-        """备用embedding方法"""
-        # 使用简单的哈希生成1024维向量
-        hash_obj = hashlib.sha256(text.encode())
-        hash_hex = hash_obj.hexdigest()
-        
-        # 将哈希转换为1024维向量
-        embedding = []
-        for i in range(1024):
-            start = (i * 2) % len(hash_hex)
-            end = start + 2
-            if end > len(hash_hex):
-                end = len(hash_hex)
-            hex_part = hash_hex[start:end]
-            if len(hex_part) < 2:
-                hex_part = hex_part + "0" * (2 - len(hex_part))
-            value = int(hex_part, 16) / 255.0  # 归一化到0-1
-            embedding.append(value)
-        
-        print(f"使用备用embedding方法，维度: {len(embedding)}")
-        return embedding
-
-    async def add_documents_to_vectorstore(self, documents: List[Dict[str, Any]]):
-        """将文档添加到向量数据库"""
+        """备用embedding方法：字符n-gram特征哈希，维度与当前后端一致，接口不可用时仍能按字面相似度检索"""
+        dimensions = self.embedding_backend.dimensions or Config.EMBEDDING_DIMENSIONS
+        return hashing_embedding(text, dimensions)
+
+    @staticmethod
+    def _namespace_collection_name(namespace: str) -> str:
+        """命名空间对应的集合名"""
+        return f"{Config.VECTOR_NAMESPACE_PREFIX}{namespace}"
+
+    async def _get_collection(self, namespace: str = None):
+        """获取命名空间对应的集合，未指定命名空间时使用全局集合
+
+        命名空间字典只在事件循环中读写，只有ChromaDB调用在线程中执行。
+        """
+        if namespace is None:
+            return self.collection
+        collection = self._namespace_collections.get(namespace)
+        if collection is None:
+            collection = await asyncio.to_thread(
+                self.chroma_client.get_or_create_collection,
+                name=self._namespace_collection_name(namespace),
+                # 与进程内索引一致使用余弦距离，迁移的归一化向量与新写入的原始向量可直接比较
+                metadata={"description": "实训报告任务文档向量存储", "created_at": time.time(), "hnsw:space": "cosine"}
+            )
+            # 等待期间其他请求可能已缓存同一集合
+            collection = self._namespace_collections.setdefault(namespace, collection)
+        return collection
+
+    async def _find_collection(self, namespace: str = None):
+        """获取已存在的命名空间集合，不存在时返回None（检索时使用，不创建空集合）"""
+        if namespace is None:
+            return self.collection
+        collection = self._namespace_collections.get(namespace)
+        if collection is None:
+            try:
+                collection = await asyncio.to_thread(
+                    self.chroma_client.get_collection, name=self._namespace_collection_name(namespace)
+                )
+            except ValueError:
+                return None
+            collection = self._namespace_collections.setdefault(namespace, collection)
+        return collection
+
+    async def _memory_index_for(self, namespace: str, incoming: int) -> Optional[InMemoryVectorIndex]:
+        """返回可容纳incoming条新文档的进程内索引；命名空间超出VECTOR_MEMORY_INDEX_MAX_DOCS时返回None"""
+        if namespace is None or namespace in self._namespace_collections:
+            return None
+        index = self._memory_indexes.get(namespace)
+        existing = len(index) if index else 0
+        if existing + incoming <= Config.VECTOR_MEMORY_INDEX_MAX_DOCS:
+            if index is None:
+                index = self._memory_indexes[namespace] = InMemoryVectorIndex(storage=Config.VECTOR_INDEX_STORAGE)
+            return index
+        if index is not None:
+            # 超出容量，已有内容迁移到ChromaDB；集合登记后再取出索引，等待期间写入的文档一并迁移
+            collection = await self._get_collection(namespace)
+            index = self._memory_indexes.pop(namespace, None)
+            if index is not None:
+                await asyncio.to_thread(
+                    collection.add,
+                    embeddings=index.vectors().tolist(),
+                    documents=index.documents,
+                    metadatas=index.metadatas,
+                    ids=index.ids
+                )
+        return None
+
+    async def drop_namespace(self, namespace: str):
+        """删除命名空间对应的索引或集合（任务完成后调用）"""
+        self._lexical_indexes.pop(namespace, None)
+        if self._memory_indexes.pop(namespace, None) is not None:
+            return
+        self._namespace_collections.pop(namespace, None)
+        try:
+            await asyncio.to_thread(self.chroma_client.delete_collection, self._namespace_collection_name(namespace))
+        except ValueError:
+            # 集合不存在（已被删除或从未写入）
+            pass
+        except Exception as e:
+            print(f"删除向量命名空间失败: {e}")
+
+    def _delete_expired_collections(self, expire_before: float) -> int:
+        """删除创建时间早于expire_before的命名空间集合，返回删除数量（阻塞调用，在线程中执行）"""
+        dropped = 0
+        for collection in self.chroma_client.list_collections():
+            if not collection.name.startswith(Config.VECTOR_NAMESPACE_PREFIX):
+                continue
+            created_at = (collection.metadata or {}).get("created_at", 0)
+            if created_at >= expire_before:
+                continue
+            try:
+                self.chroma_client.delete_collection(collection.name)
+                dropped += 1
+            except ValueError:
+                # 其他进程已删除
+                continue
+        return dropped
+
+    async def sweep_expired_namespaces(self, max_age: float) -> int:
+        """清理过期的命名空间索引和集合（异常退出的任务遗留的数据），返回删除数量
+
+        进程内的索引字典与请求处理共用，在事件循环中选出并移除过期项；
+        只有ChromaDB集合的删除在线程中执行。
+        """
+        expire_before = time.time() - max_age
+        expired = [namespace for namespace, index in self._memory_indexes.items() if index.created_at < expire_before]
+        for namespace in expired:
+            self._memory_indexes.pop(namespace, None)
+        for namespace in [namespace for namespace, index in self._lexical_indexes.items() if index.created_at < expire_before]:
+            self._lexical_indexes.pop(namespace, None)
+        # 即将被删除的集合对象不再缓存
+        for namespace in [
+            namespace for namespace, collection in self._namespace_collections.items()
+            if (collection.metadata or {}).get("created_at", 0) < expire_before
+        ]:
+            self._namespace_collections.pop(namespace, None)
+        dropped = len(expired)
+        try:
+            dropped += await asyncio.to_thread(self._delete_expired_collections, expire_before)
+        except Exception as e:
+            print(f"清理过期向量命名空间失败: {e}")
+        if dropped:
+            print(f"已清理 {dropped} 个过期的向量命名空间")
+        return dropped
+
+    async def add_documents_to_vectorstore(self, documents: List[Dict[str, Any]], namespace: str = None) -> bool:
+        """将文档添加到向量数据库，返回是否写入成功
+
+        指定namespace时写入该任务独立的命名空间：文档数不超过VECTOR_MEMORY_INDEX_MAX_DOCS时
+        使用进程内索引，否则使用ChromaDB集合；未指定时写入全局集合。
+        文档可通过 "id" 指定id，否则由序号和来源路径生成确定性的id；相同id的记录会被覆盖。
+        """
         try:
             texts = [doc["content"] for doc in documents]
             metadatas = [{"source": doc["source"], "type": doc["type"]} for doc in documents]
-            ids = [f"doc_{i}_{hash(doc['source'])}" for i, doc in enumerate(documents)]
+            ids = [
+                doc.get("id") or f"doc_{i}_{hashlib.sha1(doc['source'].encode('utf-8')).hexdigest()[:16]}"
+                for i, doc in enumerate(documents)
+            ]
+            
+            if not texts:
+                return True
+            
+            # 批量获取所有文档的embeddings
+            embeddings = await self.get_embeddings_batch(texts)
             
-            # 获取所有文档的embeddings
-            embeddings = []
-            for text in texts:
-                embedding = await self.get_embeddings(text)
-                embeddings.append(embedding)
+            if namespace is not None and Config.HYBRID_SEARCH_ENABLED:
+                lexical = self._lexical_indexes.setdefault(namespace, BM25Index())
+                await asyncio.to_thread(lexical.add, ids, texts, metadatas)
             
-            # 添加到ChromaDB
-            self.collection.add(
+            index = await self._memory_index_for(namespace, len(texts))
+            if index is not None:
+                index.add(embeddings, texts, metadatas, ids)
+                print(f"成功添加 {len(documents)} 个文档到内存向量索引")
+                return True
+            
+            # 一次性写入ChromaDB（在线程中执行，避免阻塞事件循环）
+            collection = await self._get_collection(namespace)
+            await asyncio.to_thread(
+                collection.upsert,
                 embeddings=embeddings,
                 documents=texts,
                 metadatas=metadatas,
@@ -103,65 +328,170 @@ class AIService:
             )
             
             print(f"成功添加 {len(documents)} 个文档到向量数据库")
+            return True
             
         except Exception as e:
             print(f"添加文档到向量数据库失败: {e}")
+            return False
 
-    async def search_similar_documents(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
-        """搜索相似文档"""
+    async def delete_documents(self, ids: List[str], namespace: str = None):
+        """按id从向量数据库中删除文档"""
+        if not ids:
+            return
+        try:
+            collection = await self._get_collection(namespace)
+            await asyncio.to_thread(collection.delete, ids=ids)
+            print(f"已从向量数据库删除 {len(ids)} 个文档")
+        except Exception as e:
+            print(f"从向量数据库删除文档失败: {e}")
+
+    async def _vector_search(self, query_embeddings: List[float], n_results: int, namespace: str = None) -> List[Dict[str, Any]]:
+        """向量检索，返回包含id、content、metadata、distance的结果列表"""
+        index = self._memory_indexes.get(namespace) if namespace is not None else None
+        if index is not None:
+            return index.query(query_embeddings, n_results)
+        
+        # 在ChromaDB中搜索，命名空间未写入过文档时没有对应的集合
+        collection = await self._find_collection(namespace)
+        if collection is None:
+            return []
+        results = await asyncio.to_thread(
+            collection.query,
+            query_embeddings=query_embeddings,
+            n_results=n_results
+        )
+        
+        # 格式化结果
+        similar_docs = []
+        if results["documents"] and results["documents"][0]:
+            for i, doc in enumerate(results["documents"][0]):
+                similar_docs.append({
+                    "id": results["ids"][0][i],
+                    "content": doc,
+                    "metadata": results["metadatas"][0][i] if results["metadatas"] and results["metadatas"][0] else {},
+                    "distance": results["distances"][0][i] if results["distances"] and results["distances"][0] else 0
+                })
+        return similar_docs
+
+    async def _embeddings_for(self, ids: List[str], namespace: str = None) -> np.ndarray:
+        """按文档id取出已入库的向量（顺序与ids一致），缺失的文档为零向量"""
+        index = self._memory_indexes.get(namespace) if namespace is not None else None
+        if index is not None:
+            return index.vectors_for_ids(ids)
+        collection = await self._find_collection(namespace)
+        if collection is None:
+            return np.zeros((len(ids), 0), dtype=np.float32)
+        stored = await asyncio.to_thread(collection.get, ids=ids, include=["embeddings"])
+        by_id = dict(zip(stored["ids"], stored["embeddings"] or []))
+        dims = len(next(iter(by_id.values()))) if by_id else 0
+        return np.array([by_id.get(doc_id) or [0.0] * dims for doc_id in ids], dtype=np.float32)
+
+    async def search_similar_documents(self, query: str, top_k: int = 5, namespace: str = None) -> List[Dict[str, Any]]:
+        """搜索相似文档，指定namespace时只在该任务的集合中搜索
+
+        命名空间建有BM25索引时（HYBRID_SEARCH_ENABLED），向量检索和BM25各取HYBRID_CANDIDATES个候选，
+        按倒数排名融合，只被BM25命中的文档distance为None。
+        MMR_ENABLED时先取MMR_FETCH_K个候选，再按最大边际相关性（MMR_LAMBDA）选出top_k个互不重复的文档，
+        否则直接返回前top_k个。
+        """
         try:
             # 获取查询的embedding
             query_embeddings = await self.get_embeddings(query)
+            fetch_k = max(top_k, Config.MMR_FETCH_K) if Config.MMR_ENABLED else top_k
             
-            # 在ChromaDB中搜索
-            results = self.collection.query(
-                query_embeddings=query_embeddings,
-                n_results=top_k
-            )
+            lexical = self._lexical_indexes.get(namespace) if namespace is not None else None
+            relevance = None
+            if not lexical:
+                candidates = await self._vector_search(query_embeddings, fetch_k, namespace)
+            else:
+                vector_docs = await self._vector_search(query_embeddings, max(fetch_k, Config.HYBRID_CANDIDATES), namespace)
+                lexical_hits = await asyncio.to_thread(lexical.search, query, max(fetch_k, Config.HYBRID_CANDIDATES))
+                fused = reciprocal_rank_fusion(
+                    [[doc["id"] for doc in vector_docs], [doc_id for doc_id, _ in lexical_hits]],
+                    k=Config.HYBRID_RRF_K
+                )[:fetch_k]
+                by_id = {doc["id"]: doc for doc in vector_docs}
+                candidates = [
+                    {**(by_id.get(doc_id) or {**lexical.get(doc_id), "distance": None}), "score": score}
+                    for doc_id, score in fused
+                ]
+                if candidates:
+                    # 融合得分线性缩放到0-1作为MMR的相关度（RRF得分本身集中在很窄的区间）
+                    scores = np.array([doc["score"] for doc in candidates])
+                    spread = scores.max() - scores.min()
+                    relevance = (scores - scores.min()) / spread if spread else np.ones(len(scores))
             
-            # 格式化结果
-            similar_docs = []
-            if results["documents"] and results["documents"][0]:
-                for i, doc in enumerate(results["documents"][0]):
-                    similar_docs.append({
-                        "content": doc,
-                        "metadata": results["metadatas"][0][i] if results["metadatas"] and results["metadatas"][0] else {},
-                        "distance": results["distances"][0][i] if results["distances"] and results["distances"][0] else 0
-                    })
+            if len(candidates) > top_k:
+                embeddings = await self._embeddings_for([doc["id"] for doc in candidates], namespace)
+                selected = await asyncio.to_thread(
+                    maximal_marginal_relevance, query_embeddings, embeddings, top_k, Config.MMR_LAMBDA, relevance
+                )
+                candidates = [candidates[i] for i in selected]
             
-            return similar_docs
+            return [{key: value for key, value in doc.items() if key != "id"} for doc in candidates]
             
         except Exception as e:
             print(f"搜索相似文档失败: {e}")
             return []
 
-    async def generate_report_with_prompt(self, query: str, custom_prompt: str, target_pages: int = None) -> str:
-        """使用自定义Prompt生成报告"""
-        try:
-            # 根据目标页数调整max_tokens
-            if target_pages and target_pages > 0:
-                # 估算每个页面的token数（中文约1.5字符=1token）
-                if target_pages <= 3:
-                    max_tokens = 2000
-                elif target_pages <= 6:
-                    max_tokens = 4000
-                elif target_pages <= 10:
-                    max_tokens = 8000
-                elif target_pages <= 15:
-                    max_tokens = 8192  # 限制最大值
-                else:
-                    max_tokens = 8192
-            else:
+    def _max_tokens_for_pages(self, target_pages: int = None) -> int:
+        """根据目标页数估算max_tokens"""
+        if target_pages and target_pages > 0:
+            # 估算每个页面的token数（中文约1.5字符=1token）
+            if target_pages <= 3:
+                max_tokens = 2000
+            elif target_pages <= 6:
                 max_tokens = 4000
-            max_tokens = min(max_tokens, 8192)  # 再次保险
+            elif target_pages <= 10:
+                max_tokens = 8000
+            elif target_pages <= 15:
+                max_tokens = 8192  # 限制最大值
+            else:
+                max_tokens = 8192
+        else:
+            max_tokens = 4000
+        return min(max_tokens, 8192)  # 再次保险
+
+    async def generate_report_with_prompt(self, query: str, custom_prompt: str, target_pages: int = None, max_tokens: int = None, stage: str = None) -> str:
+        """使用自定义Prompt生成报告，max_tokens未指定时按目标页数估算
+
+        stage标识调用所属阶段，该阶段在RESPONSE_CACHE_STAGES中时启用响应缓存
+        """
+        try:
+            max_tokens = max_tokens or self._max_tokens_for_pages(target_pages)
             print(f"📄 目标页数: {target_pages or '自动'}, 设置max_tokens: {max_tokens}")
             # 直接使用传入的自定义Prompt调用API
-            report = await self._call_qwen_api(custom_prompt, max_tokens)
+            report = await self._call_qwen_api(custom_prompt, max_tokens, stage=stage)
             return report
         except Exception as e:
             print(f"❌ 使用自定义Prompt生成报告失败: {e}")
             return f"生成报告时出现错误: {str(e)}"
 
+    async def generate_json_with_prompt(self, prompt: str, max_tokens: int, stage: str = None) -> Dict[str, Any]:
+        """要求模型以JSON对象输出并解析结果，调用或解析失败时抛出异常"""
+        content = await self._cached_completion(prompt, max_tokens, stage, json_mode=True)
+        result = json.loads(content)
+        if not isinstance(result, dict):
+            raise ValueError(f"模型返回的JSON不是对象: {content[:100]}")
+        print(f"✅ 成功生成结构化内容，字段: {list(result.keys())}")
+        return result
+
+    async def stream_report_with_prompt(self, custom_prompt: str, target_pages: int = None) -> AsyncIterator[str]:
+        """使用自定义Prompt流式生成报告，逐段返回模型输出的文本"""
+        max_tokens = self._max_tokens_for_pages(target_pages)
+        print(f"📄 流式生成，目标页数: {target_pages or '自动'}, 设置max_tokens: {max_tokens}")
+        stream = await self.client.chat.completions.create(
+            model=self.model_name,
+            messages=[{"role": "user", "content": custom_prompt}],
+            temperature=0.7,
+            max_tokens=max_tokens,
+            top_p=0.9,
+            stream=True
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
     async def generate_report(self, query: str, context: List[str]) -> str:
         """生成报告（保持向后兼容）"""
         try:
@@ -217,21 +547,11 @@ class AIService:
 
         return prompt
 
-    async def _call_qwen_api(self, prompt: str, max_tokens: int) -> str:
+    async def _call_qwen_api(self, prompt: str, max_tokens: int = 4000, stage: str = None) -> str:
         """调用千问API生成报告内容"""
         try:
             print(f"调用千问API生成报告...")
-            
-            # 使用最新版本OpenAI客户端调用聊天API
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.7,
-                max_tokens=max_tokens,
-                top_p=0.9
-            )
-            
-            content = response.choices[0].message.content
+            content = await self._cached_completion(prompt, max_tokens, stage)
             print(f"✅ 成功生成报告内容，长度: {len(content)}")
             return content
             
@@ -239,6 +559,89 @@ class AIService:
             print(f"❌ 千问API调用失败: {e}")
             return f"抱歉，生成报告时出现错误: {str(e)}"
 
+    async def _cached_completion(self, prompt: str, max_tokens: int, stage: str = None, json_mode: bool = False) -> str:
+        """请求对话补全；stage开启缓存时先查响应缓存，并合并相同的在途请求"""
+        temperature = 0.7
+        
+        async def request() -> str:
+            # 使用异步OpenAI客户端调用聊天API
+            extra_args = {"response_format": {"type": "json_object"}} if json_mode else {}
+            response = await self.client.chat.completions.create(
+                model=self.model_name,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=temperature,
+                max_tokens=max_tokens,
+                top_p=0.9,
+                **extra_args
+            )
+            return response.choices[0].message.content
+        
+        if stage not in Config.RESPONSE_CACHE_STAGES:
+            return await request()
+        key = self.response_cache.make_key(self.model_name, prompt, temperature, max_tokens, "json" if json_mode else "")
+        return await self.response_cache.get_or_compute(key, request)
+
+    @staticmethod
+    def _encode_image_for_vision(raw: bytes) -> str:
+        """将图片缩放到长边不超过配置值并转为JPEG，返回data URL"""
+        with Image.open(io.BytesIO(raw)) as image:
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((Config.IMAGE_DESCRIPTION_MAX_SIDE, Config.IMAGE_DESCRIPTION_MAX_SIDE))
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            buffer = io.BytesIO()
+            image.save(buffer, format="JPEG", quality=Config.IMAGE_DESCRIPTION_JPEG_QUALITY)
+        return f"data:image/jpeg;base64,{base64.b64encode(buffer.getvalue()).decode('utf-8')}"
+
+    async def describe_image(self, file_path: str, ext: str = "png", content_hash: str = None) -> str:
+        """调用视觉模型，用一句话描述图片内容
+
+        按图片内容的sha256缓存描述；发送前先缩放图片，减小请求体积。
+        content_hash可由调用方传入（如上传时已计算），此时命中缓存无需读取文件；否则读取文件后计算。
+        """
+        raw = None
+        if content_hash is None:
+            async with aiofiles.open(file_path, "rb") as image_file:
+                raw = await image_file.read()
+            content_hash = hashlib.sha256(raw).hexdigest()
+        cached = await asyncio.to_thread(self.description_cache.get, self.vision_model, content_hash)
+        if cached is not None:
+            print(f"✅ 图片描述命中缓存: {os.path.basename(file_path)}")
+            return cached
+        if raw is None:
+            async with aiofiles.open(file_path, "rb") as image_file:
+                raw = await image_file.read()
+        
+        try:
+            image_url = await asyncio.to_thread(self._encode_image_for_vision, raw)
+        except Exception as e:
+            # Pillow无法解析时按原图发送
+            print(f"⚠️ 图片缩放失败，使用原图: {e}")
+            image_url = f"data:image/{ext};base64,{base64.b64encode(raw).decode('utf-8')}"
+        completion = await self.client.chat.completions.create(
+            model=self.vision_model,
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "image_url",
+                            "image_url": {"url": image_url},
+                        },
+                        {"type": "text", "text": "请用一句话描述这张图片的内容。"},
+                    ],
+                }
+            ],
+        )
+        description = completion.choices[0].message.content
+        await asyncio.to_thread(self.description_cache.put, self.vision_model, content_hash, description)
+        return description
+
+    async def aclose(self):
+        """关闭embedding后端和共享的HTTP连接池"""
+        await self.embedding_backend.aclose()
+        await self.http_client.aclose()
+
     async def clear_vectorstore(self):
         """清空向量数据库"""
         try:
@@ -0,0 +1,296 @@
+import asyncio
+import hashlib
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from services.sqlite_store import SQLiteStore
+
+
+def normalize_text(text: str) -> str:
+    """归一化文本：统一全半角、去除首尾空白并合并连续空白"""
+    text = unicodedata.normalize("NFKC", text)
+    return " ".join(text.split())
+
+
+class _SQLiteLRUStore(SQLiteStore):
+    """SQLite持久化缓存的公共部分：LRU淘汰和命中统计
+
+    子类通过 table 指定表名，并在 _create_table 中建表（需包含 key 和 last_access 列）。
+    """
+
+    table = ""
+
+    def __init__(self, db_path: str, max_entries: int):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        super().__init__(db_path)
+        self._conn.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{self.table}_last_access ON {self.table}(last_access)"
+        )
+        self._conn.commit()
+
+    def _touch(self, keys: List[Union[str, bytes]]):
+        """更新命中条目的访问时间（调用方需持有锁）"""
+        if keys:
+            now = time.time()
+            self._conn.executemany(
+                f"UPDATE {self.table} SET last_access = ? WHERE key = ?",
+                [(now, key) for key in keys]
+            )
+
+    def _evict(self):
+        """按LRU淘汰超出容量的条目（调用方需持有锁）"""
+        count = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN "
+                f"(SELECT key FROM {self.table} ORDER BY last_access ASC LIMIT ?)",
+                (overflow,)
+            )
+
+    def stats(self) -> Dict[str, float]:
+        """返回命中统计"""
+        with self._lock:
+            entries = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+
+class EmbeddingCache(_SQLiteLRUStore):
+    """基于SQLite的持久化embedding缓存
+
+    以 hash(模型, 维度, 归一化文本) 的32字节摘要为键，命中时直接返回向量，无需调用API。
+    超过容量上限时按最近访问时间淘汰（LRU）。
+    storage 为 float16 时向量以半精度写入，占用空间减半；读取时按字节长度识别格式，兼容已有的float32条目。
+
+    1024维float16向量每行约2KB，默认4KB的页只能放下一行，半精度节省的空间都成了页内空闲，
+    因此float16的缓存文件使用16KB的页；float32每行约4KB，默认页大小下溢出页的布局更紧凑，保持默认。
+    """
+
+    table = "embedding_vectors"
+
+    def __init__(self, db_path: str, max_entries: int = 100000, storage: str = "float32"):
+        if storage not in ("float32", "float16"):
+            raise ValueError(f"不支持的缓存向量格式: {storage}")
+        self.storage = storage
+        self.page_size = 16384 if storage == "float16" else 0
+        super().__init__(db_path, max_entries)
+
+    def _create_table(self):
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embedding_vectors (
+                key BLOB PRIMARY KEY,
+                dims INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+
+    @staticmethod
+    def make_key(model: str, dims: int, text: str) -> bytes:
+        """生成缓存键（sha256摘要）"""
+        payload = f"{model}\x00{dims}\x00{normalize_text(text)}"
+        return hashlib.sha256(payload.encode("utf-8")).digest()
+
+    def get_many(self, model: str, dims: int, texts: List[str]) -> List[Optional[List[float]]]:
+        """批量查询缓存，未命中的位置返回None"""
+        keys = [self.make_key(model, dims, text) for text in texts]
+        found: Dict[bytes, List[float]] = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            # SQLite单条语句的参数数量有限，分批查询
+            for i in range(0, len(unique_keys), 500):
+                part = unique_keys[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, dims, vector FROM embedding_vectors WHERE key IN ({placeholders})", part
+                ).fetchall()
+                for key, dims, blob in rows:
+                    found[key] = self._decode(dims, blob)
+            if found:
+                self._touch(list(found))
+                self._conn.commit()
+        results = [found.get(key) for key in keys]
+        hit_count = sum(1 for result in results if result is not None)
+        self.hits += hit_count
+        self.misses += len(results) - hit_count
+        return results
+
+    def _encode(self, vector: List[float]) -> bytes:
+        if self.storage == "float16":
+            return np.asarray(vector, dtype=np.float16).tobytes()
+        return array("f", vector).tobytes()
+
+    @staticmethod
+    def _decode(dims: int, blob: bytes) -> List[float]:
+        if len(blob) == dims * 2:
+            return np.frombuffer(blob, dtype=np.float16).astype(np.float32).tolist()
+        return array("f", blob).tolist()
+
+    def get(self, model: str, dims: int, text: str) -> Optional[List[float]]:
+        """查询单条文本的缓存向量"""
+        return self.get_many(model, dims, [text])[0]
+
+    def put_many(self, model: str, dims: int, texts: List[str], vectors: List[List[float]]):
+        """批量写入缓存，并在超出容量时淘汰最久未访问的条目"""
+        if not texts:
+            return
+        now = time.time()
+        rows = [
+            (self.make_key(model, dims, text), len(vector), self._encode(vector), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embedding_vectors (key, dims, vector, last_access) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self._evict()
+            self._conn.commit()
+
+    def put(self, model: str, dims: int, text: str, vector: List[float]):
+        """写入单条文本的向量"""
+        self.put_many(model, dims, [text], [vector])
+
+
+class DescriptionCache(_SQLiteLRUStore):
+    """图片描述缓存：以 hash(视觉模型, 图片内容) 为键，重复上传的截图无需再次调用视觉模型"""
+
+    table = "image_descriptions"
+
+    def __init__(self, db_path: str, max_entries: int = 20000):
+        super().__init__(db_path, max_entries)
+
+    def _create_table(self):
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS image_descriptions (
+                key TEXT PRIMARY KEY,
+                description TEXT NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+
+    @staticmethod
+    def make_key(model: str, content_hash: str) -> str:
+        """生成缓存键，content_hash为图片文件内容的sha256"""
+        return hashlib.sha256(f"{model}\x00{content_hash}".encode("utf-8")).hexdigest()
+
+    def get(self, model: str, content_hash: str) -> Optional[str]:
+        """查询图片描述，未命中返回None"""
+        key = self.make_key(model, content_hash)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT description FROM image_descriptions WHERE key = ?", (key,)
+            ).fetchone()
+            if row:
+                self._touch([key])
+                self._conn.commit()
+        if row:
+            self.hits += 1
+            return row[0]
+        self.misses += 1
+        return None
+
+    def put(self, model: str, content_hash: str, description: str):
+        """写入图片描述"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO image_descriptions (key, description, last_access) VALUES (?, ?, ?)",
+                (self.make_key(model, content_hash), description, time.time())
+            )
+            self._evict()
+            self._conn.commit()
+
+
+class ResponseCache:
+    """LLM响应的内存缓存：TTL过期、LRU容量上限，并合并相同的在途请求（single-flight）
+
+    只缓存成功的响应；同一键的并发请求共享一次上游调用的结果。
+    """
+
+    def __init__(self, ttl: float = 3600, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def make_key(model: str, prompt: str, temperature: float, max_tokens: int, extra: str = "") -> str:
+        """生成缓存键"""
+        payload = f"{model}\x00{temperature}\x00{max_tokens}\x00{extra}\x00{prompt}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """查询未过期的缓存响应"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: str):
+        """写入响应，超出容量时淘汰最久未使用的条目"""
+        self._entries[key] = (time.time() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[str]]) -> str:
+        """命中缓存直接返回；相同键已有在途请求时等待其结果；否则调用compute并缓存结果
+
+        compute在独立的任务中执行，发起者和等待者都通过asyncio.shield等待：
+        任何一个调用方被取消都不会取消上游调用，也不会让其他等待者收到CancelledError。
+        """
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(compute())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Future):
+        """在途任务完成：成功的结果写入缓存，并移除在途记录"""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if task.cancelled():
+            return
+        # 所有等待者都已取消时避免"exception was never retrieved"警告
+        if task.exception() is None:
+            self.put(key, task.result())
+
+    def stats(self) -> Dict[str, float]:
+        """返回命中统计"""
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced
+        }
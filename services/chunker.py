@@ -0,0 +1,139 @@
+import io
+import re
+from typing import Iterable, Iterator, List, Union
+
+from config import Config
+from services.context_packer import split_sentences
+
+HEADING_PATTERN = re.compile(r"^\s{0,3}#{1,6}\s")
+FENCE_PATTERN = re.compile(r"^\s*(```|~~~)")
+
+
+def iter_blocks(lines: Iterable[str]) -> Iterator[tuple]:
+    """按Markdown结构逐块读取文本，产出 (类型, 内容)
+
+    类型为 heading（标题行）、code（完整的代码块，含围栏）或 paragraph（以空行分隔的段落）。
+    """
+    paragraph: List[str] = []
+    code: List[str] = []
+    fence = None
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if fence:
+            code.append(line)
+            if line.strip().startswith(fence):
+                yield "code", "\n".join(code)
+                code, fence = [], None
+            continue
+        match = FENCE_PATTERN.match(line)
+        if match:
+            if paragraph:
+                yield "paragraph", "\n".join(paragraph)
+                paragraph = []
+            fence = match.group(1)
+            code = [line]
+            continue
+        if HEADING_PATTERN.match(line):
+            if paragraph:
+                yield "paragraph", "\n".join(paragraph)
+                paragraph = []
+            yield "heading", line.strip()
+            continue
+        if not line.strip():
+            if paragraph:
+                yield "paragraph", "\n".join(paragraph)
+                paragraph = []
+            continue
+        paragraph.append(line)
+    if code:
+        # 未闭合的代码块
+        yield "code", "\n".join(code)
+    if paragraph:
+        yield "paragraph", "\n".join(paragraph)
+
+
+def _split_oversized(kind: str, block: str, chunk_size: int) -> List[str]:
+    """把超过chunk_size的块拆成不超过chunk_size的单元
+
+    代码块按行拆分，每部分重新补上围栏；段落按句子拆分；仍然过长的句子按字符截断。
+    """
+    if kind == "code":
+        lines = block.split("\n")
+        opening = lines[0]
+        closing = lines[-1] if len(lines) > 1 and FENCE_PATTERN.match(lines[-1]) else ""
+        body = lines[1:-1] if closing else lines[1:]
+        budget = max(1, chunk_size - len(opening) - len(closing) - 2)
+        pieces, current, size = [], [], 0
+        for line in body:
+            for start in range(0, max(len(line), 1), budget):
+                part = line[start:start + budget]
+                if current and size + len(part) + 1 > budget:
+                    pieces.append("\n".join([opening, *current, closing or opening[:3]]))
+                    current, size = [], 0
+                current.append(part)
+                size += len(part) + 1
+        if current:
+            pieces.append("\n".join([opening, *current, closing or opening[:3]]))
+        return pieces
+    units = []
+    for sentence in split_sentences(block):
+        if len(sentence) <= chunk_size:
+            units.append(sentence)
+        else:
+            units.extend(sentence[i:i + chunk_size] for i in range(0, len(sentence), chunk_size))
+    return units
+
+
+def iter_chunks(source: Union[str, Iterable[str]], chunk_size: int = None, overlap: int = None) -> Iterator[str]:
+    """结构感知的流式分段：按标题、段落、代码块和中文句末标点切分，逐个产出分段
+
+    - 相邻的块合并到不超过chunk_size个字符
+    - 超长的块按句子（代码块按行）拆分
+    - 新分段以上一分段末尾不超过overlap个字符的完整单元开头，保持上下文连续
+    - 已积累超过一半chunk_size时遇到标题会开始新分段，新章节不带重叠内容
+
+    source 可以是字符串或逐行的可迭代对象（如打开的文件），按需读取。
+    """
+    chunk_size = chunk_size or Config.CHUNK_SIZE
+    overlap = Config.CHUNK_OVERLAP if overlap is None else overlap
+    overlap = max(0, min(overlap, chunk_size // 2))
+    lines = io.StringIO(source) if isinstance(source, str) else source
+
+    # 当前分段的单元：(文本, 与前一单元的分隔符, 块类型)
+    units: List[tuple] = []
+    size = 0
+
+    def render(parts: List[tuple]) -> str:
+        return "".join((sep if i else "") + text for i, (text, sep, _) in enumerate(parts)).strip()
+
+    def overlap_tail(parts: List[tuple]) -> List[tuple]:
+        """取末尾总长不超过overlap的完整单元，代码块不参与重叠；
+        最后一个单元已超过overlap时取其末尾overlap个字符"""
+        tail, total = [], 0
+        for text, sep, kind in reversed(parts):
+            if kind == "code" or total + len(text) + len(sep) > overlap:
+                break
+            tail.insert(0, (text, sep, kind))
+            total += len(text) + len(sep)
+        if not tail and overlap and parts and parts[-1][2] != "code":
+            tail = [(parts[-1][0][-overlap:], "", parts[-1][2])]
+        return tail
+
+    for kind, block in iter_blocks(lines):
+        if kind == "heading" and units and size >= chunk_size // 2:
+            yield render(units)
+            units, size = [], 0
+        pieces = [block] if len(block) <= chunk_size else _split_oversized(kind, block, chunk_size)
+        for index, piece in enumerate(pieces):
+            sep = "\n\n" if index == 0 or kind == "code" else ""
+            if units and size + len(sep) + len(piece) > chunk_size:
+                yield render(units)
+                units = overlap_tail(units)
+                size = sum(len(text) + len(s) for text, s, _ in units)
+                # 重叠部分加上新单元仍超长时放弃重叠
+                if size + len(sep) + len(piece) > chunk_size:
+                    units, size = [], 0
+            units.append((piece, sep, kind))
+            size += len(sep) + len(piece)
+    if units:
+        yield render(units)
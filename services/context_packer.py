@@ -0,0 +1,100 @@
+import math
+import re
+from typing import Any, Dict, List
+
+# 中日韩文字及全角标点：按每字1个token保守估算
+CJK_RANGES = r"\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef"
+CJK_PATTERN = re.compile(f"[{CJK_RANGES}]")
+# 英文单词、数字、标识符：约每4个字符1个token
+WORD_PATTERN = re.compile(r"[A-Za-z0-9_]+")
+# 其余非空白符号（代码中的括号、运算符等）：每个符号1个token
+SYMBOL_PATTERN = re.compile(f"[^\\sA-Za-z0-9_{CJK_RANGES}]")
+# 句子边界：中文句末标点、英文句末标点后接空白、换行
+SENTENCE_PATTERN = re.compile(r".*?(?:[。！？；!?;]+|\.(?=\s)|\n+|$)", re.S)
+
+CHUNK_SEPARATOR = "\n\n"
+
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的token数，适用于中文、英文和代码混合的内容"""
+    if not text:
+        return 0
+    cjk = len(CJK_PATTERN.findall(text))
+    words = sum(math.ceil(len(word) / 4) for word in WORD_PATTERN.findall(text))
+    symbols = len(SYMBOL_PATTERN.findall(text))
+    return cjk + words + symbols
+
+
+def split_sentences(text: str) -> List[str]:
+    """按句子边界切分文本，保留标点和换行"""
+    return [sentence for sentence in SENTENCE_PATTERN.findall(text) if sentence]
+
+
+def trim_to_tokens(text: str, max_tokens: int) -> str:
+    """在句子边界处截断文本，使其估算token数不超过max_tokens
+
+    第一句就超出预算时，退化为按字符截断。
+    """
+    if max_tokens <= 0:
+        return ""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    kept = []
+    used = 0
+    for sentence in split_sentences(text):
+        cost = estimate_tokens(sentence)
+        if used + cost > max_tokens:
+            break
+        kept.append(sentence)
+        used += cost
+    if kept:
+        return "".join(kept).rstrip()
+    # 二分查找不超过预算的最长前缀
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid]) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low]
+
+
+def pack_context(chunks: List[str], token_budget: int, max_chunk_tokens: int = None) -> Dict[str, Any]:
+    """按相关度顺序将检索片段装入token预算
+
+    每个片段最多占用max_chunk_tokens，超出时在句子边界截断；
+    预算不足以容纳下一个片段时截断该片段并停止。
+
+    返回 {"text": 拼接后的上下文, "used_tokens": 估算token数, "included": 使用的片段数, "truncated": 被截断的片段数}
+    """
+    separator_tokens = estimate_tokens(CHUNK_SEPARATOR)
+    parts = []
+    used = 0
+    truncated = 0
+    for chunk in chunks:
+        chunk = chunk.strip()
+        if not chunk:
+            continue
+        remaining = token_budget - used - (separator_tokens if parts else 0)
+        if remaining <= 0:
+            break
+        limit = min(remaining, max_chunk_tokens) if max_chunk_tokens else remaining
+        piece = trim_to_tokens(chunk, limit)
+        if not piece:
+            break
+        if piece != chunk:
+            truncated += 1
+        if parts:
+            used += separator_tokens
+        parts.append(piece)
+        used += estimate_tokens(piece)
+        if piece != chunk and limit == remaining:
+            # 预算已用尽
+            break
+    return {
+        "text": CHUNK_SEPARATOR.join(parts),
+        "used_tokens": used,
+        "included": len(parts),
+        "truncated": truncated
+    }
@@ -0,0 +1,80 @@
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+from services.cache import normalize_text
+from services.embedding_backends import char_ngram_hashes
+
+SIMHASH_BITS = 64
+_BIT_SHIFTS = np.arange(SIMHASH_BITS, dtype=np.uint64)
+
+
+def simhash(text: str, ngram: int = 3) -> int:
+    """计算文本的64位SimHash指纹（特征为字符n-gram）
+
+    每个n-gram哈希的各比特为1时投+1票、为0时投-1票，票数为正的比特置1。
+    相似文本的指纹汉明距离小。
+    """
+    hashes = next(char_ngram_hashes(text, (ngram, ngram)), None)
+    if hashes is None or not len(hashes):
+        # 文本短于n个字符时退化为单字特征
+        hashes = next(char_ngram_hashes(text, (1, 1)), np.zeros(0, dtype=np.uint64))
+    if not len(hashes):
+        return 0
+    bits = (hashes[:, None] >> _BIT_SHIFTS) & np.uint64(1)
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 - len(hashes)
+    return int(np.sum((votes > 0).astype(np.uint64) << _BIT_SHIFTS))
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    """uint64数组逐元素统计比特1的个数"""
+    return np.unpackbits(values.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+def max_distance_for(threshold: float) -> int:
+    """相似度阈值（0-1）换算为允许的最大汉明距离"""
+    return int((1.0 - threshold) * SIMHASH_BITS)
+
+
+class NearDuplicateFilter:
+    """跨批次的分段去重：记住已保留分段的归一化文本和SimHash指纹，
+    逐批过滤时后续批次中与之前批次重复的分段同样会被去除（如逐个文件入库时）"""
+
+    def __init__(self, threshold: float = 0.95,
+                 key: Callable[[Dict[str, Any]], str] = lambda chunk: chunk["content"]):
+        self.max_distance = max_distance_for(threshold) if threshold < 1 else -1
+        self.key = key
+        self._seen_texts = set()
+        self._fingerprints = np.zeros(64, dtype=np.uint64)
+        self._count = 0
+
+    def filter(self, chunks: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+        """返回 (保留的分段, 去除的数量)"""
+        kept: List[Dict[str, Any]] = []
+        for chunk in chunks:
+            normalized = normalize_text(self.key(chunk))
+            if normalized in self._seen_texts:
+                continue
+            self._seen_texts.add(normalized)
+            if self.max_distance >= 0:
+                fingerprint = np.uint64(simhash(normalized))
+                if self._count and _popcount(self._fingerprints[:self._count] ^ fingerprint).min() <= self.max_distance:
+                    continue
+                if self._count == len(self._fingerprints):
+                    self._fingerprints = np.concatenate([self._fingerprints, np.zeros_like(self._fingerprints)])
+                self._fingerprints[self._count] = fingerprint
+                self._count += 1
+            kept.append(chunk)
+        return kept, len(chunks) - len(kept)
+
+
+def dedupe_chunks(chunks: List[Dict[str, Any]], threshold: float = 0.95,
+                  key: Callable[[Dict[str, Any]], str] = lambda chunk: chunk["content"]) -> Tuple[List[Dict[str, Any]], int]:
+    """去除重复和近似重复的分段，保留首次出现的分段
+
+    先按归一化文本精确去重，再比较SimHash指纹：与已保留分段的相似度（1 - 汉明距离/64）
+    不低于threshold即视为近似重复。threshold >= 1 时只做精确去重。
+
+    返回 (保留的分段, 去除的数量)
+    """
+    return NearDuplicateFilter(threshold, key).filter(chunks)
@@ -2,15 +2,17 @@ import os
 import re
 from typing import Dict, List, Any
 import markdown
-from docx import Document
-import PyPDF2
 import io
 from pathlib import Path
+from services.document_readers import read_docx_paragraphs
+from services.parsing_executor import ParsingExecutor
 
 class DocumentProcessor:
     """文档处理服务"""
     
-    def __init__(self):
+    def __init__(self, executor: ParsingExecutor = None):
+        # DOCX和PDF在解析进程池中处理，不阻塞事件循环
+        self.executor = executor or ParsingExecutor()
         self.supported_extensions = {
             '.md': self._process_markdown,
             '.docx': self._process_docx,
@@ -80,11 +82,7 @@ class DocumentProcessor:
     async def _process_docx(self, file_path: str) -> str:
         """处理DOCX文件"""
         try:
-            doc = Document(file_path)
-            text = []
-            for paragraph in doc.paragraphs:
-                text.append(paragraph.text)
-            return '\n'.join(text)
+            return await self.executor.run(read_docx_paragraphs, file_path)
         except Exception as e:
             print(f"处理DOCX文件失败: {e}")
             return ""
@@ -92,12 +90,8 @@ class DocumentProcessor:
     async def _process_pdf(self, file_path: str) -> str:
         """处理PDF文件"""
         try:
-            text = ""
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
-            return text.strip()
+            # 按页范围并行提取
+            return "\n".join([text async for text in self.executor.iter_pdf(file_path)])
         except Exception as e:
             print(f"处理PDF文件失败: {e}")
             return ""
@@ -0,0 +1,246 @@
+"""资料文档解析函数
+
+均为模块级的同步函数，只依赖解析库本身，可以在解析进程池（services.parsing_executor）的子进程中执行。
+"""
+import zipfile
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Union
+
+import PyPDF2
+from docx import Document
+from lxml import etree
+
+# 定义支持的文本文件类型
+TEXT_FILE_EXTENSIONS = {'.txt', '.md', '.markdown', '.py', '.js', '.html', '.css', '.json', '.xml', '.csv', '.log', '.ini', '.conf', '.yaml', '.yml'}
+WORD_FILE_EXTENSIONS = {'.docx', '.doc'}
+PDF_FILE_EXTENSIONS = {'.pdf'}
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+
+
+def is_text_file(file_path: Path) -> bool:
+    """判断是否为文本文件"""
+    return file_path.suffix.lower() in TEXT_FILE_EXTENSIONS
+
+
+def is_pdf_file(file_path: Path) -> bool:
+    """判断是否为PDF文件"""
+    return file_path.suffix.lower() in PDF_FILE_EXTENSIONS
+
+
+def is_readable_document(file_path: Path) -> bool:
+    """判断是否为可解析的资料文件（Word文档、PDF或文本文件）"""
+    return file_path.suffix.lower() in WORD_FILE_EXTENSIONS or is_pdf_file(file_path) or is_text_file(file_path)
+
+
+def read_text_file_content(file_path: Union[str, Path]) -> Optional[str]:
+    """安全读取文本文件内容"""
+    try:
+        # 尝试多种编码
+        encodings = ['utf-8', 'gbk', 'gb2312', 'utf-8-sig']
+        for encoding in encodings:
+            try:
+                with open(file_path, 'r', encoding=encoding) as f:
+                    content = f.read()
+                    # 检查内容是否包含大量不可打印字符（可能是二进制文件）
+                    if len(content) > 0 and len([c for c in content if ord(c) < 32 and c not in '\n\r\t']) / len(content) < 0.1:
+                        return content
+            except UnicodeDecodeError:
+                continue
+        return None
+    except Exception as e:
+        print(f"⚠️ 无法读取文件 {file_path}: {e}")
+        return None
+
+
+def read_word_document_content(file_path: Union[str, Path]) -> Optional[str]:
+    """读取Word文档内容"""
+    try:
+        doc = Document(file_path)
+        content = []
+
+        # 读取段落内容
+        for paragraph in doc.paragraphs:
+            if paragraph.text.strip():
+                content.append(paragraph.text.strip())
+
+        # 读取表格内容
+        for table in doc.tables:
+            for row in table.rows:
+                row_content = []
+                for cell in row.cells:
+                    if cell.text.strip():
+                        row_content.append(cell.text.strip())
+                if row_content:
+                    content.append(" | ".join(row_content))
+
+        return "\n".join(content)
+    except Exception as e:
+        print(f"⚠️ 无法读取Word文档 {file_path}: {e}")
+        return None
+
+
+def read_docx_paragraphs(file_path: Union[str, Path]) -> str:
+    """按段落读取DOCX文本（不含表格）"""
+    doc = Document(file_path)
+    return '\n'.join(paragraph.text for paragraph in doc.paragraphs)
+
+
+def _docx_heading_styles(archive: zipfile.ZipFile) -> Dict[str, int]:
+    """从styles.xml中读取标题样式：样式id -> 标题级别（名称为 heading N 或设置了大纲级别的段落样式）"""
+    try:
+        root = etree.fromstring(archive.read("word/styles.xml"))
+    except KeyError:
+        return {}
+    levels = {}
+    for style in root.iter(f"{_W}style"):
+        if style.get(f"{_W}type") != "paragraph":
+            continue
+        style_id = style.get(f"{_W}styleId")
+        name = style.find(f"{_W}name")
+        name = (name.get(f"{_W}val") or "").lower() if name is not None else ""
+        outline = style.find(f"{_W}pPr/{_W}outlineLvl")
+        if name.startswith("heading ") and name[8:].isdigit():
+            levels[style_id] = int(name[8:])
+        elif outline is not None and int(outline.get(f"{_W}val", 9)) < 9:
+            levels[style_id] = int(outline.get(f"{_W}val")) + 1
+    return levels
+
+
+def _docx_paragraph_text(paragraph) -> str:
+    parts = []
+    for node in paragraph.iter(f"{_W}t", f"{_W}tab", f"{_W}br", f"{_W}cr"):
+        if node.tag == f"{_W}t":
+            parts.append(node.text or "")
+        else:
+            parts.append("\t" if node.tag == f"{_W}tab" else "\n")
+    return "".join(parts)
+
+
+def _docx_heading_level(paragraph, heading_styles: Dict[str, int]) -> int:
+    properties = paragraph.find(f"{_W}pPr")
+    if properties is None:
+        return 0
+    outline = properties.find(f"{_W}outlineLvl")
+    if outline is not None and int(outline.get(f"{_W}val", 9)) < 9:
+        return int(outline.get(f"{_W}val")) + 1
+    style = properties.find(f"{_W}pStyle")
+    return heading_styles.get(style.get(f"{_W}val"), 0) if style is not None else 0
+
+
+def iter_docx_blocks(file_path: Union[str, Path]) -> Iterator[str]:
+    """流式读取DOCX正文，按文档顺序逐个产出段落、表格行和标题
+
+    直接从压缩包中以lxml.iterparse增量解析word/document.xml，每个段落、单元格处理完即清除，
+    内存占用不随文档大小增长。标题段落输出为Markdown标题（# 标题），表格每行输出为 "单元格 | 单元格"；
+    横向合并的单元格只出现一次，纵向合并的后续单元格跳过，嵌套表格的行并入外层单元格。
+    mc:Fallback中的兼容副本（如文本框的VML版本）不重复输出。
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        heading_styles = _docx_heading_styles(archive)
+        with archive.open("word/document.xml") as stream:
+            events = etree.iterparse(
+                stream, events=("start", "end"),
+                tag=(f"{_W}p", f"{_W}tc", f"{_W}tr", f"{_W}body", _MC_FALLBACK)
+            )
+            body = None
+            fallback_depth = 0
+            rows = []   # 正在读取的表格行（嵌套表格时为多层），每行为单元格文本列表
+            cells = []  # 正在读取的单元格，每个单元格为段落文本列表
+            for event, elem in events:
+                tag = elem.tag
+                if event == "start":
+                    if tag == f"{_W}body":
+                        body = elem
+                    elif tag == _MC_FALLBACK:
+                        fallback_depth += 1
+                    elif fallback_depth:
+                        # 兼容副本中的行和单元格的结束事件会被跳过，开始时也不入栈
+                        pass
+                    elif tag == f"{_W}tr":
+                        rows.append([])
+                    elif tag == f"{_W}tc":
+                        cells.append([])
+                    continue
+
+                if tag == _MC_FALLBACK:
+                    fallback_depth -= 1
+                elif fallback_depth:
+                    pass
+                elif tag == f"{_W}p":
+                    text = _docx_paragraph_text(elem).strip()
+                    if text:
+                        if cells:
+                            cells[-1].append(text)
+                        else:
+                            level = _docx_heading_level(elem, heading_styles)
+                            yield f"{'#' * min(level, 6)} {text}" if level else text
+                elif tag == f"{_W}tc":
+                    paragraphs = cells.pop()
+                    merge = elem.find(f"{_W}tcPr/{_W}vMerge")
+                    # 纵向合并：只有起始单元格（val="restart"）带内容
+                    if merge is None or merge.get(f"{_W}val") == "restart":
+                        rows[-1].append("\n".join(paragraphs))
+                elif tag == f"{_W}tr":
+                    row = " | ".join(cell for cell in rows.pop() if cell)
+                    if row:
+                        if cells:
+                            cells[-1].append(row)
+                        else:
+                            yield row
+
+                # 已处理的元素立即清除，并从正文中移除之前的兄弟节点
+                if tag != f"{_W}body" and not fallback_depth:
+                    elem.clear(keep_tail=False)
+                    if body is not None and elem.getparent() is body:
+                        while elem.getprevious() is not None:
+                            del body[0]
+
+
+def read_docx_text(file_path: Union[str, Path]) -> Optional[str]:
+    """流式读取DOCX文本（段落、标题和表格按文档顺序），无法读取时返回None"""
+    try:
+        return "\n".join(iter_docx_blocks(file_path))
+    except Exception as e:
+        print(f"⚠️ 无法读取Word文档 {file_path}: {e}")
+        return None
+
+
+def pdf_page_count(file_path: Union[str, Path]) -> int:
+    """PDF的页数（只读取交叉引用表和页树，不提取文本）"""
+    return len(PyPDF2.PdfReader(str(file_path)).pages)
+
+
+def iter_pdf_pages(file_path: Union[str, Path], start: int = 0, end: int = None) -> Iterator[str]:
+    """逐页提取PDF文本，产出第start页到第end页（不含）每页的文本"""
+    reader = PyPDF2.PdfReader(str(file_path))
+    end = len(reader.pages) if end is None else min(end, len(reader.pages))
+    for index in range(start, end):
+        yield reader.pages[index].extract_text() or ""
+
+
+def read_pdf_pages(file_path: Union[str, Path], start: int, end: int) -> str:
+    """提取一段页范围的文本，每页之间以换行分隔（供解析进程池按页范围并行调用）"""
+    return "\n".join(iter_pdf_pages(file_path, start, end))
+
+
+def read_pdf_content(file_path: Union[str, Path]) -> str:
+    """提取PDF文本，每页之间以换行分隔"""
+    try:
+        return "\n".join(iter_pdf_pages(file_path)).strip()
+    except Exception as e:
+        print(f"处理PDF文件失败: {e}")
+        return ""
+
+
+def read_document(file_path: Union[str, Path]) -> Optional[str]:
+    """按扩展名解析资料文件，不支持的类型或无法读取时返回None"""
+    file_path = Path(file_path)
+    if file_path.suffix.lower() in WORD_FILE_EXTENSIONS:
+        return read_docx_text(file_path)
+    if is_pdf_file(file_path):
+        return read_pdf_content(file_path) or None
+    if is_text_file(file_path):
+        return read_text_file_content(file_path)
+    return None
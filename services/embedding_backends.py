@@ -0,0 +1,200 @@
+import abc
+import asyncio
+import threading
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from config import Config
+from services.cache import normalize_text
+
+# 字符n-gram滚动哈希的乘数和各阶n-gram的种子（64位无符号整数运算，溢出即取模）
+_HASH_BASE = np.uint64(0x100000001B3)
+_HASH_MIX = np.uint64(0xFF51AFD7ED558CCD)
+_HASH_SEEDS = [np.uint64(0x9E3779B97F4A7C15 * (n + 1) % (1 << 64)) for n in range(8)]
+
+
+class EmbeddingBackend(abc.ABC):
+    """embedding后端接口
+
+    dimensions 为输出向量的维度（本地模型加载前未知，为0）；
+    name 和 cache_dimensions 用于区分缓存键（cache_dimensions为0表示模型原生维度）；
+    batch_size 和 concurrency 决定 AIService 如何切分和并发调用 embed_batch。
+    embed_batch 失败时直接抛出异常，由调用方决定是否使用备用向量。
+    """
+
+    name = ""
+    dimensions = 0
+    batch_size = 1
+    concurrency = 1
+
+    @property
+    def cache_dimensions(self) -> int:
+        return self.dimensions
+
+    @abc.abstractmethod
+    async def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """批量计算embedding，返回顺序与texts一致"""
+
+    async def aclose(self):
+        """释放后端占用的资源"""
+
+
+class RemoteEmbeddingBackend(EmbeddingBackend):
+    """调用OpenAI兼容接口（默认DashScope text-embedding-v3）的远程后端"""
+
+    def __init__(self, client, model: str, dimensions: int, batch_size: int = 10, concurrency: int = 4):
+        self.client = client
+        self.name = model
+        self.dimensions = dimensions
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+
+    async def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        response = await self.client.embeddings.create(
+            input=texts,
+            model=self.name,
+            encoding_format="float",
+            extra_body={"dimensions": self.dimensions}
+        )
+        # 按返回的index还原输入顺序
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+class LocalEmbeddingBackend(EmbeddingBackend):
+    """基于sentence-transformers的本地CPU后端
+
+    模型在首次调用时加载，可以是HuggingFace模型名或本地目录。
+    threads 控制PyTorch计算线程数（0为默认），quantize 为True时对Linear层做int8动态量化。
+    推理在独立线程中按批执行，同一时间只运行一个批次，避免多个批次争抢CPU线程。
+    模型加载后 dimensions 为模型的输出维度，缓存键中始终记为原生维度（0），加载前后的缓存键一致。
+    """
+
+    def __init__(self, model_name_or_path: str, device: str = "cpu", threads: int = 0,
+                 quantize: bool = False, batch_size: int = 32):
+        self.model_name_or_path = model_name_or_path
+        self.device = device
+        self.threads = threads
+        self.quantize = quantize
+        self.name = f"local:{model_name_or_path}" + (":int8" if quantize else "")
+        self.dimensions = 0
+        self.batch_size = max(1, batch_size)
+        self.concurrency = 1
+        self._model = None
+        self._load_lock = threading.Lock()
+
+    @property
+    def cache_dimensions(self) -> int:
+        return 0
+
+    def _load_model(self):
+        """加载模型（线程安全，只加载一次）"""
+        with self._load_lock:
+            if self._model is not None:
+                return self._model
+            try:
+                import torch
+                from sentence_transformers import SentenceTransformer
+            except ImportError as e:
+                raise RuntimeError("本地embedding后端需要安装 sentence-transformers 和 torch") from e
+            if self.threads > 0:
+                torch.set_num_threads(self.threads)
+            model = SentenceTransformer(self.model_name_or_path, device=self.device)
+            model.eval()
+            if self.quantize:
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            print(f"✅ 本地embedding模型加载完成: {self.model_name_or_path}, "
+                  f"维度: {model.get_sentence_embedding_dimension()}, int8量化: {self.quantize}")
+            self.dimensions = model.get_sentence_embedding_dimension()
+            self._model = model
+            return model
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        model = self._load_model()
+        vectors = model.encode(
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+        return vectors.tolist()
+
+    async def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.to_thread(self._encode, texts)
+
+
+def char_ngram_hashes(text: str, ngram_range: Tuple[int, int] = (1, 3)) -> Iterator[np.ndarray]:
+    """逐阶产出文本字符n-gram的64位哈希数组
+
+    文本先归一化（全半角、空白、大小写），再按Unicode码点计算滚动哈希并做一次混合，
+    保证哈希值各比特分布均匀。
+    """
+    codepoints = np.frombuffer(normalize_text(text).lower().encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    rolling = np.zeros(0, dtype=np.uint64)
+    for n in range(1, ngram_range[1] + 1):
+        if len(codepoints) < n:
+            break
+        # n阶哈希 = (n-1)阶哈希 * 乘数 + 第n个字符
+        rolling = codepoints.copy() if n == 1 else rolling[:-1] * _HASH_BASE + codepoints[n - 1:]
+        if n < ngram_range[0]:
+            continue
+        hashed = (rolling ^ _HASH_SEEDS[n]) * _HASH_MIX
+        hashed ^= hashed >> np.uint64(29)
+        yield hashed
+
+
+def hashing_embedding(text: str, dimensions: int, ngram_range: Tuple[int, int] = (1, 3)) -> List[float]:
+    """字符n-gram特征哈希向量（L2归一化）
+
+    各阶n-gram的哈希值决定落入的维度和符号，用bincount累加。
+    共享较多n-gram的文本向量夹角更小，可在无法调用模型时提供字面相似度检索。
+    """
+    vector = np.zeros(dimensions, dtype=np.float64)
+    for hashed in char_ngram_hashes(text, ngram_range):
+        buckets = (hashed % np.uint64(dimensions)).astype(np.int64)
+        signs = np.where(hashed >> np.uint64(63), -1.0, 1.0)
+        vector += np.bincount(buckets, weights=signs, minlength=dimensions)
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector.astype(np.float32).tolist()
+
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """不依赖模型和网络的字符n-gram特征哈希后端，用于离线测试和接口不可用时的降级"""
+
+    def __init__(self, dimensions: int, batch_size: int = 256):
+        self.name = "hashing:char-ngram-1-3"
+        self.dimensions = dimensions
+        self.batch_size = max(1, batch_size)
+        self.concurrency = 1
+
+    async def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return [hashing_embedding(text, self.dimensions) for text in texts]
+
+
+def create_embedding_backend(client=None, backend: Optional[str] = None) -> EmbeddingBackend:
+    """根据 Config.EMBEDDING_BACKEND 创建embedding后端（remote、local 或 hashing）"""
+    backend = (backend or Config.EMBEDDING_BACKEND).lower()
+    if backend == "local":
+        return LocalEmbeddingBackend(
+            Config.EMBEDDING_LOCAL_MODEL_PATH,
+            device=Config.EMBEDDING_LOCAL_DEVICE,
+            threads=Config.EMBEDDING_LOCAL_THREADS,
+            quantize=Config.EMBEDDING_LOCAL_QUANTIZE,
+            batch_size=Config.EMBEDDING_LOCAL_BATCH_SIZE
+        )
+    if backend == "hashing":
+        return HashingEmbeddingBackend(Config.EMBEDDING_DIMENSIONS)
+    if backend == "remote":
+        if client is None:
+            raise ValueError("远程embedding后端需要提供OpenAI客户端")
+        return RemoteEmbeddingBackend(
+            client,
+            Config.AI_EMBEDDING_MODEL,
+            Config.EMBEDDING_DIMENSIONS,
+            batch_size=Config.EMBEDDING_BATCH_SIZE,
+            concurrency=Config.EMBEDDING_CONCURRENCY
+        )
+    raise ValueError(f"不支持的embedding后端: {backend}")
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from services.sqlite_store import SQLiteStore
+
+
+def file_sha256(path: Path, block_size: int = 1024 * 1024) -> str:
+    """分块计算文件内容的sha256"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(source: str, content_hash: str, index: int) -> str:
+    """由文件路径、内容哈希和分段序号生成确定性的分段id（与进程无关）"""
+    digest = hashlib.sha1(f"{source}\x00{content_hash}\x00{index}".encode("utf-8")).hexdigest()
+    return f"doc_{digest}"
+
+
+class IngestionRegistry(SQLiteStore):
+    """文件入库登记表：记录每个文件的大小、修改时间、内容哈希、embedding模型和对应的分段id
+
+    用于增量入库：大小和修改时间都未变化的文件直接跳过；内容哈希未变化的文件只更新修改时间；
+    已删除文件的分段可按登记的id从向量库中移除。
+    """
+
+    def _create_table(self):
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS ingested_files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                content_hash TEXT NOT NULL,
+                embedding_model TEXT NOT NULL,
+                chunk_ids TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )"""
+        )
+
+    def get(self, path: str) -> Optional[Dict[str, Any]]:
+        """查询文件的登记信息"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime, content_hash, embedding_model, chunk_ids FROM ingested_files WHERE path = ?",
+                (path,)
+            ).fetchone()
+        if not row:
+            return None
+        return {
+            "path": path,
+            "size": row[0],
+            "mtime": row[1],
+            "content_hash": row[2],
+            "embedding_model": row[3],
+            "chunk_ids": json.loads(row[4])
+        }
+
+    def is_current(self, path: str, stat: os.stat_result, embedding_model: str, content_hash: str = None) -> bool:
+        """判断登记的分段是否仍对应当前文件，是则无需重新入库
+
+        登记的embedding模型需与当前一致（更换模型的文件需要重新入库），且大小和修改时间都未变化；
+        传入content_hash时，大小或修改时间变化但内容哈希一致也视为未变化。
+        """
+        record = self.get(path)
+        if record is None or record["embedding_model"] != embedding_model:
+            return False
+        if record["size"] == stat.st_size and record["mtime"] == stat.st_mtime:
+            return True
+        return content_hash is not None and record["content_hash"] == content_hash
+
+    def paths(self) -> List[str]:
+        """所有已登记的文件路径"""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT path FROM ingested_files")]
+
+    def upsert(self, path: str, size: int, mtime: float, content_hash: str, embedding_model: str, chunk_ids: List[str]):
+        """写入或更新文件的登记信息"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ingested_files "
+                "(path, size, mtime, content_hash, embedding_model, chunk_ids, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (path, size, mtime, content_hash, embedding_model, json.dumps(chunk_ids), time.time())
+            )
+            self._conn.commit()
+
+    def touch(self, path: str, size: int, mtime: float):
+        """内容未变化时只更新大小和修改时间"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE ingested_files SET size = ?, mtime = ?, updated_at = ? WHERE path = ?",
+                (size, mtime, time.time(), path)
+            )
+            self._conn.commit()
+
+    def remove(self, path: str):
+        """删除文件的登记信息"""
+        with self._lock:
+            self._conn.execute("DELETE FROM ingested_files WHERE path = ?", (path,))
+            self._conn.commit()
@@ -0,0 +1,96 @@
+import math
+import re
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+# 连续的中文字符
+CJK_RUN_PATTERN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+# 代码标识符、命令、错误码：允许中间出现 . _ - : / 等连接符，如 os.path.join、ERR_CONNECTION_REFUSED、pip-install
+CODE_TOKEN_PATTERN = re.compile(r"[A-Za-z0-9_](?:[A-Za-z0-9_.\-:/]*[A-Za-z0-9_])?")
+# 标识符内部的拆分位置：连接符和驼峰边界
+CODE_PART_PATTERN = re.compile(r"[._\-:/]+|(?<=[a-z0-9])(?=[A-Z])")
+
+
+def tokenize(text: str) -> List[str]:
+    """切分检索词项：中文按字符二元组（单字词保留单字），代码标识符保留完整形式并补充拆分后的部分"""
+    tokens = []
+    for run in CJK_RUN_PATTERN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    for token in CODE_TOKEN_PATTERN.findall(text):
+        lowered = token.lower()
+        if len(lowered) > 1 or lowered.isdigit():
+            tokens.append(lowered)
+        parts = [part.lower() for part in CODE_PART_PATTERN.split(token) if part]
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if len(part) > 1)
+    return tokens
+
+
+class BM25Index:
+    """内存倒排索引 + BM25打分，用于补充向量检索容易漏掉的精确词项（命令名、API名、错误码）"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.created_at = time.time()
+        self.ids: List[Hashable] = []
+        self.documents: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self._positions: Dict[Hashable, int] = {}
+        self.doc_lengths: List[int] = []
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, ids: Sequence[Hashable], documents: Sequence[str], metadatas: Sequence[Dict[str, Any]] = None):
+        """添加文档"""
+        metadatas = metadatas or [{} for _ in documents]
+        for doc_id, document, metadata in zip(ids, documents, metadatas):
+            position = len(self.ids)
+            counts = Counter(tokenize(document))
+            for term, tf in counts.items():
+                self.postings[term][position] = tf
+            self.ids.append(doc_id)
+            self.documents.append(document)
+            self.metadatas.append(metadata)
+            self._positions[doc_id] = position
+            self.doc_lengths.append(sum(counts.values()))
+
+    def get(self, doc_id: Hashable) -> Optional[Dict[str, Any]]:
+        """按id取回文档内容和元数据"""
+        position = self._positions.get(doc_id)
+        if position is None:
+            return None
+        return {"id": doc_id, "content": self.documents[position], "metadata": self.metadatas[position]}
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[Hashable, float]]:
+        """返回按BM25得分降序的 (文档id, 得分)"""
+        if not self.ids:
+            return []
+        total = len(self.ids)
+        avg_length = sum(self.doc_lengths) / total or 1.0
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for position, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[position] / avg_length)
+                scores[position] += idf * tf * (self.k1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [(self.ids[position], score) for position, score in ranked]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Hashable]], k: int = 60) -> List[Tuple[Hashable, float]]:
+    """倒数排名融合：score(d) = Σ 1 / (k + rank)，返回按融合得分降序的 (id, 得分)"""
+    scores: Dict[Hashable, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
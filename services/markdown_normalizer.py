@@ -0,0 +1,146 @@
+import re
+from typing import Dict, List
+
+# 图片占位符，兼容模型常见的变体：{image:img_1}、{{ image：img1 }} 等
+IMAGE_PLACEHOLDER_PATTERN = re.compile(r"\{\{?\s*image\s*[:：]\s*img_?(\d+)\s*\}?\}", re.I)
+# 标题：#后可以没有空格，但紧跟英文字母时视为普通文本（如 #include）
+HEADING_PATTERN = re.compile(r"^\s{0,3}(#+)(?:\s+|(?=[^\sA-Za-z#]))(.*?)\s*#*\s*$")
+# 非编号列表符号统一为 "-"
+BULLET_PATTERN = re.compile(r"^(\s*)(?:[•·●▪◦]\s*|[*+\-]\s+)(.*)$")
+# 编号列表统一为 "1. "，排除 "1.5" 这类小数
+NUMBERED_PATTERN = re.compile(r"^(\s*)(\d+)\s*[.、．)）](?!\d)\s*(.+)$")
+# 分割线
+RULE_PATTERN = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+# HTML标签
+HTML_TAG_PATTERN = re.compile(r"</?(?:p|br|div|span|b|strong|i|em|u|font|center|hr)\b[^>]*>", re.I)
+# 零宽字符等不可见符号
+INVISIBLE_PATTERN = re.compile("[\\u200b\\u200c\\u200d\\u2060\\ufeff]")
+# 行内代码，格式修正时跳过其中内容
+INLINE_CODE_PATTERN = re.compile(r"(`[^`]*`)")
+# 一级标题中不允许的"实训报告："前缀
+TITLE_PREFIX_PATTERN = re.compile(r"^实训报告\s*[:：]\s*")
+
+MAX_HEADING_LEVEL = 4
+
+
+def _outside_inline_code(line: str, func) -> str:
+    """只对行内代码之外的部分应用func"""
+    parts = INLINE_CODE_PATTERN.split(line)
+    return "".join(part if i % 2 == 1 else func(part) for i, part in enumerate(parts))
+
+
+def _strip_bold(text: str) -> str:
+    """去掉粗体标记"""
+    return re.sub(r"\*\*(.+?)\*\*", r"\1", text)
+
+
+def _split_image_placeholders(line: str) -> List[str]:
+    """将图片占位符拆成单独的行，返回拆分后的片段（占位符已统一为 {{image:img_x}}）"""
+    pieces = []
+    last = 0
+    for match in IMAGE_PLACEHOLDER_PATTERN.finditer(line):
+        before = line[last:match.start()].strip()
+        if before:
+            pieces.append(before)
+        pieces.append(f"{{{{image:img_{match.group(1)}}}}}")
+        last = match.end()
+    after = line[last:].strip()
+    if after:
+        pieces.append(after)
+    return pieces
+
+
+def normalize_report_markdown(text: str, image_descriptions: Dict[str, str] = None) -> str:
+    """按报告格式规则在本地修正Markdown，不改动正文内容
+
+    规则与格式修复提示词一致：
+    1. 标题层级规范：#后补空格、最多四级、不跳级、去掉标题中的粗体和"实训报告："前缀
+    2. 图片占位符 {{image:img_x}} 单独成段，下方补充图片描述（如有）
+    3. 非编号列表统一用 "-"，编号统一为 "1. "，列表项中不使用粗体；补全未闭合的代码块
+    4. 删除分割线、HTML标签、不可见字符和多余空行
+
+    代码块内的内容保持原样。
+    """
+    image_descriptions = image_descriptions or {}
+    output: List[str] = []
+    in_code_block = False
+    previous_level = 0
+
+    def add_blank():
+        if output and output[-1] != "":
+            output.append("")
+
+    for raw_line in text.replace("\r\n", "\n").replace("\r", "\n").split("\n"):
+        if raw_line.strip().startswith("```"):
+            if not in_code_block:
+                add_blank()
+            in_code_block = not in_code_block
+            output.append(raw_line.strip())
+            if not in_code_block:
+                output.append("")
+            continue
+        if in_code_block:
+            output.append(raw_line)
+            continue
+
+        line = INVISIBLE_PATTERN.sub("", raw_line).rstrip()
+        line = _outside_inline_code(line, lambda part: HTML_TAG_PATTERN.sub("", part))
+        if not line.strip():
+            add_blank()
+            continue
+        if RULE_PATTERN.match(line):
+            add_blank()
+            continue
+        # 图片下方已有相同描述时不重复补充
+        if len(output) >= 2 and output[-1] == "" and output[-2] == line.strip() \
+                and line.strip() in image_descriptions.values():
+            continue
+
+        # 图片占位符单独成段
+        if IMAGE_PLACEHOLDER_PATTERN.search(line):
+            for piece in _split_image_placeholders(line):
+                match = IMAGE_PLACEHOLDER_PATTERN.fullmatch(piece)
+                add_blank()
+                output.append(piece)
+                if match:
+                    description = image_descriptions.get(f"img_{match.group(1)}")
+                    add_blank()
+                    if description:
+                        output.append(description.strip())
+                        add_blank()
+            continue
+
+        heading = HEADING_PATTERN.match(line)
+        if heading and heading.group(2).strip():
+            level = min(len(heading.group(1)), MAX_HEADING_LEVEL)
+            if previous_level:
+                level = min(level, previous_level + 1)
+            title = _strip_bold(heading.group(2)).strip()
+            if level == 1:
+                title = TITLE_PREFIX_PATTERN.sub("", title)
+            previous_level = level
+            add_blank()
+            output.append(f"{'#' * level} {title}")
+            add_blank()
+            continue
+
+        bullet = BULLET_PATTERN.match(line)
+        if bullet and bullet.group(2).strip():
+            output.append(f"{bullet.group(1)}- {_strip_bold(bullet.group(2)).strip()}")
+            continue
+
+        numbered = NUMBERED_PATTERN.match(line)
+        if numbered:
+            output.append(f"{numbered.group(1)}{numbered.group(2)}. {numbered.group(3).strip()}")
+            continue
+
+        output.append(line)
+
+    if in_code_block:
+        output.append("```")
+
+    while output and output[-1] == "":
+        output.pop()
+    while output and output[0] == "":
+        output.pop(0)
+    return "\n".join(output) + "\n"
@@ -0,0 +1,178 @@
+import asyncio
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import AsyncIterator, Callable, Iterable, Optional, Tuple, Union
+
+from config import Config
+from services.document_readers import is_pdf_file, pdf_page_count, read_document, read_pdf_pages
+
+
+def _limit_worker_memory(limit_bytes: int):
+    """子进程初始化：限制虚拟内存上限，超过时解析函数内抛出MemoryError而不是拖垮整台机器"""
+    if not limit_bytes:
+        return
+    try:
+        import resource
+    except ImportError:
+        # Windows没有resource模块，不做限制
+        return
+    resource.setrlimit(resource.RLIMIT_AS, (limit_bytes, limit_bytes))
+
+
+class ParsingExecutor:
+    """文档解析进程池：把CPU密集的文档解析移出事件循环
+
+    - 最多max_workers个文件同时解析，其余在事件循环中排队，单个文件的超时从开始解析时计算
+    - 单个文件超时后终止并重建进程池（无法单独终止某个任务），同时在解析的其他文件重试一次
+    - 子进程的虚拟内存上限为memory_limit_mb，超过时该文件解析失败
+    - max_workers为0时在线程中解析（不启用子进程，适用于调试或不支持多进程的环境）
+    - PDF按页范围拆分为多个任务并行提取，按页序逐段产出，超时和内存上限按页范围计算
+
+    子进程通过forkserver启动，不继承父进程的线程和连接；按multiprocessing的约定子进程会导入主模块，
+    直接运行的脚本需要用 if __name__ == "__main__" 保护入口（gunicorn/uvicorn启动时不受影响）。
+    """
+
+    def __init__(self, max_workers: int = None, timeout: float = None, memory_limit_mb: int = None,
+                 start_method: str = None):
+        self.max_workers = Config.PARSING_WORKERS if max_workers is None else max_workers
+        self.timeout = timeout or Config.PARSING_TIMEOUT
+        memory_limit_mb = Config.PARSING_MEMORY_LIMIT_MB if memory_limit_mb is None else memory_limit_mb
+        self.memory_limit_bytes = memory_limit_mb * 1024 * 1024
+        self.start_method = start_method or Config.PARSING_START_METHOD
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            if self.start_method not in multiprocessing.get_all_start_methods():
+                self.start_method = "spawn"
+            context = multiprocessing.get_context(self.start_method)
+            if self.start_method == "forkserver":
+                context.set_forkserver_preload(["services.document_readers"])
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=context,
+                initializer=_limit_worker_memory,
+                initargs=(self.memory_limit_bytes,)
+            )
+        return self._pool
+
+    def _restart_pool(self, pool: ProcessPoolExecutor):
+        """终止进程池中的所有子进程（包括卡住的解析任务），下次提交时重建"""
+        if self._pool is not pool:
+            return
+        self._pool = None
+        # ProcessPoolExecutor没有公开终止单个工作进程的接口
+        for process in list((pool._processes or {}).values()):
+            process.kill()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, func: Callable, file_path: Union[str, Path], *args, retry: bool = True):
+        """在进程池中执行 func(file_path, *args)，超时抛出 asyncio.TimeoutError"""
+        if not self.max_workers:
+            return await asyncio.wait_for(asyncio.to_thread(func, file_path, *args), self.timeout)
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+        async with self._slots:
+            pool = self._get_pool()
+            try:
+                future = asyncio.wrap_future(pool.submit(func, str(file_path), *args))
+                return await asyncio.wait_for(future, self.timeout)
+            except asyncio.TimeoutError:
+                print(f"⏱️ 解析超时（{self.timeout}秒），终止解析进程: {file_path}")
+                self._restart_pool(pool)
+                raise
+            except BrokenProcessPool:
+                # 子进程异常退出或被其他超时任务连带终止
+                self._restart_pool(pool)
+                if not retry:
+                    raise
+        print(f"🔁 解析进程已重建，重试: {file_path}")
+        return await self.run(func, file_path, *args, retry=False)
+
+    async def iter_pdf(self, file_path: Union[str, Path], pages_per_task: int = None) -> AsyncIterator[str]:
+        """按页范围并行提取PDF文本，按页序逐段产出
+
+        每段pages_per_task页（默认 Config.PDF_PAGES_PER_TASK）为一个解析任务，最多提前提交max_workers个页范围，
+        已完成但尚未被消费的文本不会无限堆积。单个页范围失败或超时时跳过该段，其余页照常产出。
+        """
+        pages_per_task = pages_per_task or Config.PDF_PAGES_PER_TASK
+        page_count = await self.run(pdf_page_count, file_path)
+        ranges = [(start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task)]
+        lookahead = max(self.max_workers, 1)
+        pending = deque()
+        try:
+            for index in range(len(ranges)):
+                while len(pending) < lookahead and index + len(pending) < len(ranges):
+                    start, end = ranges[index + len(pending)]
+                    pending.append(asyncio.create_task(self.run(read_pdf_pages, file_path, start, end)))
+                start, end = ranges[index]
+                try:
+                    text = await pending.popleft()
+                except asyncio.TimeoutError:
+                    continue
+                except Exception as e:
+                    print(f"❌ 解析PDF第{start + 1}-{end}页失败 {file_path}: {type(e).__name__}: {e}")
+                    continue
+                if text.strip():
+                    yield text
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def iter_document(self, file_path: Union[str, Path]) -> AsyncIterator[str]:
+        """解析单个资料文件，按顺序逐段产出内容：PDF每个页范围一段，其他文件整体一段"""
+        try:
+            if is_pdf_file(Path(file_path)):
+                async for text in self.iter_pdf(file_path):
+                    yield text
+                return
+            content = await self.run(read_document, file_path)
+        except asyncio.TimeoutError:
+            return
+        except Exception as e:
+            print(f"❌ 解析文件失败 {file_path}: {type(e).__name__}: {e}")
+            return
+        if content is not None:
+            yield content
+
+    async def parse(self, file_path: Union[str, Path]) -> Optional[str]:
+        """解析单个资料文件，失败或超时返回None"""
+        parts = [text async for text in self.iter_document(file_path)]
+        return "\n".join(parts) if parts else None
+
+    async def parse_many(self, file_paths: Iterable[Union[str, Path]]) -> AsyncIterator[Tuple[Path, str]]:
+        """并行解析多个文件，按完成顺序逐个产出 (路径, 内容片段)
+
+        PDF的每个页范围单独产出（同一文件的片段保持页序），其他文件整体产出一次，解析失败的文件不产出。
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def parse_one(file_path):
+            try:
+                async for text in self.iter_document(file_path):
+                    await queue.put((Path(file_path), text))
+            finally:
+                await queue.put(None)
+
+        tasks = [asyncio.create_task(parse_one(file_path)) for file_path in file_paths]
+        remaining = len(tasks)
+        try:
+            while remaining:
+                item = await queue.get()
+                if item is None:
+                    remaining -= 1
+                    continue
+                yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def shutdown(self):
+        """关闭进程池"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,47 @@
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def maximal_marginal_relevance(query_embedding: Sequence[float], candidate_embeddings: Sequence[Sequence[float]],
+                               k: int, lambda_mult: float = 0.5,
+                               relevance: Optional[Sequence[float]] = None) -> List[int]:
+    """最大边际相关性（MMR）重排，返回选中候选的下标（按选中顺序）
+
+    每一步选择 λ·相关度 - (1-λ)·与已选结果的最大余弦相似度 最高的候选：
+    λ=1 等同于按相关度排序，λ越小越偏向多样性。
+
+    相关度默认为候选与查询的余弦相似度，也可以通过relevance传入（如混合检索的融合得分，
+    应缩放到0-1区间）。候选两两相似度一次矩阵乘法算出，
+    每步只用已选结果的最新一行更新最大相似度，总开销 O(n²·d + k·n)。
+    """
+    candidates = _normalize(np.asarray(candidate_embeddings, dtype=np.float32))
+    n = len(candidates)
+    k = min(k, n)
+    if k <= 0:
+        return []
+    if relevance is None:
+        query = _normalize(np.asarray(query_embedding, dtype=np.float32))
+        relevance = candidates @ query
+    else:
+        relevance = np.asarray(relevance, dtype=np.float32)
+    similarity = candidates @ candidates.T
+
+    selected = [int(np.argmax(relevance))]
+    max_similarity = similarity[selected[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        chosen = int(np.argmax(scores))
+        selected.append(chosen)
+        available[chosen] = False
+        np.maximum(max_similarity, similarity[chosen], out=max_similarity)
+    return selected
@@ -0,0 +1,36 @@
+import abc
+import sqlite3
+import threading
+from pathlib import Path
+
+
+class SQLiteStore(abc.ABC):
+    """SQLite持久化存储的公共部分：连接管理、线程锁和WAL模式
+
+    子类在 _create_table 中建表；对 self._conn 的访问都需持有 self._lock。
+    page_size 不为0时新建的数据库使用该页大小（已有数据库保持原来的页大小）。
+    """
+
+    page_size = 0
+
+    def __init__(self, db_path: str):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+        if self.page_size:
+            # 只对还没有写入任何页的新数据库生效
+            self._conn.execute(f"PRAGMA page_size={self.page_size}")
+        # WAL模式允许多个gunicorn worker同时读写
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._create_table()
+        self._conn.commit()
+
+    @abc.abstractmethod
+    def _create_table(self):
+        """建表"""
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
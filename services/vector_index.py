@@ -0,0 +1,194 @@
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+STORAGE_DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+# 打分时每次展开的行数：展开缓冲区（256 x 1024维 x 4字节 = 1MB）留在CPU缓存中并重复使用
+_SCORE_BLOCK_ROWS = 256
+# float16按位展开为float32：符号扩展为int32左移13位后，清除扩展到指数高位的符号位副本
+_FLOAT16_WIDEN_MASK = np.int32(-0x70000001)  # 0x8FFFFFFF
+# 上述展开得到的float32值为原值的 2^-112 倍（指数偏置 15 与 127 之差），由查询向量乘回
+_FLOAT16_WIDEN_SCALE = np.float32(2.0 ** 112)
+
+
+def quantize(vectors: np.ndarray, storage: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """按存储格式压缩float32向量，返回 (编码矩阵, 每行缩放系数)
+
+    int8 为逐向量对称量化：scale = max|x| / 127，编码 = round(x / scale)；其余格式缩放系数为None。
+    """
+    if storage == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    return vectors.astype(STORAGE_DTYPES[storage]), None
+
+
+def dequantize(codes: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+    """还原为float32向量"""
+    vectors = codes.astype(np.float32)
+    if scales is not None:
+        vectors *= scales[:, None]
+    return vectors
+
+
+class InMemoryVectorIndex:
+    """进程内向量索引：适用于单次报告任务的小规模语料（几十到几千个分段）
+
+    向量按行归一化后存放在连续矩阵中，检索时矩阵乘法计算所有余弦相似度，
+    再用argpartition取top-k，不落盘、无需维护HNSW索引。
+
+    storage 为 float16 或 int8 时以压缩格式存储（内存约为float32的1/2或1/4），
+    检索时按块展开后与float32查询向量计算相似度，得分与先还原为float32向量再计算一致。
+    """
+
+    def __init__(self, storage: str = "float32"):
+        if storage not in STORAGE_DTYPES:
+            raise ValueError(f"不支持的向量存储格式: {storage}")
+        self.storage = storage
+        self.created_at = time.time()
+        self._codes: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        self._pending: List[Tuple[np.ndarray, Optional[np.ndarray]]] = []
+        self.documents: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self.ids: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        """按行L2归一化，零向量保持为零"""
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def add(self, embeddings: List[List[float]], documents: List[str],
+            metadatas: List[Dict[str, Any]] = None, ids: List[str] = None):
+        """添加向量及对应文档"""
+        if not len(embeddings):
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2:
+            raise ValueError("embeddings必须是二维数组")
+        if self.dimensions and vectors.shape[1] != self.dimensions:
+            raise ValueError(f"向量维度不一致: {vectors.shape[1]} != {self.dimensions}")
+        self._pending.append(quantize(self._normalize(vectors), self.storage))
+        self.documents.extend(documents)
+        self.metadatas.extend(metadatas or [{} for _ in documents])
+        self.ids.extend(ids or [str(len(self.ids) + i) for i in range(len(documents))])
+
+    @property
+    def dimensions(self) -> int:
+        if self._codes is not None:
+            return self._codes.shape[1]
+        if self._pending:
+            return self._pending[0][0].shape[1]
+        return 0
+
+    def _compact(self):
+        """合并多次add的结果为连续矩阵（首次检索时合并一次）"""
+        if not self._pending:
+            return
+        parts = ([(self._codes, self._scales)] if self._codes is not None else []) + self._pending
+        self._codes = np.ascontiguousarray(np.vstack([codes for codes, _ in parts]))
+        if self.storage == "int8":
+            self._scales = np.concatenate([scales for _, scales in parts])
+        self._pending = []
+
+    @property
+    def nbytes(self) -> int:
+        """向量存储占用的字节数"""
+        self._compact()
+        if self._codes is None:
+            return 0
+        return self._codes.nbytes + (self._scales.nbytes if self._scales is not None else 0)
+
+    def vectors(self, rows: np.ndarray = None) -> np.ndarray:
+        """取出（指定行的）float32向量"""
+        self._compact()
+        if self._codes is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        if rows is None:
+            return dequantize(self._codes, self._scales)
+        return dequantize(self._codes[rows], self._scales[rows] if self._scales is not None else None)
+
+    def vectors_for_ids(self, ids: List[str]) -> np.ndarray:
+        """按文档id取出float32向量（已归一化），id不存在时为零向量"""
+        rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        found = [rows.get(doc_id, -1) for doc_id in ids]
+        vectors = self.vectors(np.array([row for row in found if row >= 0], dtype=np.int64))
+        result = np.zeros((len(ids), self.dimensions), dtype=np.float32)
+        result[[i for i, row in enumerate(found) if row >= 0]] = vectors
+        return result
+
+    def _score(self, queries: np.ndarray) -> np.ndarray:
+        """计算float32查询向量与所有向量的相似度
+
+        压缩存储时按块展开到复用的float32缓冲区后用BLAS计算，不反量化整个矩阵：
+        int8 直接展开编码，得分再乘以每行的缩放系数；
+        float16 用整数运算按位展开（NumPy的float16类型转换逐元素执行，比整数运算慢数倍），结果与类型转换一致。
+        """
+        if self.storage == "float32":
+            return queries @ self._codes.T
+        # 按 (向量, 查询) 的布局逐块写入，各块结果连续
+        scores = np.empty((len(self), len(queries)), dtype=np.float32)
+        if self.storage == "float16":
+            codes = self._codes.view(np.int16)
+            buffer = np.empty((min(_SCORE_BLOCK_ROWS, len(self)), self.dimensions), dtype=np.int32)
+            query_matrix = (queries * _FLOAT16_WIDEN_SCALE).T
+        else:
+            codes = self._codes
+            buffer = np.empty((min(_SCORE_BLOCK_ROWS, len(self)), self.dimensions), dtype=np.float32)
+            query_matrix = queries.T
+        for start in range(0, len(self), _SCORE_BLOCK_ROWS):
+            block = codes[start:start + _SCORE_BLOCK_ROWS]
+            expanded = buffer[:len(block)]
+            np.copyto(expanded, block, casting="unsafe")
+            if self.storage == "float16":
+                expanded <<= 13
+                expanded &= _FLOAT16_WIDEN_MASK
+                expanded = expanded.view(np.float32)
+            np.dot(expanded, query_matrix, out=scores[start:start + len(block)])
+        if self._scales is not None:
+            scores *= self._scales[:, None]
+        return scores.T
+
+    @staticmethod
+    def _top(scores: np.ndarray, k: int) -> np.ndarray:
+        """每行取得分最高的k个位置（未排序）"""
+        if k < scores.shape[1]:
+            return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        return np.broadcast_to(np.arange(scores.shape[1]), (scores.shape[0], scores.shape[1]))
+
+    def query_many(self, query_embeddings: List[List[float]], top_k: int = 5) -> List[List[Dict[str, Any]]]:
+        """批量检索，每个查询返回按相似度降序排列的结果
+
+        distance为余弦距离（1 - 余弦相似度）。
+        """
+        self._compact()
+        if not len(self) or not len(query_embeddings):
+            return [[] for _ in query_embeddings]
+        queries = self._normalize(np.asarray(query_embeddings, dtype=np.float32))
+        k = min(top_k, len(self))
+        scores = self._score(queries)
+        results = []
+        for row, rows in enumerate(self._top(scores, k)):
+            exact = scores[row, rows]
+            order = np.argsort(-exact, kind="stable")
+            results.append([
+                {
+                    "id": self.ids[i],
+                    "content": self.documents[i],
+                    "metadata": self.metadatas[i],
+                    "distance": float(1.0 - score)
+                }
+                for i, score in zip(rows[order], exact[order])
+            ])
+        return results
+
+    def query(self, query_embedding: List[float], top_k: int = 5) -> List[Dict[str, Any]]:
+        """单条检索"""
+        return self.query_many([query_embedding], top_k)[0]
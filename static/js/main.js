@@ -390,25 +390,51 @@ async function generateReport() {
             updateProgress(progress);
         }, 500);
         
-        // 发送请求
-        const response = await fetch('/generate_report', {
+        // 发送请求（流式接口：通过SSE推送阶段进度和正文片段）
+        const response = await fetch('/generate_report_stream', {
             method: 'POST',
             body: formData
         });
         
+        if (!response.ok) {
+            clearInterval(progressInterval);
+            const error = await response.json();
+            showError(error.detail || '报告生成失败');
+            return;
+        }
+        
+        const reportPreview = document.getElementById('reportPreview');
+        const reportContent = document.querySelector('.report-content');
+        let streamedText = '';
+        let result = null;
+        let streamError = null;
+        await readReportStream(response, (event, data) => {
+            if (event === 'stage') {
+                showStage(data.message);
+            } else if (event === 'token') {
+                // 实时显示正在生成的正文
+                streamedText += data.text;
+                if (reportPreview && reportContent) {
+                    reportContent.textContent = streamedText;
+                    reportPreview.style.display = 'block';
+                }
+            } else if (event === 'done') {
+                result = data;
+            } else if (event === 'error') {
+                streamError = data.detail;
+            }
+        });
+        
         clearInterval(progressInterval);
         updateProgress(100);
         
-        if (response.ok) {
-            const result = await response.json();
+        if (result) {
             showSuccess('报告生成成功！');
             showDownloadLink(result.download_url);
             
             // 新增：渲染报告正文（带插图）
             if (result.report) {
                 const reportHtml = renderReportWithImages(result.report, result.images, '/uploads');
-                const reportPreview = document.getElementById('reportPreview');
-                const reportContent = document.querySelector('.report-content');
                 if (reportPreview && reportContent) {
                     reportContent.innerHTML = reportHtml;
                     reportPreview.style.display = 'block';
@@ -420,8 +446,7 @@ async function generateReport() {
                 }
             }
         } else {
-            const error = await response.json();
-            showError(error.detail || '报告生成失败');
+            showError(streamError || '报告生成失败');
         }
     } catch (error) {
         console.error('生成报告失败:', error);
@@ -435,6 +460,43 @@ async function generateReport() {
     }
 }
 
+// 读取SSE流，逐条回调 (事件类型, 数据)
+async function readReportStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder('utf-8');
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            let eventType = 'message';
+            const dataLines = [];
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event:')) {
+                    eventType = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    dataLines.push(line.slice(5).trim());
+                }
+            });
+            if (dataLines.length > 0) {
+                onEvent(eventType, JSON.parse(dataLines.join('\n')));
+            }
+        }
+    }
+}
+
+// 显示生成阶段
+function showStage(message) {
+    const reportStatus = document.getElementById('reportStatus');
+    reportStatus.className = 'report-status';
+    reportStatus.textContent = message;
+    reportStatus.style.display = 'block';
+}
+
 // 更新进度条
 function updateProgress(percentage) {
     const progressInner = document.getElementById('progressInner');
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+异步AI客户端负载测试：生成报告期间 /health 延迟应保持平稳
+
+用模拟的上游（每次请求延迟数秒）替换AI服务的HTTP传输层，
+在并发生成报告的同时持续请求 /health，对比：
+1. 异步客户端（当前实现）：/health 延迟与空闲时基本一致
+2. 同步阻塞调用（旧实现）：/health 被阻塞到上游返回为止
+"""
+
+import asyncio
+import sys
+import time
+import statistics
+import httpx
+from openai import AsyncOpenAI
+
+from app import app, ai_service
+
+UPSTREAM_DELAY = 2.0      # 模拟上游每次调用耗时（秒）
+CONCURRENT_REPORTS = 3    # 并发生成的报告数
+PROBE_INTERVAL = 0.05     # /health 探测间隔（秒）
+
+def build_fake_completion():
+    """构造一个OpenAI兼容的对话返回"""
+    return {
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": "qwen-plus",
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": "# 测试报告\n\n模拟生成的报告内容。"},
+            "finish_reason": "stop"
+        }],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20}
+    }
+
+async def slow_upstream(request: httpx.Request) -> httpx.Response:
+    """异步模拟上游：等待期间让出事件循环"""
+    await asyncio.sleep(UPSTREAM_DELAY)
+    return httpx.Response(200, json=build_fake_completion())
+
+def install_fake_upstream():
+    """让AI服务通过模拟上游发送请求（仍走AsyncOpenAI + 连接池的完整路径）"""
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(slow_upstream))
+    ai_service.http_client = http_client
+    ai_service.client = AsyncOpenAI(api_key="test", base_url="http://upstream.test/v1", http_client=http_client)
+
+def install_blocking_upstream():
+    """模拟旧实现：在协程内同步阻塞等待上游"""
+    async def blocking_call(prompt, max_tokens=4000, stage=None):
+        time.sleep(UPSTREAM_DELAY)
+        return "阻塞调用返回"
+    ai_service._call_qwen_api = blocking_call
+
+async def probe_health(client, stop_event, latencies):
+    """持续探测 /health，记录每次延迟（毫秒）
+
+    延迟从计划发起请求的时刻算起，事件循环被阻塞时的排队时间也会计入
+    """
+    scheduled = time.perf_counter()
+    while not stop_event.is_set():
+        response = await client.get("/health")
+        latencies.append((time.perf_counter() - scheduled) * 1000)
+        assert response.status_code == 200
+        scheduled = time.perf_counter() + PROBE_INTERVAL
+        await asyncio.sleep(PROBE_INTERVAL)
+
+async def measure(client, with_generation):
+    """测量 /health 延迟，可选在测量期间并发生成报告"""
+    latencies = []
+    stop_event = asyncio.Event()
+    prober = asyncio.create_task(probe_health(client, stop_event, latencies))
+    await asyncio.sleep(PROBE_INTERVAL * 2)
+    if with_generation:
+        await asyncio.gather(*[
+            ai_service.generate_report_with_prompt("测试", f"请生成第{i + 1}份测试报告", 3)
+            for i in range(CONCURRENT_REPORTS)
+        ])
+    else:
+        await asyncio.sleep(UPSTREAM_DELAY)
+    await asyncio.sleep(PROBE_INTERVAL * 2)
+    stop_event.set()
+    await prober
+    return latencies
+
+def summarize(name, latencies):
+    """打印延迟统计"""
+    p50 = statistics.median(latencies)
+    worst = max(latencies)
+    print(f"  {name}: 探测 {len(latencies)} 次, p50 = {p50:.1f} ms, max = {worst:.1f} ms")
+    return p50, worst
+
+async def run_load_test():
+    """执行负载测试，返回异步客户端生成期间 /health 延迟是否在阈值内"""
+    print("🧪 测试生成报告期间 /health 的响应延迟...")
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        install_fake_upstream()
+        _, idle_max = summarize("空闲", await measure(client, with_generation=False))
+        _, async_max = summarize("异步客户端生成中", await measure(client, with_generation=True))
+
+        install_blocking_upstream()
+        _, blocking_max = summarize("同步阻塞生成中", await measure(client, with_generation=True))
+
+    passed = async_max < UPSTREAM_DELAY * 1000 / 4
+    if passed:
+        print(f"  ✅ 异步客户端: 生成期间 /health 延迟保持平稳 (max {async_max:.1f} ms, 空闲 max {idle_max:.1f} ms)")
+    else:
+        print(f"  ❌ 异步客户端: /health 被阻塞 (max {async_max:.1f} ms)")
+    if blocking_max >= UPSTREAM_DELAY * 1000 * 0.9:
+        print(f"  ✅ 对照组: 同步阻塞调用使 /health 停顿约 {blocking_max / 1000:.1f} s")
+    else:
+        print(f"  ⚠️  对照组未观察到阻塞 (max {blocking_max:.1f} ms)")
+    return passed
+
+def main():
+    """主测试函数，返回测试是否通过"""
+    print("🚀 开始异步AI客户端负载测试")
+    print("=" * 50)
+
+    try:
+        passed = asyncio.run(run_load_test())
+    except Exception as e:
+        print(f"\n❌ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+    print("\n" + "=" * 50)
+    if passed:
+        print("✅ 负载测试通过")
+    else:
+        print("❌ 负载测试未通过: 异步客户端生成期间 /health 延迟超过阈值")
+    return passed
+
+if __name__ == "__main__":
+    # 未通过时以非零状态退出，便于在CI中判定
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试结构感知分段：分段边界（标题、代码块、长度上限）和相邻分段的重叠
+"""
+
+import io
+
+from services.chunker import iter_chunks
+
+SENTENCES = [f"第{i}句内容说明。" for i in range(30)]
+CODE_LINES = [f"x{i} = {i}" for i in range(40)]
+DOCUMENT = (
+    "# 第一章\n\n" + "".join(SENTENCES) + "\n\n"
+    "```python\n" + "\n".join(CODE_LINES) + "\n```\n\n"
+    "## 第二节\n\n短段落。"
+)
+
+
+def test_chunk_size_limit():
+    """测试每个分段都不超过chunk_size，且内容不丢失"""
+    print("🧪 测试分段长度上限...")
+
+    chunks = list(iter_chunks(DOCUMENT, chunk_size=100, overlap=20))
+    too_long = [len(chunk) for chunk in chunks if len(chunk) > 100]
+    if too_long:
+        print(f"❌ 分段超过长度上限: {too_long}")
+        return False
+    joined = "\n".join(chunks)
+    missing = [part for part in SENTENCES + CODE_LINES + ["# 第一章", "## 第二节", "短段落。"] if part not in joined]
+    if missing:
+        print(f"❌ 分段丢失内容: {missing[:5]}")
+        return False
+
+    print(f"✅ {len(chunks)} 个分段均不超过100字符，内容完整")
+    return True
+
+
+def test_sentence_overlap():
+    """测试相邻段落分段以上一分段末尾的完整句子开头，重叠不超过overlap"""
+    print("🧪 测试相邻分段重叠...")
+
+    text = "".join(SENTENCES)
+    chunks = list(iter_chunks(text, chunk_size=100, overlap=20))
+    if len(chunks) < 3:
+        print(f"❌ 分段数量不足: {len(chunks)}")
+        return False
+    for previous, current in zip(chunks, chunks[1:]):
+        shared = max((size for size in range(1, 21) if previous.endswith(current[:size])), default=0)
+        if not shared or not current[:shared].endswith("。"):
+            print(f"❌ 重叠部分不是上一分段末尾的完整句子: {current[:shared]!r}")
+            return False
+
+    no_overlap = list(iter_chunks(text, chunk_size=100, overlap=0))
+    if "".join(no_overlap) != text:
+        print("❌ overlap=0 时分段拼接后应与原文一致")
+        return False
+
+    print("✅ 相邻分段重叠正确")
+    return True
+
+
+def test_code_block_boundaries():
+    """测试超长代码块按行拆分，每部分补全围栏，且不参与重叠"""
+    print("🧪 测试代码块边界...")
+
+    chunks = list(iter_chunks(DOCUMENT, chunk_size=100, overlap=20))
+    code_chunks = [chunk for chunk in chunks if chunk.startswith("```python")]
+    if len(code_chunks) < 2:
+        print(f"❌ 超长代码块应拆成多个分段: {len(code_chunks)}")
+        return False
+    for chunk in code_chunks:
+        body = chunk.split("\n## ")[0]
+        if not body.rstrip().endswith("```"):
+            print(f"❌ 代码块分段缺少结束围栏: {chunk[-30:]!r}")
+            return False
+    seen_lines = [line for chunk in code_chunks for line in chunk.split("\n") if line.startswith("x")]
+    if seen_lines != CODE_LINES:
+        print("❌ 代码行重复或顺序错误（代码块不应重叠）")
+        return False
+
+    print(f"✅ 代码块拆成 {len(code_chunks)} 个带围栏的分段")
+    return True
+
+
+def test_heading_starts_new_chunk():
+    """测试已积累超过一半chunk_size时，标题开始新分段且不带重叠"""
+    print("🧪 测试标题处断开...")
+
+    text = "# 第一章\n\n" + "".join(SENTENCES[:6]) + "\n\n## 第二节\n\n" + "".join(SENTENCES[6:8])
+    chunks = list(iter_chunks(text, chunk_size=100, overlap=20))
+    if len(chunks) != 2 or not chunks[1].startswith("## 第二节"):
+        print(f"❌ 标题应开始新分段: {chunks}")
+        return False
+
+    short = "# 第一章\n\n" + SENTENCES[0] + "\n\n## 第二节\n\n" + SENTENCES[1]
+    if len(list(iter_chunks(short, chunk_size=100, overlap=20))) != 1:
+        print("❌ 未满一半时标题不应断开")
+        return False
+
+    print("✅ 标题处断开正确")
+    return True
+
+
+def test_streaming_input():
+    """测试逐行读取的输入与字符串输入分段结果一致"""
+    print("🧪 测试逐行流式输入...")
+
+    expected = list(iter_chunks(DOCUMENT, chunk_size=100, overlap=20))
+    streamed = list(iter_chunks(io.StringIO(DOCUMENT), chunk_size=100, overlap=20))
+    if streamed != expected:
+        print("❌ 流式输入的分段结果与字符串输入不一致")
+        return False
+
+    print("✅ 流式输入分段一致")
+    return True
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试结构感知分段")
+    print("=" * 50)
+    tests = [
+        test_chunk_size_limit,
+        test_sentence_overlap,
+        test_code_block_boundaries,
+        test_heading_starts_new_chunk,
+        test_streaming_input
+    ]
+    passed = sum(1 for test in tests if test())
+    print("=" * 50)
+    print(f"📊 测试结果: {passed}/{len(tests)} 通过")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    main()
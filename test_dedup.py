@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试分段去重：精确重复、近似重复的阈值判定和跨批次去重
+"""
+
+from services.dedup import NearDuplicateFilter, dedupe_chunks, max_distance_for, simhash
+
+BASE = "向量数据库使用HNSW索引加速近似最近邻检索，插入时构建多层图结构，查询时从顶层贪心下降。" * 2
+# 与BASE的SimHash汉明距离为5：阈值0.95（最大距离3）时保留，0.9（最大距离6）时去除
+NEAR = BASE + "该方法在百万级数据上表现良好。"
+OTHER = "报告生成模块根据模板渲染Word文档并插入图片和表格内容。" * 2
+
+
+def hamming(a: str, b: str) -> int:
+    return bin(simhash(a) ^ simhash(b)).count("1")
+
+
+def chunks_of(*texts):
+    return [{"id": f"doc_{i}", "content": text} for i, text in enumerate(texts)]
+
+
+def test_max_distance():
+    """测试相似度阈值换算为汉明距离"""
+    print("🧪 测试阈值换算...")
+
+    expected = {0.95: 3, 0.9: 6, 0.8: 12, 1.0: 0}
+    actual = {threshold: max_distance_for(threshold) for threshold in expected}
+    if actual != expected:
+        print(f"❌ 阈值换算不正确: {actual}")
+        return False
+    if hamming(BASE, NEAR) != 5 or hamming(BASE, OTHER) <= 12:
+        print(f"❌ 测试文本的汉明距离与预期不符: {hamming(BASE, NEAR)}, {hamming(BASE, OTHER)}")
+        return False
+
+    print("✅ 阈值换算正确")
+    return True
+
+
+def test_exact_duplicates():
+    """测试归一化后相同的分段在任何阈值下都会去除，保留首次出现的分段"""
+    print("🧪 测试精确重复...")
+
+    chunks = chunks_of(BASE, f"  {BASE}\n", BASE.replace("HNSW", "ＨＮＳＷ"), OTHER)
+    kept, removed = dedupe_chunks(chunks, threshold=1.0)
+    if removed != 2 or [chunk["id"] for chunk in kept] != ["doc_0", "doc_3"]:
+        print(f"❌ 精确去重结果不正确: {[chunk['id'] for chunk in kept]}, 去除 {removed}")
+        return False
+
+    print("✅ 空白和全半角差异的重复分段已去除")
+    return True
+
+
+def test_near_duplicate_threshold():
+    """测试近似重复按阈值去除：距离在阈值内去除，超出阈值保留"""
+    print("🧪 测试近似重复阈值...")
+
+    chunks = chunks_of(BASE, NEAR, OTHER)
+    kept, removed = dedupe_chunks(chunks, threshold=0.95)
+    if removed != 0:
+        print(f"❌ 阈值0.95时距离为5的分段应保留，去除了 {removed} 个")
+        return False
+    kept, removed = dedupe_chunks(chunks, threshold=0.9)
+    if removed != 1 or [chunk["id"] for chunk in kept] != ["doc_0", "doc_2"]:
+        print(f"❌ 阈值0.9时应只去除近似重复: {[chunk['id'] for chunk in kept]}")
+        return False
+    kept, removed = dedupe_chunks(chunks, threshold=1.0)
+    if removed != 0:
+        print(f"❌ 阈值1.0时只应做精确去重，去除了 {removed} 个")
+        return False
+
+    print("✅ 近似重复阈值判定正确")
+    return True
+
+
+def test_across_batches():
+    """测试后续批次中与之前批次重复的分段同样会被去除"""
+    print("🧪 测试跨批次去重...")
+
+    dedup_filter = NearDuplicateFilter(threshold=0.9)
+    kept, removed = dedup_filter.filter(chunks_of(BASE, OTHER))
+    if removed != 0 or len(kept) != 2:
+        print(f"❌ 第一批不应去除分段: {removed}")
+        return False
+    kept, removed = dedup_filter.filter(chunks_of(NEAR, OTHER, "全新的分段内容，与之前的资料都不相同。"))
+    if removed != 2 or [chunk["content"] for chunk in kept] != ["全新的分段内容，与之前的资料都不相同。"]:
+        print(f"❌ 第二批应去除与第一批重复的分段: {kept}, 去除 {removed}")
+        return False
+
+    # 超过初始容量的指纹数组会自动扩容
+    many = NearDuplicateFilter(threshold=0.95, key=lambda chunk: chunk["text"])
+    kept, _ = many.filter([{"text": f"第{i}条完全不同的资料：{'甲乙丙丁戊己庚辛'[i % 8] * (i % 7 + 3)}{i * 7919}"} for i in range(100)])
+    if len(kept) <= 64 or many._count != len(kept):
+        print(f"❌ 指纹数组扩容后数量不正确: {many._count}，保留 {len(kept)}")
+        return False
+
+    print("✅ 跨批次去重正确")
+    return True
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试分段去重")
+    print("=" * 50)
+    tests = [
+        test_max_distance,
+        test_exact_duplicates,
+        test_near_duplicate_threshold,
+        test_across_batches
+    ]
+    passed = sum(1 for test in tests if test())
+    print("=" * 50)
+    print(f"📊 测试结果: {passed}/{len(tests)} 通过")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    main()
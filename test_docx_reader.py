@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试DOCX流式文本提取：标题、合并单元格、嵌套表格和mc:Fallback兼容副本
+"""
+
+import tempfile
+import zipfile
+from pathlib import Path
+
+from services.document_readers import read_docx_text
+
+NAMESPACES = (
+    'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+    'xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006" '
+    'xmlns:wps="http://schemas.microsoft.com/office/word/2010/wordprocessingShape" '
+    'xmlns:v="urn:schemas-microsoft-com:vml"'
+)
+
+STYLES = f"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<w:styles {NAMESPACES}>
+  <w:style w:type="paragraph" w:styleId="Heading1"><w:name w:val="heading 1"/></w:style>
+  <w:style w:type="paragraph" w:styleId="Custom2"><w:name w:val="自定义标题"/>
+    <w:pPr><w:outlineLvl w:val="1"/></w:pPr></w:style>
+</w:styles>"""
+
+
+def paragraph(text, style=None):
+    properties = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ""
+    return f"<w:p>{properties}<w:r><w:t>{text}</w:t></w:r></w:p>"
+
+
+def cell(content, merge=None, span=None):
+    properties = ""
+    if merge or span:
+        properties = "<w:tcPr>"
+        if span:
+            properties += f'<w:gridSpan w:val="{span}"/>'
+        if merge:
+            properties += f'<w:vMerge w:val="{merge}"/>' if merge == "restart" else "<w:vMerge/>"
+        properties += "</w:tcPr>"
+    return f"<w:tc>{properties}{content}</w:tc>"
+
+
+def table(*rows):
+    return "<w:tbl>" + "".join(f"<w:tr>{''.join(cells)}</w:tr>" for cells in rows) + "</w:tbl>"
+
+
+def write_docx(directory, body):
+    path = Path(directory) / "资料.docx"
+    document = f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<w:document {NAMESPACES}><w:body>{body}</w:body></w:document>'
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("word/document.xml", document)
+        archive.writestr("word/styles.xml", STYLES)
+    return path
+
+
+def extract(body):
+    with tempfile.TemporaryDirectory() as tmp:
+        return read_docx_text(write_docx(tmp, body))
+
+
+def test_headings_and_paragraphs():
+    """测试标题样式（名称为heading N或设置了大纲级别）输出为Markdown标题"""
+    print("🧪 测试标题和段落...")
+
+    text = extract(paragraph("第一章", "Heading1") + paragraph("正文内容") + paragraph("小节", "Custom2"))
+    if text != "# 第一章\n正文内容\n## 小节":
+        print(f"❌ 标题或段落输出不正确: {text!r}")
+        return False
+
+    print("✅ 标题和段落输出正确")
+    return True
+
+
+def test_merged_cells():
+    """测试横向合并的单元格只出现一次，纵向合并的后续单元格跳过"""
+    print("🧪 测试合并单元格...")
+
+    body = table(
+        [cell(paragraph("项目")), cell(paragraph("说明"))],
+        [cell(paragraph("环境"), merge="restart"), cell(paragraph("Python 3.10"))],
+        [cell(paragraph(""), merge="continue"), cell(paragraph("FastAPI"))],
+        [cell(paragraph("备注：横跨两列"), span=2)],
+    ) + paragraph("表格之后")
+    text = extract(body)
+    expected = "项目 | 说明\n环境 | Python 3.10\nFastAPI\n备注：横跨两列\n表格之后"
+    if text != expected:
+        print(f"❌ 合并单元格输出不正确: {text!r}")
+        return False
+
+    print("✅ 合并单元格输出正确")
+    return True
+
+
+def test_nested_table():
+    """测试嵌套表格的行并入外层单元格"""
+    print("🧪 测试嵌套表格...")
+
+    inner = table([cell(paragraph("内层A")), cell(paragraph("内层B"))])
+    body = table([cell(paragraph("外层") + inner), cell(paragraph("右侧"))]) + paragraph("结束")
+    text = extract(body)
+    if text != "外层\n内层A | 内层B | 右侧\n结束":
+        print(f"❌ 嵌套表格输出不正确: {text!r}")
+        return False
+
+    print("✅ 嵌套表格输出正确")
+    return True
+
+
+def test_fallback_table():
+    """测试文本框的Choice和Fallback中都有表格时只输出一次，且后续内容不丢失"""
+    print("🧪 测试mc:Fallback中的表格...")
+
+    box_table = table([cell(paragraph("box cell"))])
+    text_box = (
+        "<w:p><w:r><mc:AlternateContent>"
+        f"<mc:Choice Requires=\"wps\"><w:drawing><wps:txbx><w:txbxContent>{box_table}</w:txbxContent></wps:txbx></w:drawing></mc:Choice>"
+        f"<mc:Fallback><w:pict><v:textbox><w:txbxContent>{box_table}</w:txbxContent></v:textbox></w:pict></mc:Fallback>"
+        "</mc:AlternateContent></w:r></w:p>"
+    )
+    body = (
+        paragraph("before") + text_box + paragraph("after")
+        + table([cell(paragraph("左")), cell(paragraph("右"))]) + paragraph("end", "Heading1")
+    )
+    text = extract(body)
+    if text != "before\nbox cell\nafter\n左 | 右\n# end":
+        print(f"❌ 兼容副本之后的内容丢失或重复: {text!r}")
+        return False
+
+    print("✅ 兼容副本只输出一次，后续内容完整")
+    return True
+
+
+def test_unreadable_file():
+    """测试不是DOCX压缩包的文件返回None"""
+    print("🧪 测试无法读取的文件...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "broken.docx"
+        path.write_bytes(b"not a zip file")
+        if read_docx_text(path) is not None:
+            print("❌ 无法读取的文件应返回None")
+            return False
+
+    print("✅ 无法读取的文件返回None")
+    return True
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试DOCX流式文本提取")
+    print("=" * 50)
+    tests = [
+        test_headings_and_paragraphs,
+        test_merged_cells,
+        test_nested_table,
+        test_fallback_table,
+        test_unreadable_file
+    ]
+    passed = sum(1 for test in tests if test())
+    print("=" * 50)
+    print(f"📊 测试结果: {passed}/{len(tests)} 通过")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    main()
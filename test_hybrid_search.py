@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试混合检索：BM25词项检索和倒数排名融合（RRF）的排序
+"""
+
+from services.lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+
+def test_tokenize():
+    """测试中文二元组和代码标识符的切分"""
+    print("🧪 测试检索词项切分...")
+
+    tokens = tokenize("调用os.path.join报错")
+    for expected in ["调用", "os.path.join", "os", "path", "join", "报错"]:
+        if expected not in tokens:
+            print(f"❌ 缺少词项 {expected}: {tokens}")
+            return False
+
+    tokens = tokenize("ERR_CONNECTION_REFUSED")
+    if "err_connection_refused" not in tokens or "connection" not in tokens:
+        print(f"❌ 错误码未保留完整形式或拆分部分: {tokens}")
+        return False
+
+    print("✅ 检索词项切分正确")
+    return True
+
+
+def test_bm25_exact_term():
+    """测试BM25能命中向量检索容易漏掉的精确词项"""
+    print("🧪 测试BM25精确词项命中...")
+
+    index = BM25Index()
+    index.add(
+        ["a", "b", "c"],
+        [
+            "部署服务时需要配置环境变量",
+            "连接数据库时出现 ERR_CONNECTION_REFUSED 错误，检查端口",
+            "数据库连接池的大小应根据并发量调整",
+        ]
+    )
+    results = index.search("ERR_CONNECTION_REFUSED", top_k=3)
+    if not results or results[0][0] != "b":
+        print(f"❌ 精确错误码应排在第一: {results}")
+        return False
+    if any(doc_id == "a" for doc_id, _ in results):
+        print(f"❌ 不含查询词项的文档不应出现: {results}")
+        return False
+    if index.get("b")["content"] != "连接数据库时出现 ERR_CONNECTION_REFUSED 错误，检查端口":
+        print("❌ 按id取回的内容不正确")
+        return False
+
+    print("✅ BM25精确词项命中正确")
+    return True
+
+
+def test_rrf_ordering():
+    """测试融合得分：两路都靠前的文档排在只在一路出现的文档之前"""
+    print("🧪 测试倒数排名融合的排序...")
+
+    vector_ranking = ["x", "y", "z"]
+    lexical_ranking = ["y", "w", "x"]
+    fused = reciprocal_rank_fusion([vector_ranking, lexical_ranking], k=60)
+    order = [doc_id for doc_id, _ in fused]
+
+    # y: 1/62 + 1/61，x: 1/61 + 1/63，w: 1/62，z: 1/63
+    if order != ["y", "x", "w", "z"]:
+        print(f"❌ 融合排序不正确: {order}")
+        return False
+    expected = 1 / 62 + 1 / 61
+    if abs(fused[0][1] - expected) > 1e-12:
+        print(f"❌ 融合得分不正确: {fused[0][1]} != {expected}")
+        return False
+    scores = [score for _, score in fused]
+    if scores != sorted(scores, reverse=True):
+        print(f"❌ 融合结果未按得分降序: {scores}")
+        return False
+
+    print("✅ 倒数排名融合排序正确")
+    return True
+
+
+def test_rrf_k():
+    """测试k越小越偏向单路排名靠前的文档"""
+    print("🧪 测试RRF参数k的影响...")
+
+    # a 在第一路排第1、第二路缺失；b 在两路都排第4
+    rankings = [["a", "c", "e", "b"], ["d", "e", "c", "b"]]
+    small_k = [doc_id for doc_id, _ in reciprocal_rank_fusion(rankings, k=1)]
+    large_k = [doc_id for doc_id, _ in reciprocal_rank_fusion(rankings, k=60)]
+    if small_k.index("a") > small_k.index("b"):
+        print(f"❌ k=1时单路第一应排在两路第四之前: {small_k}")
+        return False
+    if large_k.index("b") > large_k.index("a"):
+        print(f"❌ k=60时两路都出现的文档应排在单路第一之前: {large_k}")
+        return False
+    if reciprocal_rank_fusion([]) != []:
+        print("❌ 空排名应返回空结果")
+        return False
+
+    print("✅ RRF参数k的影响正确")
+    return True
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试混合检索")
+    print("=" * 50)
+    tests = [
+        test_tokenize,
+        test_bm25_exact_term,
+        test_rrf_ordering,
+        test_rrf_k
+    ]
+    passed = sum(1 for test in tests if test())
+    print("=" * 50)
+    print(f"📊 测试结果: {passed}/{len(tests)} 通过")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试入库登记表：增量入库时是否跳过的判定、只更新修改时间、重新入库和移除
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+from services.ingestion_registry import IngestionRegistry, chunk_id, file_sha256
+
+MODEL = "hashing-768"
+
+
+def ingest(registry: IngestionRegistry, path: Path) -> list:
+    """登记文件，返回分段id"""
+    stat = path.stat()
+    content_hash = file_sha256(path)
+    ids = [chunk_id(str(path), content_hash, i) for i in range(3)]
+    registry.upsert(str(path), stat.st_size, stat.st_mtime, content_hash, MODEL, ids)
+    return ids
+
+
+def test_chunk_id():
+    """测试分段id由路径、内容哈希和序号确定"""
+    print("🧪 测试分段id...")
+
+    first = chunk_id("uploads/a.md", "abc", 0)
+    if first != chunk_id("uploads/a.md", "abc", 0) or not first.startswith("doc_"):
+        print(f"❌ 相同输入应生成相同的分段id: {first}")
+        return False
+    others = {chunk_id("uploads/b.md", "abc", 0), chunk_id("uploads/a.md", "abd", 0), chunk_id("uploads/a.md", "abc", 1)}
+    if first in others or len(others) != 3:
+        print("❌ 路径、哈希或序号不同时分段id应不同")
+        return False
+
+    print("✅ 分段id确定且互不冲突")
+    return True
+
+
+def test_skip_and_touch():
+    """测试大小和修改时间未变化时跳过；修改时间变化但内容哈希一致时跳过，touch后不再需要哈希"""
+    print("🧪 测试跳过和更新修改时间...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "资料.md"
+        path.write_text("# 标题\n\n第一版内容。", encoding="utf-8")
+        registry = IngestionRegistry(os.path.join(tmp, "registry.db"))
+        ids = ingest(registry, path)
+        if not registry.is_current(str(path), path.stat(), MODEL):
+            print("❌ 登记后的文件应被跳过")
+            return False
+
+        # 重新写入相同内容：修改时间变化，但内容哈希不变
+        stat = path.stat()
+        os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+        if registry.is_current(str(path), path.stat(), MODEL):
+            print("❌ 修改时间变化后不应只凭大小和修改时间跳过")
+            return False
+        if not registry.is_current(str(path), path.stat(), MODEL, file_sha256(path)):
+            print("❌ 内容哈希一致时应跳过")
+            return False
+        registry.touch(str(path), path.stat().st_size, path.stat().st_mtime)
+        if not registry.is_current(str(path), path.stat(), MODEL) or registry.get(str(path))["chunk_ids"] != ids:
+            print("❌ touch后应被跳过，且分段id不变")
+            return False
+        if registry.is_current(str(Path(tmp) / "未登记.md"), path.stat(), MODEL, file_sha256(path)):
+            print("❌ 未登记的文件不应跳过")
+            return False
+        registry.close()
+
+    print("✅ 跳过和更新修改时间正确")
+    return True
+
+
+def test_upsert_changed_content():
+    """测试内容变化时重新登记，旧分段id可由差集得出；更换模型后不再跳过"""
+    print("🧪 测试内容变化后重新登记...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "资料.md"
+        path.write_text("第一版内容。", encoding="utf-8")
+        registry = IngestionRegistry(os.path.join(tmp, "registry.db"))
+        old_ids = ingest(registry, path)
+
+        path.write_text("第二版内容，长度也变了。", encoding="utf-8")
+        if registry.is_current(str(path), path.stat(), MODEL, file_sha256(path)):
+            print("❌ 内容变化后不应跳过")
+            return False
+        new_ids = ingest(registry, path)
+        if set(old_ids) & set(new_ids) or registry.get(str(path))["chunk_ids"] != new_ids:
+            print("❌ 重新登记后应记录新的分段id")
+            return False
+        if registry.paths() != [str(path)]:
+            print(f"❌ 同一路径只应有一条登记: {registry.paths()}")
+            return False
+
+        stat = path.stat()
+        registry.upsert(str(path), stat.st_size, stat.st_mtime, file_sha256(path), "other-model", new_ids)
+        if registry.is_current(str(path), stat, MODEL, file_sha256(path)):
+            print("❌ embedding模型不同的登记不应跳过")
+            return False
+        registry.close()
+
+    print("✅ 内容变化后重新登记正确")
+    return True
+
+
+def test_remove_and_persist():
+    """测试登记在重新打开后仍然存在，移除后不再出现"""
+    print("🧪 测试持久化和移除...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "nested", "registry.db")
+        paths = []
+        registry = IngestionRegistry(db_path)
+        for name in ["a.md", "b.md"]:
+            path = Path(tmp) / name
+            path.write_text(f"{name} 的内容。", encoding="utf-8")
+            ingest(registry, path)
+            paths.append(str(path))
+        registry.close()
+
+        registry = IngestionRegistry(db_path)
+        if sorted(registry.paths()) != sorted(paths):
+            print(f"❌ 重新打开后登记丢失: {registry.paths()}")
+            return False
+        registry.remove(paths[0])
+        if registry.get(paths[0]) is not None or registry.paths() != [paths[1]]:
+            print(f"❌ 移除后仍有登记: {registry.paths()}")
+            return False
+        registry.remove(paths[0])
+        registry.close()
+
+    print("✅ 持久化和移除正确")
+    return True
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试入库登记表")
+    print("=" * 50)
+    tests = [
+        test_chunk_id,
+        test_skip_and_touch,
+        test_upsert_changed_content,
+        test_remove_and_persist
+    ]
+    passed = sum(1 for test in tests if test())
+    print("=" * 50)
+    print(f"📊 测试结果: {passed}/{len(tests)} 通过")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试文档解析进程池：正常解析、超时终止、子进程崩溃后重试和内存上限
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from services.parsing_executor import ParsingExecutor
+
+
+# 子进程中执行的解析函数需要定义在模块顶层，才能被序列化到进程池
+def read_text(file_path):
+    return Path(file_path).read_text(encoding="utf-8")
+
+
+def slow_read(file_path):
+    time.sleep(30)
+    return read_text(file_path)
+
+
+def crash_once(file_path):
+    """第一次调用时子进程直接退出（模拟解析库段错误），之后正常读取"""
+    marker = f"{file_path}.crashed"
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return read_text(file_path)
+
+
+def always_crash(file_path):
+    os._exit(1)
+
+
+def allocate(file_path, megabytes):
+    return len(bytearray(megabytes * 1024 * 1024))
+
+
+def with_document(test):
+    """在临时目录中创建一个文本资料，作为解析函数的参数"""
+    def wrapper():
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "资料.md"
+            path.write_text("# 标题\n\n正文内容。", encoding="utf-8")
+            return test(path)
+    wrapper.__name__ = test.__name__
+    wrapper.__doc__ = test.__doc__
+    return wrapper
+
+
+@with_document
+def test_parse(path):
+    """测试进程池中正常解析，解析失败的文件返回None"""
+    print("🧪 测试正常解析...")
+
+    async def run():
+        executor = ParsingExecutor(max_workers=2, timeout=30)
+        try:
+            content = await executor.parse(path)
+            missing = await executor.parse(path.with_name("不存在.md"))
+            results = [item async for item in executor.parse_many([path, path])]
+            return content, missing, results
+        finally:
+            executor.shutdown()
+
+    content, missing, results = asyncio.run(run())
+    if content != "# 标题\n\n正文内容。":
+        print(f"❌ 解析内容不正确: {content!r}")
+        return False
+    if missing is not None:
+        print(f"❌ 不存在的文件应返回None: {missing!r}")
+        return False
+    if len(results) != 2 or any(text != content for _, text in results):
+        print(f"❌ 并行解析结果不正确: {results}")
+        return False
+
+    print("✅ 正常解析正确")
+    return True
+
+
+@with_document
+def test_timeout_restarts_pool(path):
+    """测试超时后抛出TimeoutError、终止卡住的子进程，之后的解析使用重建的进程池"""
+    print("🧪 测试解析超时...")
+
+    async def run():
+        executor = ParsingExecutor(max_workers=1, timeout=2)
+        try:
+            # 预热进程池，避免把子进程启动时间计入超时
+            await executor.run(read_text, path)
+            pool = executor._pool
+            processes = list(pool._processes.values())
+            started = time.monotonic()
+            try:
+                await executor.run(slow_read, path)
+                return None
+            except asyncio.TimeoutError:
+                elapsed = time.monotonic() - started
+            await asyncio.sleep(0.5)
+            killed = all(not process.is_alive() for process in processes)
+            restarted = executor._pool is None
+            content = await executor.run(read_text, path)
+            return elapsed, killed, restarted, content
+        finally:
+            executor.shutdown()
+
+    result = asyncio.run(run())
+    if result is None:
+        print("❌ 超时的解析应抛出TimeoutError")
+        return False
+    elapsed, killed, restarted, content = result
+    if elapsed > 10:
+        print(f"❌ 超时应在约2秒后返回，实际 {elapsed:.1f} 秒")
+        return False
+    if not killed or not restarted:
+        print(f"❌ 超时后应终止子进程并重建进程池: killed={killed}, restarted={restarted}")
+        return False
+    if content != "# 标题\n\n正文内容。":
+        print(f"❌ 重建后的进程池解析结果不正确: {content!r}")
+        return False
+
+    print(f"✅ {elapsed:.1f} 秒后超时，子进程已终止，进程池已重建")
+    return True
+
+
+@with_document
+def test_crash_retry(path):
+    """测试子进程崩溃后重建进程池并重试一次，再次崩溃时抛出BrokenProcessPool"""
+    print("🧪 测试子进程崩溃...")
+
+    async def run():
+        executor = ParsingExecutor(max_workers=1, timeout=30)
+        try:
+            content = await executor.run(crash_once, path)
+            try:
+                await executor.run(always_crash, path)
+                crashed = False
+            except BrokenProcessPool:
+                crashed = True
+            after = await executor.run(read_text, path)
+            return content, crashed, after
+        finally:
+            executor.shutdown()
+
+    content, crashed, after = asyncio.run(run())
+    if content != "# 标题\n\n正文内容。":
+        print(f"❌ 崩溃一次后应重试成功: {content!r}")
+        return False
+    if not crashed:
+        print("❌ 重试仍然崩溃时应抛出BrokenProcessPool")
+        return False
+    if after != content:
+        print(f"❌ 崩溃后的进程池应能继续解析: {after!r}")
+        return False
+
+    print("✅ 崩溃后重试成功，连续崩溃时报错")
+    return True
+
+
+@with_document
+def test_memory_limit(path):
+    """测试超过内存上限的解析在子进程中抛出MemoryError，不影响后续解析"""
+    print("🧪 测试内存上限...")
+
+    async def run():
+        executor = ParsingExecutor(max_workers=1, timeout=30, memory_limit_mb=512)
+        try:
+            small = await executor.run(allocate, path, 16)
+            try:
+                await executor.run(allocate, path, 1024)
+                limited = False
+            except MemoryError:
+                limited = True
+            after = await executor.run(read_text, path)
+            return small, limited, after
+        finally:
+            executor.shutdown()
+
+    small, limited, after = asyncio.run(run())
+    if small != 16 * 1024 * 1024:
+        print(f"❌ 上限以内的分配应成功: {small}")
+        return False
+    if not limited:
+        print("❌ 超过内存上限时应抛出MemoryError")
+        return False
+    if after != "# 标题\n\n正文内容。":
+        print(f"❌ 内存超限后的进程池应能继续解析: {after!r}")
+        return False
+
+    print("✅ 超过内存上限时抛出MemoryError")
+    return True
+
+
+@with_document
+def test_thread_mode(path):
+    """测试max_workers为0时在线程中解析，超时同样抛出TimeoutError"""
+    print("🧪 测试线程模式...")
+
+    async def run():
+        executor = ParsingExecutor(max_workers=0, timeout=1)
+        content = await executor.parse(path)
+        try:
+            await executor.run(time.sleep, 3)
+            timed_out = False
+        except asyncio.TimeoutError:
+            timed_out = True
+        return content, timed_out, executor._pool
+
+    content, timed_out, pool = asyncio.run(run())
+    if content != "# 标题\n\n正文内容。" or pool is not None:
+        print(f"❌ 线程模式应直接解析且不创建进程池: {content!r}")
+        return False
+    if not timed_out:
+        print("❌ 线程模式超时应抛出TimeoutError")
+        return False
+
+    print("✅ 线程模式解析和超时正确")
+    return True
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试文档解析进程池")
+    print("=" * 50)
+    tests = [
+        test_parse,
+        test_timeout_restarts_pool,
+        test_crash_retry,
+        test_memory_limit,
+        test_thread_mode
+    ]
+    passed = sum(1 for test in tests if test())
+    print("=" * 50)
+    print(f"📊 测试结果: {passed}/{len(tests)} 通过")
+    return passed == len(tests)
+
+
+# 子进程会导入主模块，入口需要保护
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试PDF按页段入库：多个页段逐段写入同一任务命名空间后，每一页的内容都能被检索到
+
+使用特征哈希embedding后端（不需要网络），每个页范围只有1页，使一个PDF产生多个页段；
+分别覆盖进程内索引和转存ChromaDB两种情况。
+"""
+
+import asyncio
+import os
+import tempfile
+import uuid
+from pathlib import Path
+
+# 需要在导入配置之前设置
+os.environ["EMBEDDING_BACKEND"] = "hashing"
+os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+os.environ["PDF_PAGES_PER_TASK"] = "1"
+
+from app import _collect_user_documents, ai_service, parsing_executor  # noqa: E402
+from config import Config  # noqa: E402
+
+PAGES = [
+    "alpha protocol handshake uses three messages before the session opens",
+    "bravo scheduler assigns worker threads by queue depth and priority",
+    "charlie storage engine flushes the write ahead log every second",
+    "delta network retries failed requests with exponential backoff",
+]
+
+
+def build_pdf(pages):
+    """生成每页一段文字的最小PDF（Helvetica字体，只含ASCII文字）"""
+    count = len(pages)
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [{}] /Count {} >>".format(
+            " ".join(f"{4 + 2 * i} 0 R" for i in range(count)), count
+        ),
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, text in enumerate(pages):
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    output = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    output += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return output
+
+
+async def ingest_and_search(max_memory_docs):
+    """把多页PDF入库到新的命名空间，返回 (文档内容, 每页检索到的最相关内容, 命名空间中的记录数)"""
+    namespace = f"test_{uuid.uuid4().hex[:12]}"
+    previous = Config.VECTOR_MEMORY_INDEX_MAX_DOCS
+    Config.VECTOR_MEMORY_INDEX_MAX_DOCS = max_memory_docs
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            Path(tmp, "manual.pdf").write_bytes(build_pdf(PAGES))
+            documents, _, _ = await _collect_user_documents(Path(tmp), namespace=namespace)
+        top = []
+        for page in PAGES:
+            results = await ai_service.search_similar_documents(page, top_k=1, namespace=namespace)
+            top.append(results[0]["content"] if results else "")
+        index = ai_service._memory_indexes.get(namespace)
+        if index is not None:
+            stored = len(index)
+        else:
+            collection = await ai_service._find_collection(namespace)
+            stored = await asyncio.to_thread(collection.count) if collection is not None else 0
+        return documents, top, stored
+    finally:
+        Config.VECTOR_MEMORY_INDEX_MAX_DOCS = previous
+        await ai_service.drop_namespace(namespace)
+
+
+def check_pages(label, documents, top, stored):
+    if len(documents) != 1 or any(page not in documents[0]["content"] for page in PAGES):
+        print(f"❌ {label}: 合并后的文档内容不完整: {documents}")
+        return False
+    if stored != len(PAGES):
+        print(f"❌ {label}: 每个页段应各有一条记录，实际 {stored} 条（分段id重复时后写入的页段会覆盖前面的）")
+        return False
+    for page, content in zip(PAGES, top):
+        if page not in content:
+            print(f"❌ {label}: 检索 {page[:20]!r} 返回了其他页的内容: {content[:40]!r}")
+            return False
+    return True
+
+
+def test_memory_index():
+    """测试多个页段写入进程内索引后，每一页都能检索到"""
+    print("🧪 测试PDF页段写入进程内索引...")
+
+    documents, top, stored = asyncio.run(ingest_and_search(max_memory_docs=2000))
+    if not check_pages("进程内索引", documents, top, stored):
+        return False
+
+    print(f"✅ {len(PAGES)} 个页段均已入库并可检索")
+    return True
+
+
+def test_chroma_spill():
+    """测试页段数超过进程内索引上限、转存ChromaDB后，前面的页段没有被覆盖"""
+    print("🧪 测试PDF页段转存ChromaDB...")
+
+    documents, top, stored = asyncio.run(ingest_and_search(max_memory_docs=2))
+    if not check_pages("ChromaDB", documents, top, stored):
+        return False
+
+    print(f"✅ 转存后 {stored} 个页段均可检索")
+    return True
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试PDF按页段入库")
+    print("=" * 50)
+    tests = [
+        test_memory_index,
+        test_chroma_spill
+    ]
+    try:
+        passed = sum(1 for test in tests if test())
+    finally:
+        parsing_executor.shutdown()
+    print("=" * 50)
+    print(f"📊 测试结果: {passed}/{len(tests)} 通过")
+    return passed == len(tests)
+
+
+# 解析进程池的子进程会导入主模块，入口需要保护
+if __name__ == "__main__":
+    main()
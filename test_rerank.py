@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试最大边际相关性（MMR）重排：λ=1时按相关度排序，λ较小时优先选择不重复的结果
+"""
+
+import numpy as np
+
+from services.rerank import maximal_marginal_relevance
+
+QUERY = [1.0, 0.0, 0.0]
+# 0、1、2 是几乎相同的三个近似重复候选，与查询最相关；3 方向不同但同样相关；4 相关度最低
+CANDIDATES = [
+    [0.95, 0.31, 0.0],
+    [0.94, 0.34, 0.0],
+    [0.95, 0.30, 0.01],
+    [0.80, 0.0, 0.60],
+    [0.10, 0.99, 0.0],
+]
+
+
+def relevance_order():
+    query = np.asarray(QUERY) / np.linalg.norm(QUERY)
+    candidates = np.asarray(CANDIDATES) / np.linalg.norm(CANDIDATES, axis=1, keepdims=True)
+    return [int(i) for i in np.argsort(-(candidates @ query), kind="stable")]
+
+
+def test_lambda_one_is_relevance_order():
+    """测试λ=1时结果等同于按与查询的余弦相似度排序"""
+    print("🧪 测试λ=1时按相关度排序...")
+
+    selected = maximal_marginal_relevance(QUERY, CANDIDATES, k=5, lambda_mult=1.0)
+    if selected != relevance_order():
+        print(f"❌ λ=1时应按相关度排序: {selected} != {relevance_order()}")
+        return False
+
+    print(f"✅ λ=1时选中顺序为 {selected}")
+    return True
+
+
+def test_diversity():
+    """测试λ较小时近似重复的候选不会占满前几位"""
+    print("🧪 测试MMR多样性...")
+
+    top3 = relevance_order()[:3]
+    if sorted(top3) != [0, 1, 2]:
+        print(f"❌ 测试数据应使近似重复的候选相关度最高: {top3}")
+        return False
+
+    selected = maximal_marginal_relevance(QUERY, CANDIDATES, k=3, lambda_mult=0.5)
+    if selected[0] != relevance_order()[0]:
+        print(f"❌ 第一个结果应为最相关的候选: {selected}")
+        return False
+    if 3 not in selected[:2]:
+        print(f"❌ 方向不同的候选应排在近似重复之前: {selected}")
+        return False
+
+    print(f"✅ λ=0.5时选中 {selected}")
+    return True
+
+
+def test_custom_relevance():
+    """测试传入relevance（如融合得分）时按其选择第一个结果"""
+    print("🧪 测试自定义相关度...")
+
+    relevance = [0.2, 0.1, 0.3, 1.0, 0.0]
+    selected = maximal_marginal_relevance(QUERY, CANDIDATES, k=2, lambda_mult=0.7, relevance=relevance)
+    if selected[0] != 3:
+        print(f"❌ 第一个结果应为自定义相关度最高的候选: {selected}")
+        return False
+
+    print(f"✅ 自定义相关度选中 {selected}")
+    return True
+
+
+def test_edge_cases():
+    """测试k超过候选数量、k为0和零向量候选"""
+    print("🧪 测试边界情况...")
+
+    selected = maximal_marginal_relevance(QUERY, CANDIDATES, k=10, lambda_mult=0.5)
+    if sorted(selected) != list(range(len(CANDIDATES))):
+        print(f"❌ k超过候选数量时应返回全部候选且不重复: {selected}")
+        return False
+    if maximal_marginal_relevance(QUERY, CANDIDATES, k=0) != []:
+        print("❌ k=0时应返回空列表")
+        return False
+    if maximal_marginal_relevance(QUERY, [], k=3) != []:
+        print("❌ 没有候选时应返回空列表")
+        return False
+    selected = maximal_marginal_relevance(QUERY, [[0.0, 0.0, 0.0], [1.0, 0.0, 0.0]], k=2)
+    if selected != [1, 0]:
+        print(f"❌ 零向量候选应排在最后: {selected}")
+        return False
+
+    print("✅ 边界情况正确")
+    return True
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试MMR重排")
+    print("=" * 50)
+    tests = [
+        test_lambda_one_is_relevance_order,
+        test_diversity,
+        test_custom_relevance,
+        test_edge_cases
+    ]
+    passed = sum(1 for test in tests if test())
+    print("=" * 50)
+    print(f"📊 测试结果: {passed}/{len(tests)} 通过")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试LLM响应缓存的在途请求合并：并发请求共享一次上游调用，发起请求的一方被取消时其他等待者仍能拿到结果
+"""
+
+import asyncio
+
+from services.cache import ResponseCache
+
+
+class SlowUpstream:
+    """记录调用次数的模拟上游调用"""
+
+    def __init__(self, delay=0.05, fail=False):
+        self.calls = 0
+        self.delay = delay
+        self.fail = fail
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("上游调用失败")
+        return "响应内容"
+
+
+def test_coalesce():
+    """测试相同键的并发请求只调用一次上游，结果写入缓存"""
+    print("🧪 测试并发请求合并...")
+
+    async def run():
+        cache = ResponseCache()
+        upstream = SlowUpstream()
+        results = await asyncio.gather(*[cache.get_or_compute("key", upstream) for _ in range(5)])
+        cached = await cache.get_or_compute("key", upstream)
+        return cache, upstream, results, cached
+
+    cache, upstream, results, cached = asyncio.run(run())
+    if upstream.calls != 1 or results != ["响应内容"] * 5 or cached != "响应内容":
+        print(f"❌ 应只调用一次上游: 调用 {upstream.calls} 次, 结果 {results}")
+        return False
+    if cache.stats()["coalesced"] != 4 or cache.stats()["hits"] != 1:
+        print(f"❌ 命中统计不正确: {cache.stats()}")
+        return False
+
+    print("✅ 5个并发请求共享一次上游调用")
+    return True
+
+
+def test_leader_cancelled():
+    """测试发起上游调用的请求被取消后，等待同一键的请求仍能拿到结果"""
+    print("🧪 测试发起者被取消...")
+
+    async def run():
+        cache = ResponseCache()
+        upstream = SlowUpstream()
+        leader = asyncio.create_task(cache.get_or_compute("key", upstream))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(cache.get_or_compute("key", upstream))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        try:
+            value = await follower
+        except asyncio.CancelledError:
+            value = None
+        return cache, upstream, leader.cancelled(), value
+
+    cache, upstream, leader_cancelled, value = asyncio.run(run())
+    if not leader_cancelled:
+        print("❌ 发起者应被取消")
+        return False
+    if value != "响应内容":
+        print("❌ 发起者被取消时，等待者收到了CancelledError")
+        return False
+    if upstream.calls != 1 or cache.get("key") != "响应内容":
+        print(f"❌ 上游调用应完成一次并写入缓存: 调用 {upstream.calls} 次")
+        return False
+
+    print("✅ 发起者被取消不影响等待者")
+    return True
+
+
+def test_failure_not_cached():
+    """测试失败的调用会传给所有等待者，且不写入缓存"""
+    print("🧪 测试失败的调用...")
+
+    async def run():
+        cache = ResponseCache()
+        upstream = SlowUpstream(fail=True)
+        results = await asyncio.gather(
+            *[cache.get_or_compute("key", upstream) for _ in range(3)], return_exceptions=True
+        )
+        return cache, upstream, results
+
+    cache, upstream, results = asyncio.run(run())
+    if upstream.calls != 1 or not all(isinstance(result, RuntimeError) for result in results):
+        print(f"❌ 所有等待者都应收到上游异常: {results}")
+        return False
+    if cache.get("key") is not None or cache._inflight:
+        print("❌ 失败的调用不应写入缓存或残留在途记录")
+        return False
+
+    print("✅ 失败的调用未缓存")
+    return True
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试LLM响应缓存")
+    print("=" * 50)
+    tests = [
+        test_coalesce,
+        test_leader_cancelled,
+        test_failure_not_cached
+    ]
+    passed = sum(1 for test in tests if test())
+    print("=" * 50)
+    print(f"📊 测试结果: {passed}/{len(tests)} 通过")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    main()
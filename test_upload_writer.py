@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试上传文件的流式保存：sha256与内容一致、超过大小限制返回413且不留下临时文件
+"""
+
+import asyncio
+import hashlib
+import io
+import os
+import tempfile
+
+from fastapi import HTTPException
+
+from utils.upload_writer import save_upload
+
+
+class FakeUpload:
+    """模拟UploadFile：按请求的大小分块读取，记录读取次数"""
+
+    def __init__(self, data: bytes, filename: str = "资料.docx"):
+        self.filename = filename
+        self._stream = io.BytesIO(data)
+        self.reads = 0
+
+    async def read(self, size: int = -1) -> bytes:
+        self.reads += 1
+        return self._stream.read(size)
+
+
+def test_sha256_matches():
+    """测试分块写入后的文件内容、大小和sha256与原始数据一致"""
+    print("🧪 测试sha256和文件内容...")
+
+    data = os.urandom(100_000)
+    upload = FakeUpload(data)
+    with tempfile.TemporaryDirectory() as tmp:
+        destination = os.path.join(tmp, "资料.docx")
+        result = asyncio.run(save_upload(upload, destination, max_size=1024 * 1024, chunk_size=4096))
+        if result != {"path": destination, "size": len(data), "sha256": hashlib.sha256(data).hexdigest()}:
+            print(f"❌ 返回结果不正确: {result}")
+            return False
+        with open(destination, "rb") as f:
+            if f.read() != data:
+                print("❌ 写入的文件内容与上传内容不一致")
+                return False
+        if os.listdir(tmp) != ["资料.docx"]:
+            print(f"❌ 不应留下临时文件: {os.listdir(tmp)}")
+            return False
+    if upload.reads < len(data) // 4096:
+        print(f"❌ 应按chunk_size分块读取，实际读取 {upload.reads} 次")
+        return False
+
+    print(f"✅ {len(data)} 字节分 {upload.reads} 次读取，sha256一致")
+    return True
+
+
+def test_exact_limit():
+    """测试大小恰好等于上限和空文件都能保存"""
+    print("🧪 测试大小恰好等于上限...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        destination = os.path.join(tmp, "limit.bin")
+        result = asyncio.run(save_upload(FakeUpload(b"x" * 8192), destination, max_size=8192, chunk_size=1000))
+        if result["size"] != 8192 or os.path.getsize(destination) != 8192:
+            print(f"❌ 恰好等于上限的文件应保存成功: {result}")
+            return False
+        empty = os.path.join(tmp, "empty.bin")
+        result = asyncio.run(save_upload(FakeUpload(b""), empty, max_size=8192))
+        if result["sha256"] != hashlib.sha256(b"").hexdigest() or os.path.getsize(empty) != 0:
+            print(f"❌ 空文件保存结果不正确: {result}")
+            return False
+
+    print("✅ 大小恰好等于上限时保存成功")
+    return True
+
+
+def test_oversize_returns_413():
+    """测试超过大小限制时返回413，删除临时文件，不覆盖已有的目标文件"""
+    print("🧪 测试超过大小限制...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        destination = os.path.join(tmp, "资料.docx")
+        with open(destination, "wb") as f:
+            f.write(b"old")
+        upload = FakeUpload(b"x" * 10_000)
+        try:
+            asyncio.run(save_upload(upload, destination, max_size=8192, chunk_size=1000))
+        except HTTPException as e:
+            if e.status_code != 413 or "资料.docx" not in e.detail:
+                print(f"❌ 应返回413并在提示中包含文件名: {e.status_code} {e.detail}")
+                return False
+        else:
+            print("❌ 超过大小限制时应抛出HTTPException")
+            return False
+        if os.listdir(tmp) != ["资料.docx"]:
+            print(f"❌ 超限后应删除临时文件: {os.listdir(tmp)}")
+            return False
+        with open(destination, "rb") as f:
+            if f.read() != b"old":
+                print("❌ 超限的上传不应覆盖已有文件")
+                return False
+        # 超过上限后不再继续读取剩余内容
+        if upload.reads != 9:
+            print(f"❌ 超过上限后应停止读取，实际读取 {upload.reads} 次")
+            return False
+
+    print("✅ 超过大小限制返回413，临时文件已删除")
+    return True
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试上传文件流式保存")
+    print("=" * 50)
+    tests = [
+        test_sha256_matches,
+        test_exact_limit,
+        test_oversize_returns_413
+    ]
+    passed = sum(1 for test in tests if test())
+    print("=" * 50)
+    print(f"📊 测试结果: {passed}/{len(tests)} 通过")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""DOCX文本提取基准测试：python-docx对象模型 vs lxml.iterparse流式提取
+
+对一批真实的.docx资料（默认uploads目录下所有.docx，含各用户子目录）分别测量：
+- 提取耗时（重复多次取中位数）
+- 单次提取的峰值内存增量（在独立子进程中执行，统计常驻内存峰值的增长，包含lxml的C层分配）
+- 输出字符数、行数，以及python-docx输出中的段落/单元格片段在流式输出中的覆盖率
+  （流式提取会去掉合并单元格的重复内容，字符数偏少是预期的）
+
+用法:
+    python tools/benchmark_docx_extraction.py
+    python tools/benchmark_docx_extraction.py uploads templates --repeat 5 --output docx.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import resource
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.document_readers import read_docx_text, read_word_document_content  # noqa: E402
+
+EXTRACTORS = {
+    "python_docx": read_word_document_content,
+    "streaming": read_docx_text,
+}
+
+
+def extract(name, file_path):
+    """提取文本，解析失败时的提示不混入JSON输出"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return EXTRACTORS[name](file_path) or ""
+
+
+def find_documents(paths):
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(path.rglob("*.docx")))
+        elif path.suffix.lower() == ".docx":
+            files.append(path)
+    # 跳过Word打开文档时生成的锁文件
+    return [file for file in files if not file.name.startswith("~$")]
+
+
+def _measure_peak(name, file_path, queue):
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    extract(name, file_path)
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put(after - before)
+
+
+def peak_memory_kb(context, name, file_path):
+    """在子进程中提取一次，返回常驻内存峰值的增长（KB）"""
+    queue = context.Queue()
+    process = context.Process(target=_measure_peak, args=(name, str(file_path), queue))
+    process.start()
+    process.join()
+    return queue.get() if process.exitcode == 0 else None
+
+
+def fragments(text):
+    """python-docx输出中的段落和单元格片段"""
+    return {part.strip() for line in text.splitlines() for part in line.split(" | ") if part.strip()}
+
+
+def benchmark_file(context, file_path, repeat):
+    result = {"file": str(file_path), "size_bytes": file_path.stat().st_size}
+    outputs = {}
+    for name in EXTRACTORS:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            outputs[name] = extract(name, file_path)
+            timings.append(time.perf_counter() - start)
+        result[name] = {
+            "median_ms": round(statistics.median(timings) * 1000, 2),
+            "peak_rss_kb": peak_memory_kb(context, name, file_path),
+            "chars": len(outputs[name]),
+            "lines": len(outputs[name].splitlines())
+        }
+    expected = fragments(outputs["python_docx"])
+    streamed = outputs["streaming"]
+    covered = sum(1 for fragment in expected if fragment in streamed)
+    result["coverage"] = round(covered / len(expected), 4) if expected else None
+    if result["streaming"]["median_ms"]:
+        result["speedup"] = round(result["python_docx"]["median_ms"] / result["streaming"]["median_ms"], 2)
+    return result
+
+
+def summarize(results):
+    summary = {"documents": len(results)}
+    for name in EXTRACTORS:
+        summary[f"{name}_total_ms"] = round(sum(item[name]["median_ms"] for item in results), 2)
+        peaks = [item[name]["peak_rss_kb"] for item in results if item[name]["peak_rss_kb"] is not None]
+        summary[f"{name}_max_peak_rss_kb"] = max(peaks) if peaks else None
+    speedups = [item["speedup"] for item in results if item.get("speedup")]
+    summary["median_speedup"] = round(statistics.median(speedups), 2) if speedups else None
+    coverages = [item["coverage"] for item in results if item["coverage"] is not None]
+    summary["min_coverage"] = min(coverages) if coverages else None
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DOCX文本提取基准测试：python-docx vs 流式提取")
+    parser.add_argument("paths", nargs="*", default=["uploads"], help=".docx文件或目录（递归查找），默认uploads")
+    parser.add_argument("--repeat", type=int, default=3, help="每个文件每种方式的提取次数，取中位数")
+    parser.add_argument("--output", help="结果JSON输出路径")
+    args = parser.parse_args()
+
+    files = find_documents(args.paths)
+    if not files:
+        print(f"❌ 没有找到.docx文件: {', '.join(args.paths)}", file=sys.stderr)
+        sys.exit(1)
+
+    context = multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else None)
+    results = []
+    for file_path in files:
+        print(f"⏱️ {file_path}", file=sys.stderr)
+        results.append(benchmark_file(context, file_path, args.repeat))
+
+    report = {"config": vars(args), "summary": summarize(results), "results": results}
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""embedding后端吞吐量基准测试
+
+用项目中的Markdown文档（或指定的文本文件）按段落切分作为语料，测量各后端的批量embedding吞吐量。
+本地后端无需网络，可离线比较批大小、线程数和int8量化的效果。
+
+用法:
+    python tools/benchmark_embeddings.py --backend local --threads 4 --batch-size 32
+    python tools/benchmark_embeddings.py --backend local --quantize --model ./models/text2vec-base-chinese
+    python tools/benchmark_embeddings.py --backend remote --limit 100
+    python tools/benchmark_embeddings.py --backend hashing
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import Config  # noqa: E402
+from services.embedding_backends import LocalEmbeddingBackend, create_embedding_backend  # noqa: E402
+
+
+def load_corpus(paths, limit):
+    """读取语料：按空行切分段落，去掉过短的段落"""
+    texts = []
+    for path in paths:
+        content = Path(path).read_text(encoding="utf-8", errors="ignore")
+        texts.extend(part.strip() for part in content.split("\n\n") if len(part.strip()) >= 20)
+    return texts[:limit] if limit else texts
+
+
+async def run(args):
+    if args.backend == "local":
+        backend = LocalEmbeddingBackend(
+            args.model or Config.EMBEDDING_LOCAL_MODEL_PATH,
+            device=Config.EMBEDDING_LOCAL_DEVICE,
+            threads=args.threads,
+            quantize=args.quantize,
+            batch_size=args.batch_size
+        )
+        load_start = time.perf_counter()
+        await asyncio.to_thread(backend._load_model)
+        load_seconds = time.perf_counter() - load_start
+        client = None
+    elif args.backend == "hashing":
+        backend = create_embedding_backend(backend="hashing")
+        backend.batch_size = args.batch_size
+        load_seconds = 0.0
+        client = None
+    else:
+        import httpx
+        from openai import AsyncOpenAI
+        client = AsyncOpenAI(api_key=Config.AI_API_KEY, base_url=Config.AI_API_URL, http_client=httpx.AsyncClient())
+        backend = create_embedding_backend(client, "remote")
+        if args.batch_size:
+            backend.batch_size = args.batch_size
+        load_seconds = 0.0
+
+    paths = args.files or sorted(str(p) for p in Path(".").glob("*.md"))
+    texts = load_corpus(paths, args.limit)
+    if not texts:
+        print("❌ 没有可用的语料")
+        return
+
+    # 预热一次，排除首批的初始化开销
+    await backend.embed_batch(texts[:1])
+
+    semaphore = asyncio.Semaphore(backend.concurrency)
+    batches = [texts[i:i + backend.batch_size] for i in range(0, len(texts), backend.batch_size)]
+
+    async def embed(batch):
+        async with semaphore:
+            return await backend.embed_batch(batch)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[embed(batch) for batch in batches])
+    seconds = time.perf_counter() - start
+    if client is not None:
+        await client.close()
+
+    report = {
+        "backend": backend.name,
+        "texts": len(texts),
+        "chars": sum(len(text) for text in texts),
+        "batch_size": backend.batch_size,
+        "threads": args.threads if args.backend == "local" else None,
+        "dimensions": len(results[0][0]) if results and results[0] else 0,
+        "load_seconds": round(load_seconds, 3),
+        "seconds": round(seconds, 3),
+        "texts_per_second": round(len(texts) / seconds, 2) if seconds else None,
+        "ms_per_text": round(seconds * 1000 / len(texts), 3)
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="embedding后端吞吐量基准测试")
+    parser.add_argument("--backend", choices=["local", "remote", "hashing"], default="local")
+    parser.add_argument("--model", help="本地模型名或目录，默认使用 EMBEDDING_LOCAL_MODEL_PATH")
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1, help="PyTorch计算线程数")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--quantize", action="store_true", help="int8动态量化")
+    parser.add_argument("--limit", type=int, default=0, help="最多使用的段落数")
+    parser.add_argument("files", nargs="*", help="语料文件，默认使用项目根目录下的 *.md")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
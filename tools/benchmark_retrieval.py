@@ -0,0 +1,251 @@
+"""检索基准测试：入库吞吐量、查询延迟分位数和recall@k
+
+生成可配置规模的中文/代码混合合成语料，使用离线确定性的字符n-gram哈希embedding，
+对进程内NumPy索引和ChromaDB分别测量：
+- 入库吞吐量（add_documents_to_vectorstore，含embedding和索引构建）
+- search_similar_documents 的单次查询延迟 p50/p95/p99
+- recall@k：与全量float32余弦暴力检索的top-k结果比较
+
+结果输出为JSON，可用 --baseline 与上一版本的结果比较，召回率下降或p95延迟增长超过阈值时以非零状态退出。
+
+用法:
+    python tools/benchmark_retrieval.py
+    python tools/benchmark_retrieval.py --sizes 1000,5000,20000 --indexes memory,chroma --output retrieval.json
+    python tools/benchmark_retrieval.py --hybrid --mmr --baseline retrieval.json
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import platform
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import chromadb  # noqa: E402
+from chromadb.config import Settings  # noqa: E402
+
+from config import Config  # noqa: E402
+from services.ai_service_latest import AIService  # noqa: E402
+from services.embedding_backends import HashingEmbeddingBackend  # noqa: E402
+
+TOPICS = [
+    ("网络配置", ["交换机", "路由器", "子网掩码", "网关", "VLAN", "静态路由", "端口", "网络拓扑"]),
+    ("数据库", ["主键", "索引", "事务", "外键", "查询优化", "存储过程", "主从复制", "连接池"]),
+    ("Web开发", ["路由", "控制器", "模板", "会话", "跨域", "中间件", "接口文档", "前端页面"]),
+    ("操作系统", ["进程", "线程", "调度", "内存分页", "文件系统", "信号量", "死锁", "系统调用"]),
+    ("机器学习", ["训练集", "损失函数", "梯度下降", "过拟合", "特征工程", "准确率", "学习率", "卷积"]),
+    ("容器部署", ["镜像", "容器", "编排", "挂载卷", "环境变量", "健康检查", "日志采集", "反向代理"]),
+]
+VERBS = ["配置", "分析", "实现", "测试", "优化", "部署", "调试", "验证", "记录", "比较"]
+FILLERS = ["在本次实验中", "根据实验要求", "通过查阅资料", "实验结果表明", "为了提高效率", "经过多次尝试"]
+IDENTIFIERS = ["config", "server", "handler", "query", "cache", "worker", "model", "router", "socket", "batch"]
+
+
+def make_document(rng: random.Random, number: int) -> str:
+    """生成一段中文实验描述，约三分之一附带一段代码"""
+    topic, terms = rng.choice(TOPICS)
+    sentences = [f"文档{number}：{topic}实验记录。"]
+    for _ in range(rng.randint(3, 8)):
+        sentences.append(
+            f"{rng.choice(FILLERS)}，{rng.choice(VERBS)}{rng.choice(terms)}和{rng.choice(terms)}，"
+            f"重点关注{rng.choice(terms)}的{rng.choice(VERBS)}过程。"
+        )
+    text = "".join(sentences)
+    if rng.random() < 0.35:
+        name = f"{rng.choice(IDENTIFIERS)}_{rng.choice(IDENTIFIERS)}"
+        text += (
+            f"\n\n```python\ndef {name}(data):\n"
+            f"    {rng.choice(IDENTIFIERS)} = load_{rng.choice(IDENTIFIERS)}(data)\n"
+            f"    return {rng.choice(IDENTIFIERS)}.{rng.choice(IDENTIFIERS)}()\n```"
+        )
+    return text
+
+
+def make_query(rng: random.Random, document: str) -> str:
+    """从文档中截取一段并加上随机动词作为查询"""
+    body = document.split("：", 1)[-1]
+    start = rng.randint(0, max(0, len(body) - 40))
+    fragment = body[start:start + rng.randint(15, 40)]
+    return f"{rng.choice(VERBS)}{fragment}"
+
+
+def percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 3)
+
+
+def exact_top_k(doc_matrix: np.ndarray, query_matrix: np.ndarray, k: int):
+    """float32余弦暴力检索的top-k下标"""
+    scores = query_matrix @ doc_matrix.T
+    top = np.argpartition(-scores, min(k, scores.shape[1] - 1), axis=1)[:, :k]
+    return [set(row.tolist()) for row in top]
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def create_service(dims: int) -> AIService:
+    """离线检索服务：哈希embedding、不读写embedding缓存、使用内存中的ChromaDB"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        service = AIService()
+    service.embedding_backend = HashingEmbeddingBackend(dims)
+    service.embedding_cache = None
+    service.chroma_client = chromadb.EphemeralClient(settings=Settings(anonymized_telemetry=False))
+    return service
+
+
+async def run_case(service: AIService, index: str, documents, queries, truth, top_k: int):
+    Config.VECTOR_MEMORY_INDEX_MAX_DOCS = len(documents) if index == "memory" else 0
+    namespace = uuid.uuid4().hex
+    records = [
+        {"content": text, "source": f"synthetic/{i}.md", "type": "markdown", "id": f"doc_{i}"}
+        for i, text in enumerate(documents)
+    ]
+    position = {text: i for i, text in enumerate(documents)}
+    quiet = io.StringIO()
+    try:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(quiet):
+            ok = await service.add_documents_to_vectorstore(records, namespace=namespace)
+        ingest_seconds = time.perf_counter() - start
+        if not ok:
+            raise RuntimeError(f"入库失败: {quiet.getvalue()[-500:]}")
+
+        latencies, recalls = [], []
+        with contextlib.redirect_stdout(quiet):
+            await service.search_similar_documents(queries[0], top_k=top_k, namespace=namespace)  # 预热
+            for query, expected in zip(queries, truth):
+                start = time.perf_counter()
+                results = await service.search_similar_documents(query, top_k=top_k, namespace=namespace)
+                latencies.append(time.perf_counter() - start)
+                found = {position.get(doc["content"]) for doc in results}
+                recalls.append(len(found & expected) / len(expected))
+    finally:
+        with contextlib.redirect_stdout(quiet):
+            await service.drop_namespace(namespace)
+
+    return {
+        "index": index,
+        "documents": len(documents),
+        "ingest_seconds": round(ingest_seconds, 3),
+        "docs_per_second": round(len(documents) / ingest_seconds, 1) if ingest_seconds else None,
+        "p50_ms": percentile_ms(latencies, 50),
+        "p95_ms": percentile_ms(latencies, 95),
+        "p99_ms": percentile_ms(latencies, 99),
+        f"recall@{top_k}": round(float(np.mean(recalls)), 4)
+    }
+
+
+def compare_with_baseline(results, current_config, baseline_path: str, max_recall_drop: float,
+                          max_latency_growth: float, min_latency_delta_ms: float):
+    """与基线结果比较，返回发现的退化项；p95延迟需同时超过增长比例和绝对增量才算退化（排除亚毫秒级抖动）"""
+    baseline = json.loads(Path(baseline_path).read_text(encoding="utf-8"))
+    for key in ("top_k", "dims", "seed", "hybrid", "mmr", "vector_index_storage"):
+        if key in baseline.get("config", {}) and baseline["config"][key] != current_config[key]:
+            print(f"⚠️ 基线的{key}与本次不同: {baseline['config'][key]} != {current_config[key]}", file=sys.stderr)
+    previous = {(item["index"], item["documents"]): item for item in baseline.get("results", [])}
+    recall_key = f"recall@{current_config['top_k']}"
+    regressions = []
+    for item in results:
+        old = previous.get((item["index"], item["documents"]))
+        if not old or recall_key not in old:
+            continue
+        if old[recall_key] - item[recall_key] > max_recall_drop:
+            regressions.append(f"{item['index']}/{item['documents']}: {recall_key} {old[recall_key]} -> {item[recall_key]}")
+        growth = item["p95_ms"] - old["p95_ms"]
+        if growth > old["p95_ms"] * max_latency_growth and growth > min_latency_delta_ms:
+            regressions.append(f"{item['index']}/{item['documents']}: p95 {old['p95_ms']}ms -> {item['p95_ms']}ms")
+    return regressions
+
+
+async def run(args):
+    sizes = [int(size) for size in args.sizes.split(",")]
+    indexes = [name.strip() for name in args.indexes.split(",")]
+    Config.HYBRID_SEARCH_ENABLED = args.hybrid
+    Config.MMR_ENABLED = args.mmr
+    service = create_service(args.dims)
+
+    results = []
+    for size in sizes:
+        rng = random.Random(args.seed + size)
+        documents = list(dict.fromkeys(make_document(rng, i) for i in range(size)))
+        queries = [make_query(rng, rng.choice(documents)) for _ in range(args.queries)]
+
+        backend = service.embedding_backend
+        doc_matrix = normalize(np.asarray(await backend.embed_batch(documents), dtype=np.float32))
+        query_matrix = normalize(np.asarray(await backend.embed_batch(queries), dtype=np.float32))
+        truth = exact_top_k(doc_matrix, query_matrix, args.top_k)
+
+        for index in indexes:
+            print(f"⏱️ {index}: {len(documents)} 个文档, {len(queries)} 次查询", file=sys.stderr)
+            results.append(await run_case(service, index, documents, queries, truth, args.top_k))
+
+    report = {
+        "config": {
+            "sizes": sizes,
+            "indexes": indexes,
+            "queries": args.queries,
+            "top_k": args.top_k,
+            "dims": args.dims,
+            "seed": args.seed,
+            "hybrid": args.hybrid,
+            "mmr": args.mmr,
+            "vector_index_storage": Config.VECTOR_INDEX_STORAGE
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "chromadb": chromadb.__version__,
+            "machine": platform.machine()
+        },
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+
+    if args.baseline:
+        regressions = compare_with_baseline(
+            results, report["config"], args.baseline, args.max_recall_drop, args.max_latency_growth,
+            args.min_latency_delta_ms
+        )
+        for regression in regressions:
+            print(f"❌ 性能退化: {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+        print("✅ 与基线相比无退化", file=sys.stderr)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检索基准测试：入库吞吐量、查询延迟分位数和recall@k")
+    parser.add_argument("--sizes", default="500,2000", help="语料规模，逗号分隔")
+    parser.add_argument("--indexes", default="memory,chroma", help="要测试的索引：memory、chroma")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--dims", type=int, default=Config.EMBEDDING_DIMENSIONS)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--hybrid", action="store_true", help="启用BM25混合检索（recall仍以纯向量暴力检索为基准）")
+    parser.add_argument("--mmr", action="store_true", help="启用MMR重排")
+    parser.add_argument("--output", help="结果JSON输出路径")
+    parser.add_argument("--baseline", help="基线结果JSON，与之比较并在退化时返回非零状态")
+    parser.add_argument("--max-recall-drop", type=float, default=0.02)
+    parser.add_argument("--max-latency-growth", type=float, default=0.5, help="p95延迟允许的增长比例")
+    parser.add_argument("--min-latency-delta-ms", type=float, default=1.0, help="p95延迟增量低于该值时不视为退化")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
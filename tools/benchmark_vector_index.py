@@ -0,0 +1,117 @@
+"""向量压缩存储的内存与召回率基准测试
+
+生成带聚类结构的随机向量（模拟同一批资料的分段embedding），比较进程内索引在
+float32 / float16 / int8 存储下的内存占用、recall@k（以float32精确检索为基准）和单次查询延迟，
+并比较embedding缓存在float32与float16格式下的SQLite文件实际大小（含键、索引和页内空闲）。
+
+用法:
+    python tools/benchmark_vector_index.py
+    python tools/benchmark_vector_index.py --n 20000 --dims 1024 --queries 200 --top-k 10
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.cache import EmbeddingCache  # noqa: E402
+from services.vector_index import InMemoryVectorIndex  # noqa: E402
+
+
+def make_vectors(n, dims, clusters, seed):
+    """生成聚类分布的向量和扰动后的查询向量"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dims)).astype(np.float32)
+    labels = rng.integers(0, clusters, n)
+    vectors = centers[labels] + 0.6 * rng.standard_normal((n, dims)).astype(np.float32)
+    return vectors, rng
+
+
+def percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 3)
+
+
+def benchmark_index(vectors, queries, top_k):
+    ids = [str(i) for i in range(len(vectors))]
+    exact = InMemoryVectorIndex("float32")
+    exact.add(vectors, ids, ids=ids)
+    truth = [{doc["id"] for doc in result} for result in exact.query_many(queries, top_k)]
+
+    results = {}
+    for storage in ("float32", "float16", "int8"):
+        index = InMemoryVectorIndex(storage)
+        index.add(vectors, ids, ids=ids)
+        index.query(queries[0], top_k)  # 预热，触发矩阵合并
+        latencies, recalls = [], []
+        for query, expected in zip(queries, truth):
+            start = time.perf_counter()
+            found = index.query(query, top_k)
+            latencies.append(time.perf_counter() - start)
+            recalls.append(len({doc["id"] for doc in found} & expected) / top_k)
+        results[storage] = {
+            "bytes": index.nbytes,
+            "compression": round(exact.nbytes / index.nbytes, 2),
+            f"recall@{top_k}": round(float(np.mean(recalls)), 4),
+            "p50_ms": percentile_ms(latencies, 50),
+            "p95_ms": percentile_ms(latencies, 95)
+        }
+    return results
+
+
+def benchmark_cache(vectors, entries):
+    """写入同样的向量，比较两种格式的缓存文件大小；compression按文件实际大小计算"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for storage in ("float32", "float16"):
+            path = Path(tmp) / f"cache_{storage}.sqlite3"
+            cache = EmbeddingCache(str(path), max_entries=entries, storage=storage)
+            texts = [f"text-{i}" for i in range(entries)]
+            cache.put_many("benchmark", vectors.shape[1], texts, vectors[:entries].tolist())
+            payload = cache._conn.execute(f"SELECT SUM(LENGTH(vector)) FROM {cache.table}").fetchone()[0]
+            cache._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            cache._conn.execute("VACUUM")
+            cache.close()
+            file_bytes = path.stat().st_size
+            results[storage] = {
+                "vector_bytes": payload,
+                "file_bytes": file_bytes,
+                "bytes_per_entry": round(file_bytes / entries, 1)
+            }
+    results["float16"]["compression"] = round(results["float32"]["file_bytes"] / results["float16"]["file_bytes"], 2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="向量压缩存储的内存与召回率基准测试")
+    parser.add_argument("--n", type=int, default=5000, help="向量数")
+    parser.add_argument("--dims", type=int, default=1024)
+    parser.add_argument("--clusters", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--cache-entries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="结果JSON输出路径")
+    args = parser.parse_args()
+
+    vectors, rng = make_vectors(args.n, args.dims, args.clusters, args.seed)
+    picks = rng.integers(0, args.n, args.queries)
+    queries = vectors[picks] + 0.6 * rng.standard_normal((args.queries, args.dims)).astype(np.float32)
+
+    report = {
+        "config": vars(args),
+        "index": benchmark_index(vectors, queries, args.top_k),
+        "embedding_cache": benchmark_cache(vectors, min(args.cache_entries, args.n))
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,8 @@
 import os
-import aiofiles
 from typing import Dict, List
 from fastapi import UploadFile
 import shutil
+from utils.upload_writer import save_upload
 
 class FileUtils:
     """文件处理工具类"""
@@ -16,7 +16,7 @@ class FileUtils:
         pdf_files: List[UploadFile],
         images: List[UploadFile]
     ) -> Dict[str, List[str]]:
-        """保存上传的文件"""
+        """流式保存上传的文件，单个文件超过 Config.MAX_FILE_SIZE 时返回413"""
         file_paths = {
             "template": "",
             "markdown_files": [],
@@ -27,46 +27,21 @@ class FileUtils:
         
         # 保存模板文件
         template_path = os.path.join(session_dir, f"template.{template.filename.split('.')[-1]}")
-        async with aiofiles.open(template_path, 'wb') as f:
-            content = await template.read()
-            await f.write(content)
+        await save_upload(template, template_path)
         file_paths["template"] = template_path
         
-        # 保存Markdown文件
-        for md_file in markdown_files:
-            if md_file.filename:
-                md_path = os.path.join(session_dir, md_file.filename)
-                async with aiofiles.open(md_path, 'wb') as f:
-                    content = await md_file.read()
-                    await f.write(content)
-                file_paths["markdown_files"].append(md_path)
-        
-        # 保存DOCX文件
-        for doc_file in doc_files:
-            if doc_file.filename:
-                doc_path = os.path.join(session_dir, doc_file.filename)
-                async with aiofiles.open(doc_path, 'wb') as f:
-                    content = await doc_file.read()
-                    await f.write(content)
-                file_paths["docx_files"].append(doc_path)
-        
-        # 保存PDF文件
-        for pdf_file in pdf_files:
-            if pdf_file.filename:
-                pdf_path = os.path.join(session_dir, pdf_file.filename)
-                async with aiofiles.open(pdf_path, 'wb') as f:
-                    content = await pdf_file.read()
-                    await f.write(content)
-                file_paths["pdf_files"].append(pdf_path)
-        
-        # 保存图片文件
-        for img_file in images:
-            if img_file.filename:
-                img_path = os.path.join(session_dir, img_file.filename)
-                async with aiofiles.open(img_path, 'wb') as f:
-                    content = await img_file.read()
-                    await f.write(content)
-                file_paths["images"].append(img_path)
+        # 保存Markdown、DOCX、PDF和图片文件
+        for key, files in (
+            ("markdown_files", markdown_files),
+            ("docx_files", doc_files),
+            ("pdf_files", pdf_files),
+            ("images", images)
+        ):
+            for upload in files:
+                if upload.filename:
+                    path = os.path.join(session_dir, upload.filename)
+                    await save_upload(upload, path)
+                    file_paths[key].append(path)
         
         return file_paths
     
@@ -0,0 +1,50 @@
+import hashlib
+import os
+from typing import Dict, Union
+
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException, UploadFile
+
+from config import Config
+
+
+def _format_size(size: int) -> str:
+    return f"{size // (1024 * 1024)}MB" if size >= 1024 * 1024 else f"{size}字节"
+
+
+async def save_upload(upload: UploadFile, destination: Union[str, os.PathLike],
+                      max_size: int = None, chunk_size: int = None) -> Dict[str, Union[str, int]]:
+    """流式保存上传文件：按固定大小分块读取并异步写入磁盘，同时计算sha256
+
+    先写入同目录下的临时文件，完成后再重命名为目标路径，读取目录的其他请求不会看到写了一半的文件。
+    超过max_size（默认 Config.MAX_FILE_SIZE）时删除临时文件并返回413。
+
+    返回 {"path": 目标路径, "size": 字节数, "sha256": 内容哈希}
+    """
+    max_size = Config.MAX_FILE_SIZE if max_size is None else max_size
+    chunk_size = chunk_size or Config.UPLOAD_CHUNK_SIZE
+    destination = os.fspath(destination)
+    partial_path = f"{destination}.part"
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(partial_path, "wb") as f:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_size and size > max_size:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"文件 {upload.filename} 超过大小限制 {_format_size(max_size)}"
+                    )
+                digest.update(chunk)
+                await f.write(chunk)
+        await aiofiles.os.replace(partial_path, destination)
+    except BaseException:
+        if await aiofiles.os.path.exists(partial_path):
+            await aiofiles.os.remove(partial_path)
+        raise
+    return {"path": destination, "size": size, "sha256": digest.hexdigest()}